@@ -0,0 +1,141 @@
+"""Benchmark of the vectorized backfill against replaying samples through the fetcher.
+
+Generates a random walk of 2 second samples, recomputes the running totals of
+``--days`` days with ``BatchAccumulator`` one day at a time, then replays the
+first ``--check-days`` through ``RunningTotals.ingest`` and checks that both
+end with exactly the same totals, tariff energies and hourly rows.
+
+    python benchmarks/bench_backfill.py --days 365 --time-zone Europe/Madrid
+    python benchmarks/bench_backfill.py --days 40 --billing-day 15 --tariffs peak=10:00-14:00,18:00-22:00 valley=00:00-08:00
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from fronius_basic.backfill import BatchAccumulator, concatenate_rows, recompute_archive  # noqa: E402
+from fronius_basic.const import ACCUMULATORS, HOUR_START, HOUR_COLUMNS  # noqa: E402
+from fronius_basic.rollover import parse_window  # noqa: E402
+from fronius_basic.samples import SampleArchive, SampleWriter, replay  # noqa: E402
+from fronius_basic.totals import RunningTotals  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def generate_day(random, start, interval):
+    """Return one day of timestamps and P_PV, P_Grid, P_Load centiwatts."""
+    count = int(86400 / interval)
+    timestamps = start + np.arange(count) * interval + random.random(count) * 0.05
+    pv = np.clip(np.cumsum(random.normal(0, 2000, count)) + 80000, 0, 500000).astype(np.int32)
+    load = -np.clip(np.cumsum(random.normal(0, 3000, count)) + 60000, 10000, 800000).astype(np.int32)
+    grid = -(pv + load)
+    return timestamps, pv, grid, load
+
+
+def parse_tariffs(options):
+    """Return the tariffs of name=HH:MM-HH:MM,... options."""
+    tariffs = {}
+    for option in options:
+        name, windows = option.split('=', 1)
+        tariffs[name] = [parse_window(window) for window in windows.split(',')]
+    return tariffs
+
+
+def check_replay(days, directory, max_gap, time_zone, billing_day, tariffs):
+    """Replay the days through the fetcher, return the mismatches and the replay time."""
+    writer = SampleWriter(directory)
+    for timestamps, pv, grid, load in days:
+        for index in range(len(timestamps)):
+            writer.append(float(timestamps[index]), {'Site': {
+                'P_PV': pv[index] / 100 or None, 'P_Grid': grid[index] / 100, 'P_Load': load[index] / 100,
+                'E_Day': None, 'E_Year': None, 'E_Total': None,
+            }})
+    writer.flush()
+
+    def offset_at(timestamp):
+        """Return the UTC offset (s) of the time zone."""
+        return int(datetime.fromtimestamp(timestamp, time_zone).utcoffset().total_seconds())
+
+    fetcher = RunningTotals(max_gap, billing_day=billing_day, tariffs=tariffs, offset_at=offset_at)
+    initial = fetcher.snapshot()
+    start = perf_counter()
+    count = replay(SampleArchive(directory).iter_range(), fetcher.ingest)
+    replay_time = perf_counter() - start
+    live = fetcher.snapshot()
+
+    # Once more, collecting the row of every closed hour the way the statistics importer does
+    fetcher = RunningTotals(max_gap, billing_day=billing_day, tariffs=tariffs, offset_at=offset_at)
+    fetcher.restore(initial)
+    closed = []
+    fetcher.statistics_importer = closed
+    replay(SampleArchive(directory).iter_range(), fetcher.ingest)
+
+    rows, state = recompute_archive(directory, max_gap, time_zone, initial, billing_day=billing_day, tariffs=tariffs)
+    mismatches = [key for key in ACCUMULATORS + ('tariffs', 'clock') if live[key] != state[key]]
+    for column in (HOUR_START,) + HOUR_COLUMNS:
+        if list(rows[column]) != [row[column] for row in closed]:
+            mismatches.append('hourly ' + column)
+    return mismatches, count, replay_time
+
+
+def main():
+    """Parse the options, run the backfill and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--check-days', type=int, default=2)
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between samples')
+    parser.add_argument('--time-zone', default='Europe/Madrid')
+    parser.add_argument('--start', type=float, default=1704067200.0, help='first timestamp')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--billing-day', type=int, default=1)
+    parser.add_argument('--tariffs', nargs='*', default=[], help='name=HH:MM-HH:MM[,HH:MM-HH:MM...]')
+    args = parser.parse_args()
+
+    random = np.random.default_rng(args.seed)
+    time_zone = ZoneInfo(args.time_zone)
+    max_gap = 3 * args.interval
+    tariffs = parse_tariffs(args.tariffs)
+    days = [generate_day(random, args.start + day * 86400, args.interval) for day in range(args.days)]
+    count = sum(len(day[0]) for day in days)
+
+    engine = BatchAccumulator(max_gap, time_zone, billing_day=args.billing_day, tariffs=tariffs)
+    start = perf_counter()
+    rows = concatenate_rows([engine.ingest(*day) for day in days])
+    batch_time = perf_counter() - start
+    print('{} samples, {} hours: backfill {:.3f} s ({:.1f} M samples/s)'.format(
+        count, len(rows['start']), batch_time, count / batch_time / 1e6))
+
+    if args.check_days:
+        with tempfile.TemporaryDirectory() as directory:
+            mismatches, checked, replay_time = check_replay(
+                days[:args.check_days], directory, max_gap, time_zone, args.billing_day, tariffs)
+        print('replay of {} samples through the fetcher {:.3f} s ({:.0f}x slower per sample)'.format(
+            checked, replay_time, replay_time / checked / (batch_time / count)))
+        print('identical to the fetcher' if not mismatches else 'MISMATCH: {}'.format(', '.join(mismatches)))
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
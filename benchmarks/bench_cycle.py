@@ -0,0 +1,250 @@
+"""End-to-end benchmark of the polling cycle against the local Solar API stub.
+
+Starts ``stub_server`` in a separate process and drives ``PowerflowData`` and
+the full set of ``FroniusSensor`` entities through many cycles. Reports the
+per-cycle latency percentiles, CPU time, allocations and event-loop lag of
+this process only.
+
+    python benchmarks/bench_cycle.py --cycles 5000 --inverters 10 --latency 20 --jitter 10
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import tracemalloc
+from functools import partial
+from time import perf_counter, process_time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from stub_server import add_stub_arguments, stub_from_arguments  # noqa: E402
+from fronius_basic.const import (  # noqa: E402
+    SENSOR_LIST, ENDPOINT_SENSOR_LIST, ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS,
+    ENDPOINT_METER, ENDPOINT_STORAGE, ENDPOINT_INVERTER
+    )
+from fronius_basic.instrumentation import Tracer  # noqa: E402
+from fronius_basic.rolling import RollingStatistics  # noqa: E402
+from fronius_basic.core import PowerflowData  # noqa: E402
+from fronius_basic.sensor import FroniusSensor  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class BenchSensor(FroniusSensor):
+    """Sensor whose state writes are counted instead of sent to Home Assistant."""
+
+    writes = 0
+
+    def async_schedule_update_ha_state(self, force_refresh=False):
+        """Read what the state machine would read."""
+        BenchSensor.writes += 1
+        return self.state, self.available, self.extra_state_attributes
+
+#   BenchSensor
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class LoopLagProbe:
+    """Measure how late a short periodic sleep wakes up."""
+
+    def __init__(self, period=0.005):
+        """Initialize the probe."""
+        self._period = period
+        self._task = None
+        self.lags = []
+
+    async def _async_run(self):
+        """Sleep and record the overshoot until cancelled."""
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self._period)
+            self.lags.append(perf_counter() - start - self._period)
+
+    def start(self):
+        """Start probing."""
+        self._task = asyncio.ensure_future(self._async_run())
+
+    async def async_stop(self):
+        """Stop probing."""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+#   LoopLagProbe
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def percentiles(values, points=(50, 90, 99, 100)):
+    """Return the given percentiles of values, nearest rank."""
+    ordered = sorted(values)
+    if not ordered:
+        return {point: None for point in points}
+    return {point: ordered[min(len(ordered) - 1, max(0, int(round(point / 100 * len(ordered))) - 1))]
+            for point in points}
+
+
+def _free_port():
+    """Return a TCP port nobody listens on."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _serve_stub(args, port):
+    """Child process body."""
+    web.run_app(stub_from_arguments(args).application(), host='127.0.0.1', port=port, access_log=None, print=None)
+
+
+async def _async_wait_for_port(port, timeout=10):
+    """Wait until the stub accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def async_bench(args, port):
+    """Run the cycles and return the report lines."""
+    await _async_wait_for_port(port)
+    endpoints = {endpoint: interval for endpoint, interval in (
+        (ENDPOINT_METER, args.meter_interval), (ENDPOINT_STORAGE, args.storage_interval),
+        (ENDPOINT_INVERTER, args.inverter_interval)) if interval}
+    connector = aiohttp.TCPConnector(limit_per_host=args.max_concurrent, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        fetcher = PowerflowData(session, '127.0.0.1:{}'.format(port), Tracer(args.trace), args.accumulation,
+                                args.scan_interval, endpoints=endpoints, max_concurrent=args.max_concurrent)
+        await fetcher.async_update()
+        statistics = None
+        if args.statistics_windows:
+            statistics = partial(RollingStatistics, args.statistics_windows, args.scan_interval)
+        keys = list(SENSOR_LIST) + list(fetcher.latest_inverters or ())
+        for endpoint in endpoints:
+            keys.extend(ENDPOINT_SENSOR_LIST.get(endpoint, ()))
+        for key in keys:
+            await fetcher.register(BenchSensor(fetcher, 'Bench', key, statistics=statistics))
+
+        for _ in range(args.warmup):
+            await fetcher.async_update()
+        BenchSensor.writes = 0
+
+        probe = LoopLagProbe()
+        probe.start()
+        if args.allocations:
+            tracemalloc.start()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+        latencies = []
+        cpu_start = process_time()
+        wall_start = perf_counter()
+        for _ in range(args.cycles):
+            cycle_start = perf_counter()
+            await fetcher.async_update()
+            latencies.append(perf_counter() - cycle_start)
+            if args.pace:
+                await asyncio.sleep(args.pace / 1000)
+        wall = perf_counter() - wall_start
+        cpu = process_time() - cpu_start
+        if args.allocations:
+            allocated_after, allocated_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        await probe.async_stop()
+
+    lines = ['{} cycles, {} sensors, {} inverters, latency {} ms +/- {} ms, error rate {}'.format(
+        args.cycles, len(keys), args.inverters, args.latency, args.jitter, args.error_rate)]
+    cycle = percentiles(latencies)
+    lines.append('cycle latency ms   p50 {:8.3f}  p90 {:8.3f}  p99 {:8.3f}  max {:8.3f}'.format(
+        *(cycle[point] * 1000 for point in (50, 90, 99, 100))))
+    lines.append('cpu per cycle ms   {:8.3f}   ({:.1f}% of wall time)'.format(cpu / args.cycles * 1000, 100 * cpu / wall))
+    lag = percentiles(probe.lags)
+    if lag[50] is not None:
+        lines.append('event-loop lag ms  p50 {:8.3f}  p90 {:8.3f}  p99 {:8.3f}  max {:8.3f}'.format(
+            *(lag[point] * 1000 for point in (50, 90, 99, 100))))
+    lines.append('state writes       {:8.2f} per cycle'.format(BenchSensor.writes / args.cycles))
+    if args.allocations:
+        lines.append('memory             {:+.1f} KiB retained, {:.1f} KiB peak traced'.format(
+            (allocated_after - allocated_before) / 1024, allocated_peak / 1024))
+    diagnostics = fetcher.diagnostics()
+    lines.append('skipped/late/timeouts {}/{}/{}, breaker {}, endpoint failures {}'.format(
+        diagnostics['skipped_cycles'], diagnostics['late_cycles'], diagnostics['timeouts'],
+        diagnostics['breaker']['state'], diagnostics['endpoint_failures']))
+    if args.trace:
+        for stage, summary in diagnostics['timings'].items():
+            lines.append('  {:<20} {}'.format(stage, summary))
+    return lines
+
+
+def main():
+    """Parse the options, start the stub and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--pace', type=float, default=0.0, help='pause between cycles in ms')
+    parser.add_argument('--scan-interval', type=float, default=4.0, help='scan interval the fetcher is configured with')
+    parser.add_argument('--accumulation', choices=[ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS],
+                        default=ACCUMULATION_INTEGRATION)
+    parser.add_argument('--meter-interval', type=float, default=0.0, help='also poll the meter every so many seconds')
+    parser.add_argument('--storage-interval', type=float, default=0.0, help='also poll the storage every so many seconds')
+    parser.add_argument('--inverter-interval', type=float, default=0.0,
+                        help='also poll the inverter details every so many seconds')
+    parser.add_argument('--max-concurrent', type=int, default=1, help='requests in flight at once')
+    parser.add_argument('--statistics-windows', type=float, nargs='*', default=[],
+                        help='rolling statistics windows of the power sensors, in seconds')
+    parser.add_argument('--trace', action='store_true', help='also report the per-stage histograms')
+    parser.add_argument('--allocations', action='store_true', help='trace allocations (slows the run down)')
+    parser.add_argument('--output', help='also write the report to this file')
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve_stub, args=(args, port), daemon=True)
+    server.start()
+    try:
+        lines = asyncio.run(async_bench(args, port))
+    finally:
+        server.terminate()
+        server.join()
+
+    report = '\n'.join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
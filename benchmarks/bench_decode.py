@@ -0,0 +1,86 @@
+"""Micro-benchmark of decoding the power flow response.
+
+Compares the former ``json.loads`` of the whole response with
+``decode_powerflow``, which checks ``Head.Status.Code`` and keeps only the
+fields that are read, with the ``json`` backend and, when installed, ``orjson``.
+The bodies are rendered by the Solar API stand-in for N inverters.
+
+    python benchmarks/bench_decode.py [--inverters 2 10 100] [--number 5000]
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from stub_server import StubInverterSite, StubSolarApi  # noqa: E402
+from fronius_basic import decode  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def decode_full(body):
+    """Former path: decode the whole response."""
+    return json.loads(body)['Body']['Data']
+
+
+def with_backend(loads):
+    """Return decode_powerflow running on loads."""
+    return lambda body: decode.decode_powerflow(body, loads)
+
+
+def count_values(data):
+    """Return the number of scalar values of a decoded block."""
+    if isinstance(data, dict):
+        return sum(count_values(value) for value in data.values())
+    return 1
+
+
+def main():
+    """Parse the options, time every decoder and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inverters', type=int, nargs='+', default=[2, 10, 100])
+    parser.add_argument('--number', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    decoders = [('json.loads (former)', decode_full), ('decode_powerflow json', with_backend(json.loads))]
+    if decode.orjson is not None:
+        decoders.append(('decode_powerflow orjson', with_backend(decode.orjson.loads)))
+    else:
+        print('orjson is not installed, only the json backend is timed')
+
+    for inverters in args.inverters:
+        body = StubSolarApi(inverters).render(StubInverterSite(inverters).sample()).encode()
+        print('{} inverters, {} bytes'.format(inverters, len(body)))
+        reference = decode_full(body)
+        baseline = None
+        for name, decoder in decoders:
+            data = decoder(body)
+            if any(data['Site'][key] != reference['Site'][key] for key in data['Site']):
+                print('  {}: MISMATCH'.format(name))
+                sys.exit(1)
+            seconds = min(timeit.repeat(lambda: decoder(body), number=args.number, repeat=args.repeat)) / args.number
+            baseline = baseline or seconds
+            print('  {:<26} {:8.1f} us  {:4.1f}x  {} values kept'.format(
+                name, seconds * 1e6, baseline / seconds, count_values(data)))
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,142 @@
+"""Benchmark of the batched export against the local stand-in write endpoint.
+
+Serves ``stub_server`` in this process, feeds ``--samples`` samples of
+``--devices`` devices through ``BatchExporter`` every ``--interval`` ms and
+checks that the endpoint received every line exactly once and in order, or,
+when the queue overflowed, that only the oldest lines were dropped. Reports
+the cost of queueing a sample and the event-loop lag, which a slow or failing
+sink must not raise.
+
+    python benchmarks/bench_export.py --samples 20000 --devices 4
+    python benchmarks/bench_export.py --write-latency 500 --write-error-rate 0.3 --max-queue 2000
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from stub_server import StubSolarApi, StubInverterSite, async_start_stub  # noqa: E402
+from bench_cycle import LoopLagProbe, percentiles  # noqa: E402
+from fronius_basic.export import BatchExporter, HttpSink, FORMAT_LINE, FORMAT_JSON  # noqa: E402
+from fronius_basic.totals import RunningTotals  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _line_key(line, record_format):
+    """Return the device and the timestamp of one received line."""
+    if record_format == FORMAT_JSON:
+        device = line.split('"device":"', 1)[1].split('"', 1)[0]
+        timestamp = line.split('"time":', 1)[1].split(',', 1)[0]
+    else:
+        device = line.split(',device=', 1)[1].split(' ', 1)[0]
+        timestamp = line.rsplit(' ', 1)[1]
+    return device, timestamp
+
+
+async def async_bench(args):
+    """Feed the exporter, stop it and check what the endpoint received."""
+    stub = StubSolarApi(write_latency=args.write_latency / 1000, write_error_rate=args.write_error_rate, seed=args.seed)
+    runner, address = await async_start_stub(stub)
+    session = aiohttp.ClientSession()
+    exporter = BatchExporter(HttpSink(session, 'http://{}/write'.format(address)), args.format, batch_size=args.batch_size,
+                             flush_interval=args.flush_interval, max_queue=args.max_queue)
+    site = StubInverterSite(args.inverters, args.seed)
+    devices = []
+    for number in range(args.devices):
+        totals = RunningTotals(max_gap=60)
+        devices.append(('device{}'.format(number), exporter.feed('device{}'.format(number)), totals))
+
+    probe = LoopLagProbe()
+    probe.start()
+    exporter.start()
+    sent = []
+    costs = []
+    # One simulated second per sample, whatever the pace they are fed at
+    timestamp = 1.7e9
+    for number in range(args.samples):
+        timestamp += 1
+        data = site.sample()
+        for name, feed, totals in devices:
+            totals.ingest(data, timestamp)
+            start = perf_counter()
+            feed.append(timestamp, data, totals)
+            costs.append(perf_counter() - start)
+            sent.append(name)
+        if args.interval:
+            await asyncio.sleep(args.interval / 1000)
+        elif number % 100 == 0:
+            await asyncio.sleep(0)
+    await probe.async_stop()
+    await exporter.async_stop()
+    diagnostics = exporter.diagnostics()
+    await session.close()
+    await runner.cleanup()
+    return sent, costs, probe.lags, diagnostics, stub.write_endpoint
+
+
+def check_received(args, sent, diagnostics, endpoint):
+    """Check that the received lines are the newest ones sent, once each and in order."""
+    received = [_line_key(line, args.format) for line in endpoint.lines]
+    assert len(received) == len(set(received)), 'a line was written twice'
+    per_device = {}
+    for device, timestamp in received:
+        per_device.setdefault(device, []).append(float(timestamp))
+    for device, timestamps in per_device.items():
+        assert timestamps == sorted(timestamps), 'the lines of {} are out of order'.format(device)
+    lost = len(sent) - len(received)
+    assert lost == diagnostics['dropped'] + diagnostics['queued'], \
+        '{} line(s) missing, {} dropped and {} still queued'.format(lost, diagnostics['dropped'], diagnostics['queued'])
+    return lost
+
+
+def main():
+    """Parse the options, run the benchmark and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=5000, help='samples per device')
+    parser.add_argument('--devices', type=int, default=2)
+    parser.add_argument('--inverters', type=int, default=2)
+    parser.add_argument('--interval', type=float, default=0.0, help='ms between two samples')
+    parser.add_argument('--format', choices=[FORMAT_LINE, FORMAT_JSON], default=FORMAT_LINE)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='seconds')
+    parser.add_argument('--max-queue', type=int, default=100000)
+    parser.add_argument('--write-latency', type=float, default=0.0, help='response time of /write in ms')
+    parser.add_argument('--write-error-rate', type=float, default=0.0, help='share of failed writes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sent, costs, lags, diagnostics, endpoint = asyncio.run(async_bench(args))
+    lost = check_received(args, sent, diagnostics, endpoint)
+
+    print('sent {} line(s), received {}, dropped {}, still queued {}'.format(
+        len(sent), len(endpoint.lines), diagnostics['dropped'], diagnostics['queued']))
+    print('writes {} ({} failed), lost {}'.format(endpoint.requests, endpoint.errors, lost))
+    print('append (us)    ' + '  '.join('p{}={:.1f}'.format(point, value * 1e6)
+                                      for point, value in percentiles(costs).items()))
+    if lags:
+        print('loop lag (ms)  ' + '  '.join('p{}={:.2f}'.format(point, value * 1000)
+                                          for point, value in percentiles(lags).items()))
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,123 @@
+"""Micro-benchmark of the derived-metric engine as metrics are added.
+
+Adds N static metrics to the tables of ``metrics.py`` (one Site field each, a
+rate metric reading it and an energy integrating it over every period, like a
+battery or per-inverter energy would be) and times one sample through
+``MetricGraph`` and ``EnergyLedger`` while the three site powers change. The
+incremental engine is compared with recomputing and integrating every metric
+on every sample, after checking that both end with the same totals.
+
+    python benchmarks/bench_metrics.py --extra 0 50 200 --samples 20000
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from fronius_basic.metrics import (  # noqa: E402
+    MetricGraph, EnergyLedger, RATE_METRICS, ENERGY_METRICS, SETTLED_METRICS, DERIVED_TOTALS, ALL_PERIODS, _rounded,
+    _ordered
+    )
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def extended_tables(extra):
+    """Return the rate and energy tables with extra static metrics, and their Site fields."""
+    rates = dict(RATE_METRICS)
+    energies = dict(ENERGY_METRICS)
+    fields = {}
+    for index in range(extra):
+        field = 'P_Extra_{}'.format(index)
+        fields[field] = 100 + index
+        rates['extra_power_{}'.format(index)] = [(field,), _rounded]
+        energies['extra_energy_{}'.format(index)] = ['extra_power_{}'.format(index), ALL_PERIODS, None]
+    return rates, energies, fields
+
+
+def samples(count, fields):
+    """Return count Site blocks whose powers change on every sample, the extra fields never."""
+    rng = random.Random(1)
+    return [dict(fields, P_PV=rng.randint(0, 5000), P_Grid=rng.randint(-3000, 3000), P_Load=-rng.randint(0, 4000))
+            for _ in range(count)]
+
+
+def incremental(rates, energies):
+    """Return the sample function of the engine, and its ledger."""
+    graph = MetricGraph(rates)
+    ledger = EnergyLedger(energies, SETTLED_METRICS, DERIVED_TOTALS)
+
+    def sample(site):
+        ledger.advance(1)
+        changed = graph.update(site)
+        if changed:
+            ledger.set_rates(changed, graph.values)
+
+    return sample, ledger
+
+
+def full(rates, energies):
+    """Return a sample function recomputing every metric and adding to every total, and its totals."""
+    order = _ordered(rates)
+    values = dict.fromkeys(order, 0)
+    totals = {'{}_{}'.format(energy, period): 0 for energy, row in energies.items() for period in row[1]}
+    integrated = [(energy, rate, ['{}_{}'.format(energy, period) for period in periods])
+                  for energy, (rate, periods, _) in energies.items()]
+
+    def sample(site):
+        for energy, rate, keys in integrated:
+            for key in keys:
+                totals[key] += values[rate]
+        for metric in order:
+            inputs, formula = rates[metric]
+            values[metric] = formula(*[site[name] if name in site else values[name] for name in inputs])
+
+    return sample, totals
+
+
+def main():
+    """Time both engines for every number of extra metrics and print the per-sample cost."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--extra', type=int, nargs='+', default=[0, 50, 200])
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{} samples, best of {}'.format(args.samples, args.repeat))
+    print('  {:>6} {:>8} {:>16} {:>16}'.format('extra', 'totals', 'incremental', 'recompute all'))
+    for extra in args.extra:
+        rates, energies, fields = extended_tables(extra)
+        sites = samples(args.samples, fields)
+        results = []
+        for engine in (incremental, full):
+            best = None
+            for _ in range(args.repeat):
+                sample, totals = engine(rates, energies)
+                elapsed = timeit.timeit(lambda: [sample(site) for site in sites], number=1)
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((best / args.samples, totals))
+        (fast, ledger), (slow, totals) = results
+        mismatched = [key for key in totals if ledger.value(key) != totals[key]]
+        assert not mismatched, 'the engines disagree on {}'.format(mismatched[:3])
+        print('  {:>6} {:>8} {:>13.2f} us {:>13.2f} us'.format(extra, len(totals), fast * 1e6, slow * 1e6))
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
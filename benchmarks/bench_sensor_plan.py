@@ -0,0 +1,202 @@
+"""Micro-benchmark of the per-cycle sensor read/convert cost.
+
+Compares the former ``elif`` chain of ``FroniusSensor.async_update`` with the
+precompiled ``SensorPlan`` for the 26 site sensors plus N inverter sensors.
+
+    python benchmarks/bench_sensor_plan.py [--inverters 12] [--cycles 20000]
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from fronius_basic.const import SENSOR_LIST, INVERTER_SENSOR, BILLING_SENSORS  # noqa: E402
+from fronius_basic.plan import SensorPlan  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+SITE = {
+    'E_Day': 1097.6000366210938, 'E_Total': 4141480.375, 'E_Year': 517314.21875,
+    'Meter_Location': 'grid', 'Mode': 'meter', 'P_Akku': None,
+    'P_Grid': -1005.12, 'P_Load': -544.88, 'P_PV': 1550,
+    'rel_Autonomy': 100, 'rel_SelfConsumption': 35.15354838709,
+}
+
+ACCUMULATORS = [row[0] for row in SENSOR_LIST.values() if row[0] not in SITE]
+
+
+class StandInData:
+    """Fetcher stand-in exposing the same properties as FroniusFetcher."""
+
+    def __init__(self, inverters):
+        """Build a site block, an inverters block and some running totals."""
+        self._data = {
+            'Site': dict(SITE),
+            'Inverters': {
+                str(inverter): {'DT': 75, 'E_Day': 794.4, 'E_Total': 2014358.125, 'E_Year': 268438.7, 'P': 1200}
+                for inverter in range(1, inverters + 1)
+            },
+        }
+        for index, key in enumerate(ACCUMULATORS):
+            setattr(self, '_' + key, 1234567 * (index + 1))
+
+    @property
+    def latest_inverters(self):
+        """Return the latest data object."""
+        return self._data['Inverters']
+
+    @property
+    def latest_site(self):
+        """Return the latest data object."""
+        return self._data['Site']
+
+
+for _key in ACCUMULATORS:
+    setattr(StandInData, _key, property(lambda self, _attr='_' + _key: getattr(self, _attr)))
+
+
+class LegacySensor:
+    """Copy of the sensor read/convert logic before the compiled plan."""
+
+    def __init__(self, device_data, sensor_key):
+        """Initialize the sensor."""
+        self._sensor_key = sensor_key
+        self._data = device_data
+        self._state = None
+        if sensor_key.isnumeric():
+            self._json_key = INVERTER_SENSOR[0]
+            self._convert_units = INVERTER_SENSOR[3]
+        else:
+            self._json_key = SENSOR_LIST[sensor_key][0]
+            self._convert_units = SENSOR_LIST[sensor_key][3]
+
+    def update(self):
+        """Former body of FroniusSensor.async_update."""
+        state = None
+        if self._sensor_key.isnumeric():
+            if self._data.latest_inverters:
+                state = self._data.latest_inverters[self._sensor_key][self._json_key]
+                if state is None:
+                    state = 0
+        else:
+            if self._data.latest_site:
+                if self._json_key in self._data.latest_site:
+                    state = self._data.latest_site[self._json_key]
+                    if state is None:
+                        state = 0
+                else:
+                    if self._json_key == "pv_energy_hour":
+                        state = self._data.pv_energy_hour
+                    elif self._json_key == "pv_energy_month":
+                        state = self._data.pv_energy_month
+                    elif self._json_key == "grid_energy_hour":
+                        state = self._data.grid_energy_hour
+                    elif self._json_key == "grid_energy_today":
+                        state = self._data.grid_energy_today
+                    elif self._json_key == "grid_energy_month":
+                        state = self._data.grid_energy_month
+                    elif self._json_key == "grid_energy_total":
+                        state = self._data.grid_energy_total
+                    elif self._json_key == "house_energy_hour":
+                        state = self._data.house_energy_hour
+                    elif self._json_key == "house_energy_today":
+                        state = self._data.house_energy_today
+                    elif self._json_key == "house_energy_month":
+                        state = self._data.house_energy_month
+                    elif self._json_key == "house_energy_total":
+                        state = self._data.house_energy_total
+                    elif self._json_key == "grid_returned_energy_hour":
+                        state = self._data.grid_returned_energy_hour
+                    elif self._json_key == "grid_returned_energy_today":
+                        state = self._data.grid_returned_energy_today
+                    elif self._json_key == "grid_returned_energy_month":
+                        state = self._data.grid_returned_energy_month
+                    elif self._json_key == "grid_returned_energy_total":
+                        state = self._data.grid_returned_energy_total
+                    elif self._json_key == "balance_neto_hour":
+                        state = self._data.balance_neto_hour
+                    elif self._json_key == "balance_neto_today":
+                        state = self._data.balance_neto_today
+                    elif self._json_key == "balance_neto_month":
+                        state = self._data.balance_neto_month
+                    elif self._json_key == "balance_neto_total":
+                        state = self._data.balance_neto_total
+
+        if state is not None:
+            if self._convert_units == "energy":
+                self._state = int(round(state / 1000))
+            elif self._convert_units == "energy3":
+                self._state = round(state / 1000, 3)
+            elif self._convert_units == "energy_float":
+                self._state = round(state / 3600000, 3)
+            elif self._convert_units == "power":
+                self._state = int(round(state))
+            elif self._convert_units == "power_negative":
+                self._state = int(round(-state))
+            else:
+                self._state = int(round(state))
+        return self._state
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def main():
+    """Run both implementations and print the per-cycle cost."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inverters', type=int, default=12)
+    parser.add_argument('--cycles', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = StandInData(args.inverters)
+    # The billing period sensors came later, the former chain never read them
+    keys = [key for key in SENSOR_LIST if key not in BILLING_SENSORS] + list(data.latest_inverters)
+    legacy = [LegacySensor(data, key) for key in keys]
+    plans = [SensorPlan(data, key) for key in keys]
+
+    for sensor, plan in zip(legacy, plans):
+        assert sensor.update() == plan.value(), plan.sensor_key
+
+    def legacy_cycle():
+        for sensor in legacy:
+            sensor.update()
+
+    def plan_cycle():
+        for plan in plans:
+            plan.value()
+
+    print('{} sensors ({} site + {} inverters), {} cycles, best of {}'.format(
+        len(keys), len(keys) - args.inverters, args.inverters, args.cycles, args.repeat))
+    results = {}
+    for label, cycle in (('elif chain', legacy_cycle), ('compiled plan', plan_cycle)):
+        best = min(timeit.repeat(cycle, number=args.cycles, repeat=args.repeat))
+        results[label] = best / args.cycles
+        print('  {:<14} {:8.2f} us/cycle'.format(label, results[label] * 1e6))
+    print('  speedup        {:8.2f}x'.format(results['elif chain'] / results['compiled plan']))
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,133 @@
+"""Benchmark of the snapshot view: one poll of the device shared by many readers.
+
+Serves ``stub_server`` and ``SnapshotView`` in this process, polls the stub
+every ``--interval`` seconds with ``PowerflowData`` and runs ``--readers``
+long-polling readers (If-None-Match and ``?wait=``) against the view. Checks
+that every reader got every sample exactly once from its first one on, while
+the stub saw one request per poll, and reports the time from a sample to its
+delivery.
+
+    python benchmarks/bench_snapshot.py --readers 200 --interval 1 --samples 20
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'config', 'custom_components'))
+
+from stub_server import StubSolarApi, async_start_stub  # noqa: E402
+from bench_cycle import percentiles  # noqa: E402
+from fronius_basic.core import PowerflowData  # noqa: E402
+from fronius_basic.snapshot import DeviceSnapshot  # noqa: E402
+from fronius_basic.view import SnapshotView  # noqa: E402
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+async def async_start_view(snapshots):
+    """Serve the view without Home Assistant, return the runner and its base URL."""
+    view = SnapshotView(snapshots)
+    app = web.Application()
+
+    async def handle(request):
+        """Call the view as Home Assistant would."""
+        return await view.get(request, request.match_info['name'])
+
+    app.router.add_get(view.url, handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, 'http://127.0.0.1:{}'.format(runner.addresses[0][1])
+
+
+async def async_reader(session, url, wait, received, delays):
+    """Follow the snapshot until cancelled, keeping the time of every sample received."""
+    etag = None
+    while True:
+        headers = {'If-None-Match': etag} if etag else {}
+        async with session.get(url, params={'wait': wait}, headers=headers) as response:
+            if response.status == 200:
+                sample = json.loads(await response.read())
+                delays.append(time.time() - sample['time'])
+                received.append(sample['time'])
+                etag = response.headers['ETag']
+            elif response.status != 304:
+                await asyncio.sleep(0.1)
+
+
+async def async_bench(args):
+    """Poll the stub, run the readers and return what they received."""
+    stub = StubSolarApi(args.inverters, args.latency / 1000)
+    stub_runner, address = await async_start_stub(stub)
+    snapshots = {}
+    view_runner, base_url = await async_start_view(snapshots)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession() as device_session, aiohttp.ClientSession(connector=connector) as session:
+        fetcher = PowerflowData(device_session, address, scan_interval=args.interval)
+        fetcher.snapshot_feed = snapshots['bench'] = DeviceSnapshot('Bench')
+        readers = [([], []) for _ in range(args.readers)]
+        tasks = [asyncio.ensure_future(async_reader(session, base_url + '/api/fronius_basic/bench', args.wait,
+                                                    received, delays))
+                 for received, delays in readers]
+        # Let the readers connect and wait for the first sample
+        await asyncio.sleep(1)
+        sent = []
+        for _ in range(args.samples):
+            await fetcher.async_update()
+            sent.append(fetcher.last_success)
+            await asyncio.sleep(args.interval)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await view_runner.cleanup()
+    await stub_runner.cleanup()
+    return sent, readers, stub.requests, fetcher.snapshot_feed.diagnostics()
+
+
+def main():
+    """Parse the options, run the benchmark and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=50)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between polls')
+    parser.add_argument('--wait', type=float, default=30.0, help='long-poll wait of the readers in seconds')
+    parser.add_argument('--inverters', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='response time of the stub in ms')
+    args = parser.parse_args()
+
+    sent, readers, upstream, diagnostics = asyncio.run(async_bench(args))
+    late = 0
+    for received, _ in readers:
+        assert received and received == sent[len(sent) - len(received):], 'a reader missed or repeated a sample'
+        late += len(received) < len(sent)
+    delays = [delay for _, reader_delays in readers for delay in reader_delays]
+    print('{} sample(s), {} reader(s) ({} late), {} request(s) to the device, {} serialization(s), {} read(s)'.format(
+        len(sent), len(readers), late, upstream, diagnostics['serializations'], diagnostics['reads']))
+    print('delivery (ms)  ' + '  '.join('p{}={:.1f}'.format(point, value * 1000)
+                                      for point, value in percentiles(delays).items()))
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,292 @@
+"""Local stand-in for the Fronius Solar API.
+
+Serves ``GetPowerFlowRealtimeData.fcgi`` payloads shaped like the one in the
+README for a configurable number of inverters, the System scope of the meter,
+inverter and storage realtime requests, plus ``GetAPIVersion.cgi``, with
+optional latency, jitter and error injection. ``/write`` and ``/api/v2/write``
+stand in for InfluxDB and keep the lines posted there, with their own latency
+and error rate.
+
+    python benchmarks/stub_server.py --port 8080 --inverters 10 --latency 40 --jitter 20 --error-rate 0.01
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+POWERFLOW_PATH = '/solar_api/v1/GetPowerFlowRealtimeData.fcgi'
+API_VERSION_PATH = '/solar_api/GetAPIVersion.cgi'
+METER_PATH = '/solar_api/v1/GetMeterRealtimeData.cgi'
+INVERTER_PATH = '/solar_api/v1/GetInverterRealtimeData.cgi'
+STORAGE_PATH = '/solar_api/v1/GetStorageRealtimeData.cgi'
+WRITE_PATHS = ('/write', '/api/v2/write')
+
+API_VERSION = {'APIVersion': 1, 'BaseURL': '/solar_api/v1/', 'CompatibilityRange': '1.5-18'}
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class StubInverterSite:
+    """Random-walk model of a site with N inverters and a grid meter."""
+
+    def __init__(self, inverters=2, seed=0):
+        """Initialize the model."""
+        self._random = random.Random(seed)
+        self._inverter_power = [800.0] * inverters
+        self._load = 600.0
+        self._e_total = [2000000.0] * inverters
+        self._e_day = [0.0] * inverters
+        self._e_year = [250000.0] * inverters
+        self._latest = time.time()
+        self._consumed = 1500000.0
+        self._produced = 900000.0
+        self._state_of_charge = 50.0
+        self._grid = 0.0
+
+    def sample(self):
+        """Advance the model to now and return the Body.Data block."""
+        now = time.time()
+        elapsed = now - self._latest
+        self._latest = now
+        step = self._random.uniform
+        inverters = {}
+        for index, power in enumerate(self._inverter_power):
+            power = min(5000.0, max(0.0, power + step(-40, 40)))
+            self._inverter_power[index] = power
+            energy = power * elapsed / 3600
+            self._e_total[index] += energy
+            self._e_day[index] += energy
+            self._e_year[index] += energy
+            inverters[str(index + 1)] = {
+                'DT': 75, 'E_Day': self._e_day[index], 'E_Total': self._e_total[index],
+                'E_Year': self._e_year[index], 'P': int(power),
+            }
+        self._load = min(8000.0, max(100.0, self._load + step(-60, 60)))
+
+        pv = sum(self._inverter_power)
+        grid = self._load - pv
+        if grid > 0:
+            self._consumed += grid * elapsed / 3600
+        else:
+            self._produced -= grid * elapsed / 3600
+        self._grid = grid
+        return {
+            'Inverters': inverters,
+            'Site': {
+                'E_Day': sum(self._e_day), 'E_Total': sum(self._e_total), 'E_Year': sum(self._e_year),
+                'Meter_Location': 'grid', 'Mode': 'meter', 'P_Akku': None,
+                'P_Grid': round(grid, 2), 'P_Load': round(-self._load, 2), 'P_PV': round(pv) if pv else None,
+                'rel_Autonomy': 100 if grid <= 0 else round(100 * pv / self._load, 8),
+                'rel_SelfConsumption': None if not pv else round(100 * min(pv, self._load) / pv, 8),
+            },
+            'Version': '12',
+        }
+
+    def meter(self):
+        """Return the Body.Data block of the meter request."""
+        grid = self._grid
+        phase = {}
+        for index in (1, 2, 3):
+            voltage = round(230 + self._random.uniform(-3, 3), 1)
+            phase['Voltage_AC_Phase_{}'.format(index)] = voltage
+            phase['Current_AC_Phase_{}'.format(index)] = round(abs(grid) / 3 / voltage, 3)
+            phase['PowerReal_P_Phase_{}'.format(index)] = round(grid / 3, 2)
+        return {'0': dict(phase, **{
+            'Details': {'Manufacturer': 'Fronius', 'Model': 'Smart Meter 63A'},
+            'EnergyReal_WAC_Sum_Consumed': int(self._consumed), 'EnergyReal_WAC_Sum_Produced': int(self._produced),
+            'Frequency_Phase_Average': round(50 + self._random.uniform(-0.05, 0.05), 2),
+            'PowerReal_P_Sum': round(grid, 2),
+        })}
+
+    def inverters(self):
+        """Return the Body.Data block of the System scope inverter request."""
+        def values(items, unit):
+            return {'Unit': unit, 'Values': {str(index + 1): value for index, value in enumerate(items)}}
+        return {
+            'PAC': values([int(power) for power in self._inverter_power], 'W'),
+            'DAY_ENERGY': values(self._e_day, 'Wh'),
+            'YEAR_ENERGY': values(self._e_year, 'Wh'),
+            'TOTAL_ENERGY': values(self._e_total, 'Wh'),
+        }
+
+    def storage(self):
+        """Return the Body.Data block of the storage request."""
+        self._state_of_charge = min(100.0, max(5.0, self._state_of_charge + self._random.uniform(-0.2, 0.2)))
+        return {'0': {'Controller': {
+            'Capacity_Maximum': 9600, 'Current_DC': round(self._random.uniform(-5, 5), 2),
+            'StateOfCharge_Relative': round(self._state_of_charge, 1), 'Temperature_Cell': 24.5, 'Voltage_DC': 410.3,
+        }}}
+
+#   StubInverterSite
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class StubWriteEndpoint:
+    """Line protocol write endpoint keeping every line it accepted."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        """Initialize the endpoint, latency in seconds."""
+        self._random = random.Random(seed + 2)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lines = []
+        self.requests = 0
+        self.errors = 0
+
+    async def handle(self, request):
+        """Accept or fail one write."""
+        self.requests += 1
+        body = await request.read()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text='Service Unavailable')
+        self.lines.extend(body.decode().split('\n'))
+        return web.Response(status=204)
+
+#   StubWriteEndpoint
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class StubSolarApi:
+    """aiohttp application serving the stub site."""
+
+    def __init__(self, inverters=2, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, write_latency=0.0,
+                 write_error_rate=0.0):
+        """Initialize the stub, latency and jitter in seconds."""
+        self._site = StubInverterSite(inverters, seed)
+        self._random = random.Random(seed + 1)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.write_endpoint = StubWriteEndpoint(write_latency, write_error_rate, seed)
+
+    def application(self):
+        """Return the web application."""
+        app = web.Application()
+        app.router.add_get(POWERFLOW_PATH, self._handle(self._site.sample))
+        app.router.add_get(API_VERSION_PATH, self._handle_api_version)
+        app.router.add_get(METER_PATH, self._handle(self._site.meter))
+        app.router.add_get(INVERTER_PATH, self._handle(self._site.inverters))
+        app.router.add_get(STORAGE_PATH, self._handle(self._site.storage))
+        for path in WRITE_PATHS:
+            app.router.add_post(path, self.write_endpoint.handle)
+        return app
+
+    async def _delay(self):
+        """Simulate the response time of the Datamanager."""
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _handle(self, sample):
+        """Return a handler serving the Body.Data blocks returned by sample."""
+        async def handler(request):
+            """Serve one sample."""
+            self.requests += 1
+            await self._delay()
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return web.Response(status=500, text='Internal Server Error')
+            return web.Response(text=self.render(sample()), content_type='text/javascript')
+        return handler
+
+    def render(self, data):
+        """Return the response text wrapping a Body.Data block, indented as the Datamanager does."""
+        return json.dumps(self._body(data), indent=3)
+
+    def _body(self, data):
+        """Wrap a Body.Data block in a response."""
+        return {
+            'Body': {'Data': data},
+            'Head': {
+                'RequestArguments': {},
+                'Status': {'Code': 0, 'Reason': '', 'UserMessage': ''},
+                'Timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            },
+        }
+
+    async def _handle_api_version(self, request):
+        """Serve the API version."""
+        return web.json_response(API_VERSION)
+
+#   StubSolarApi
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+async def async_start_stub(stub, host='127.0.0.1', port=0):
+    """Serve the stub, return the runner and the host:port to poll."""
+    runner = web.AppRunner(stub.application(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, '{}:{}'.format(host, port)
+
+
+def add_stub_arguments(parser):
+    """Add the stub options to an argument parser."""
+    parser.add_argument('--inverters', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='response time in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- response time in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of HTTP 500 responses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--write-latency', type=float, default=0.0, help='response time of /write in ms')
+    parser.add_argument('--write-error-rate', type=float, default=0.0, help='share of failed writes')
+
+
+def stub_from_arguments(args):
+    """Build a stub from parsed options."""
+    return StubSolarApi(args.inverters, args.latency / 1000, args.jitter / 1000, args.error_rate, args.seed,
+                        args.write_latency / 1000, args.write_error_rate)
+
+
+def main():
+    """Serve the stub until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(stub_from_arguments(args).application(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
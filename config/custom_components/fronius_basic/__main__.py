@@ -0,0 +1,234 @@
+"""Command line collector, without Home Assistant.
+
+    python -m fronius_basic poll 192.168.1.6 [--interval 4] [--count 10] [--json] [--state totals.json]
+    python -m fronius_basic record 192.168.1.6 samples/ [--interval 2] [--keep-days 90] [--state totals.json]
+    python -m fronius_basic poll 192.168.1.6 --quiet --export-url 'http://localhost:8086/write?db=solar'
+    python -m fronius_basic print samples/ [--start 2024-05-01] [--end 2024-05-02]
+
+Run it from the custom_components directory, or with that directory on PYTHONPATH.
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+from .const import ACCUMULATORS, ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS
+from .core import PowerflowData, create_session, DEFAULT_SCAN_SECONDS, MAX_GAP_FACTOR
+from .export import BatchExporter, HttpSink, FORMAT_LINE, FORMAT_JSON
+from .rollover import parse_window, DEFAULT_BILLING_DAY, MAX_BILLING_DAY
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+# Seconds between two writes of the recorded samples and of the running totals
+FLUSH_INTERVAL = 30
+
+LINE_FORMAT = ('{time}  pv {P_PV:>6} W  grid {P_Grid:>6} W  house {P_Load:>6} W  '
+               'grid today {grid:.3f} kWh  returned today {returned:.3f} kWh')
+CSV_COLUMNS = ('timestamp', 'P_PV', 'P_Grid', 'P_Load', 'E_Day', 'E_Year', 'E_Total')
+
+WS_PER_KWH = 3600000
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def parse_time(text):
+    """Parse a timestamp or an ISO date and time, in local time unless it has an offset."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def parse_tariff(text):
+    """Parse a name=HH:MM-HH:MM[,HH:MM-HH:MM...] option."""
+    name, _, windows = text.partition('=')
+    if not name or not windows:
+        raise argparse.ArgumentTypeError('expected name=HH:MM-HH:MM, got {!r}'.format(text))
+    try:
+        return name, [parse_window(window) for window in windows.split(',')]
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def _power(value):
+    """Round a power for printing, 'null' as 0."""
+    return int(round(value or 0))
+
+
+def print_sample(fetcher, as_json):
+    """Print the latest sample of a fetcher and its running totals."""
+    site = fetcher.latest_site
+    if as_json:
+        print(json.dumps({
+            'time': fetcher.last_success,
+            'site': site,
+            'inverters': fetcher.latest_inverters,
+            'totals': {key: getattr(fetcher, key) for key in ACCUMULATORS},
+            'tariffs': fetcher.tariff_energy,
+        }), flush=True)
+        return
+    print(LINE_FORMAT.format(
+        time=datetime.fromtimestamp(fetcher.last_success).strftime('%Y-%m-%d %H:%M:%S'),
+        P_PV=_power(site.get('P_PV')), P_Grid=_power(site.get('P_Grid')), P_Load=_power(site.get('P_Load')),
+        grid=fetcher.grid_energy_today / WS_PER_KWH, returned=fetcher.grid_returned_energy_today / WS_PER_KWH,
+    ), flush=True)
+
+
+def _build_fetcher(session, args):
+    """Return the fetcher of the device, with its running totals restored from --state."""
+    fetcher = PowerflowData(session, args.host, accumulation=args.accumulation, scan_interval=args.interval,
+                            max_gap=MAX_GAP_FACTOR * args.interval, billing_day=args.billing_day,
+                            tariffs=dict(args.tariff))
+    store = None
+    if args.state:
+        from .persistence import AccumulatorStore
+
+        store = AccumulatorStore(args.state)
+        state = store.load()
+        if state:
+            fetcher.restore(state)
+    return fetcher, store
+
+
+async def async_collect(args):
+    """Poll the device every --interval seconds, print and record the samples."""
+    session = create_session()
+    fetcher, store = _build_fetcher(session, args)
+    recorder = None
+    if getattr(args, 'directory', None):
+        from .samples import SampleWriter
+
+        recorder = fetcher.recorder = SampleWriter(args.directory, keep_days=args.keep_days)
+    exporter = None
+    if args.export_url:
+        exporter = BatchExporter(HttpSink(session, args.export_url, args.export_token), args.export_format)
+        fetcher.exporter = exporter.feed(args.host)
+        exporter.start()
+
+    def flush():
+        """Write the buffered samples and the running totals."""
+        if recorder is not None:
+            recorder.flush()
+        if store is not None:
+            store.write(fetcher.snapshot())
+
+    polls = 0
+    last_printed = None
+    next_poll = next_flush = time.monotonic()
+    try:
+        while args.count is None or polls < args.count:
+            await fetcher.async_update()
+            polls += 1
+            if fetcher.last_success != last_printed and not args.quiet:
+                last_printed = fetcher.last_success
+                print_sample(fetcher, args.json)
+            now = time.monotonic()
+            if now - next_flush >= FLUSH_INTERVAL:
+                next_flush = now
+                flush()
+            # Keep the cadence, but never catch up missed polls
+            next_poll += args.interval
+            if next_poll < now:
+                next_poll = now
+            await asyncio.sleep(next_poll - now)
+    finally:
+        flush()
+        if exporter is not None:
+            await exporter.async_stop()
+        await session.close()
+
+
+def print_recording(args):
+    """Print the recorded samples of a directory as CSV."""
+    from .samples import SampleArchive
+
+    start = parse_time(args.start) if args.start else None
+    end = parse_time(args.end) if args.end else None
+    out = sys.stdout
+    header = None
+    for sample in SampleArchive(args.directory).iter_range(start, end):
+        inverters = sorted(sample.inverters, key=int)
+        if inverters != header:
+            header = inverters
+            out.write(','.join(CSV_COLUMNS + tuple('P_' + inverter for inverter in inverters)) + '\n')
+        values = [sample.timestamp, sample.P_PV, sample.P_Grid, sample.P_Load, sample.E_Day, sample.E_Year, sample.E_Total]
+        values.extend(sample.inverters[inverter] for inverter in inverters)
+        out.write(','.join('' if value is None else str(value) for value in values) + '\n')
+
+
+def _add_poll_arguments(parser):
+    """Add the options of the commands polling a device."""
+    parser.add_argument('host', help='address of the Datamanager, e.g. 192.168.1.6')
+    parser.add_argument('--interval', type=float, default=DEFAULT_SCAN_SECONDS, help='seconds between polls')
+    parser.add_argument('--count', type=int, help='stop after this many polls')
+    parser.add_argument('--accumulation', choices=[ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS],
+                        default=ACCUMULATION_INTEGRATION)
+    parser.add_argument('--billing-day', type=int, choices=range(1, MAX_BILLING_DAY + 1), default=DEFAULT_BILLING_DAY,
+                        metavar='DAY')
+    parser.add_argument('--tariff', type=parse_tariff, action='append', default=[], metavar='NAME=HH:MM-HH:MM',
+                        help='time windows of a tariff, repeat for every tariff')
+    parser.add_argument('--state', help='file keeping the running totals between runs')
+    parser.add_argument('--json', action='store_true', help='print every sample as a JSON line')
+    parser.add_argument('--quiet', action='store_true', help='do not print the samples')
+    parser.add_argument('--export-url', help='write the samples in batches to this address, e.g. the /write of InfluxDB')
+    parser.add_argument('--export-token', help='InfluxDB 2 token of --export-url')
+    parser.add_argument('--export-format', choices=[FORMAT_LINE, FORMAT_JSON], default=FORMAT_LINE)
+
+
+def main(argv=None):
+    """Parse the command line and run the command."""
+    parser = argparse.ArgumentParser(prog='python -m fronius_basic', description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    poll = commands.add_parser('poll', help='poll a device and print the samples and running totals')
+    _add_poll_arguments(poll)
+
+    record = commands.add_parser('record', help='poll a device and record the samples to a directory')
+    _add_poll_arguments(record)
+    record.add_argument('directory', help='one file per UTC day is written there')
+    record.add_argument('--keep-days', type=int, help='delete the files older than this many days')
+
+    show = commands.add_parser('print', help='print the samples recorded in a directory as CSV')
+    show.add_argument('directory')
+    show.add_argument('--start', help='timestamp or ISO date and time')
+    show.add_argument('--end', help='timestamp or ISO date and time')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    if args.command == 'print':
+        print_recording(args)
+        return
+    try:
+        asyncio.run(async_collect(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
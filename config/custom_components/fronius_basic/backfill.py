@@ -0,0 +1,311 @@
+"""Batch recomputation of the running totals from recorded samples."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import time
+from datetime import datetime
+from functools import partial
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .const import ACCUMULATORS, HOUR_START, HOUR_COLUMNS
+from .rollover import CLOSE_HOUR, CLOSE_DAY, CLOSE_MONTH, CLOSE_BILLING, DEFAULT_BILLING_DAY, RolloverClock
+from .samples import NULL_POWER, COUNTER_TYPES, SampleArchive, SampleFile
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+# Per-interval quantities, in the order of the cumulative sums
+_PV, _IMPORT, _EXPORT, _HOUSE = range(4)
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _require_numpy():
+    """Fail early when numpy is not installed."""
+    if np is None:
+        raise ImportError('the backfill needs numpy, install it with: pip install numpy')
+
+
+def _utc_offset(tz, timestamp):
+    """Return the UTC offset (s) of tz at one timestamp, of the system time zone when tz is None."""
+    if tz is None:
+        return time.localtime(timestamp).tm_gmtoff
+    return int(datetime.fromtimestamp(timestamp, tz).utcoffset().total_seconds())
+
+
+def _rounded_power(centiwatts):
+    """Return the powers (W) as the live path rounds them, 'null' as 0."""
+    watts = centiwatts / 100.0
+    np.rint(watts, out=watts)
+    nulls = centiwatts == NULL_POWER
+    if nulls.any():
+        watts[nulls] = 0
+    return watts
+
+
+def read_sample_file(path, start=None, end=None):
+    """Return the timestamps and the P_PV, P_Grid, P_Load centiwatts of one file."""
+    _require_numpy()
+    with SampleFile(path) as sample_file:
+        first = 0 if start is None else sample_file.bisect(start)
+        last = len(sample_file) if end is None else sample_file.bisect(end)
+        counter = '<' + COUNTER_TYPES[sample_file.version]
+        dtype = np.dtype([
+            ('timestamp', '<f8'), ('P_PV', '<i4'), ('P_Grid', '<i4'), ('P_Load', '<i4'),
+            ('E_Day', counter), ('E_Year', counter), ('E_Total', counter),
+            ('inverters', '<f4', (len(sample_file.inverter_ids),)),
+        ])
+        buffer = sample_file.buffer
+        records = np.frombuffer(buffer, dtype=dtype)[first:last]
+        # Copy out of the map so it can be closed
+        columns = tuple(records[name].copy() for name in ('timestamp', 'P_PV', 'P_Grid', 'P_Load'))
+        del records
+        buffer.release()
+    return columns
+
+
+def recompute_archive(directory, max_gap, tz=None, state=None, start=None, end=None,
+                      billing_day=DEFAULT_BILLING_DAY, tariffs=None):
+    """Recompute a recording directory day by day, return the hourly rows and the final state."""
+    _require_numpy()
+    engine = BatchAccumulator(max_gap, tz, state, billing_day, tariffs)
+    rows = [engine.ingest(*read_sample_file(path, start, end)) for path in SampleArchive(directory).paths(start, end)]
+    return concatenate_rows(rows), engine.snapshot()
+
+
+def recompute_hours(directory, max_gap, tz=None, start=None, end=None, billing_day=DEFAULT_BILLING_DAY, tariffs=None):
+    """Recompute the whole hours of a recording from the local hour start falls in, return their rows.
+
+    The samples of the max_gap seconds before that hour are read too, so a
+    sample before its start carries the energy up to it as on the live path;
+    the rows of earlier hours are dropped. When the recording only starts
+    after the start of the first hour, that hour holds part of its energy and
+    is dropped as well, so every row is a whole hour.
+    """
+    _require_numpy()
+    archive = SampleArchive(directory)
+    if start is None:
+        first = next(archive.iter_range(end=end), None)
+        if first is None:
+            return concatenate_rows([])
+        start = first.timestamp
+    clock = RolloverClock(partial(_utc_offset, tz))
+    clock.start(start)
+    hour = clock.hour_start
+
+    first = next(archive.iter_range(hour - max_gap, end), None)
+    rows, _ = recompute_archive(directory, max_gap, tz, start=hour - max_gap, end=end, billing_day=billing_day,
+                                tariffs=tariffs)
+    starts = rows[HOUR_START]
+    keep = starts >= hour
+    kept = np.flatnonzero(keep)
+    if len(kept) and first.timestamp > starts[kept[0]]:
+        # No sample before the start of the first hour, it only holds the energy from its first sample on
+        keep[kept[0]] = False
+    return {column: values[keep] for column, values in rows.items()}
+
+
+def concatenate_rows(rows):
+    """Join the hourly rows of several ingest calls."""
+    _require_numpy()
+    columns = (HOUR_START,) + HOUR_COLUMNS
+    if not rows:
+        return {column: np.empty(0, dtype=np.float64 if column == HOUR_START else np.int64) for column in columns}
+    return {column: np.concatenate([row[column] for row in rows]) for column in columns}
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class BatchAccumulator:
+    """Vectorized equivalent of the integration mode of FroniusFetcher.ingest.
+
+    Samples are fed as arrays, a day file or any other time-ordered chunk at
+    a time, and folded with cumulative sums instead of one Python call per
+    sample. Every rule of the live path is kept: the power of a sample is
+    rounded to whole watts and integrated over the rounded seconds to the next
+    sample, gaps longer than ``max_gap`` add nothing, the boundaries come from
+    the same RolloverClock, an interval that passes one is split at the whole
+    seconds up to it, and the balance neto of an hour is settled when it
+    closes. As all the arithmetic is on integers, the results are identical to
+    replaying the same samples through the fetcher, not just close to them.
+    """
+
+    def __init__(self, max_gap, tz=None, state=None, billing_day=DEFAULT_BILLING_DAY, tariffs=None):
+        """Start from a FroniusFetcher snapshot, or from zero."""
+        _require_numpy()
+        self._max_gap = max_gap
+        self._tz = tz
+        self._clock = RolloverClock(self._offset, billing_day, tariffs)
+        state = state or {}
+        self._totals = {key: state.get(key, 0) for key in ACCUMULATORS}
+        saved = state.get('tariffs') or {}
+        self._tariff_energy = {tariff: list(saved.get(tariff, (0, 0))) for tariff in self._clock.tariffs}
+        self._position = state.get('clock')
+        self._latest_call = None
+        self._latest_powers = (0, 0, 0)
+
+    def snapshot(self):
+        """Return the running totals in the FroniusFetcher.snapshot format."""
+        state = {key: int(value) for key, value in self._totals.items()}
+        state['tariffs'] = {tariff: [int(value) for value in energy] for tariff, energy in self._tariff_energy.items()}
+        state['clock'] = self._latest_call if self._clock.started else None
+        return state
+
+    def _offset(self, timestamp):
+        """Return the UTC offset (s) at one timestamp."""
+        return _utc_offset(self._tz, timestamp)
+
+    def _boundaries(self, first, last):
+        """Return the boundaries up to last, the hour each one closes, its CLOSE_* flags and the tariffs between them."""
+        clock = self._clock
+        if not clock.started:
+            # Like the live path, a fresh clock starts at the first sample
+            clock.start(first if self._position is None else self._position)
+        bounds, hour_starts, closes, tariffs = [], [], [], [clock.tariff]
+        while clock.next_boundary <= last:
+            bounds.append(clock.next_boundary)
+            hour_starts.append(clock.hour_start)
+            closes.append(clock.advance())
+            tariffs.append(clock.tariff)
+        return (np.array(bounds, dtype=np.float64), np.array(hour_starts, dtype=np.float64),
+                np.array(closes, dtype=np.int64), tariffs)
+
+    def ingest(self, timestamps, pv, grid, load):
+        """Fold time-ordered samples, powers in centiwatts, return the rows of the hours they closed."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        count = len(timestamps)
+        if not count:
+            return concatenate_rows([])
+        # Whole watts and seconds in float64, so every product and sum below is an exact integer up to 2**53 Ws
+        powers = [_rounded_power(np.asarray(values)) for values in (pv, grid, load)]
+        elapsed = np.empty(count)
+        elapsed[0] = round(float(timestamps[0]) - self._latest_call) if self._latest_call is not None else 0
+        np.rint(np.diff(timestamps), out=elapsed[1:])
+        elapsed[elapsed > self._max_gap] = 0
+
+        # Power over every interval, that of the sample opening it, as PV, import, export and house
+        opening = [np.concatenate(([latest], values[:-1])) for latest, values in zip(self._latest_powers, powers)]
+        rates = [opening[0], np.maximum(opening[1], 0), np.maximum(-opening[1], 0), np.maximum(-opening[2], 0)]
+        cumulative = [np.cumsum(rate * elapsed) for rate in rates]
+        ends = [float(values[-1]) for values in cumulative]
+
+        # Energy up to every boundary: the intervals before the one it falls in, plus the share of that one
+        bounds, hour_starts, closes, tariffs = self._boundaries(float(timestamps[0]), float(timestamps[-1]))
+        index = np.searchsorted(timestamps, bounds, side='left')
+        before = np.maximum(index - 1, 0)
+        latest = bounds if self._latest_call is None else self._latest_call
+        opened = np.where(index > 0, timestamps[before], latest)
+        cut = np.minimum(elapsed[index], np.maximum(0, np.rint(bounds - opened)))
+        at_bounds = [np.where(index > 0, values[before], 0) + rate[index] * cut
+                     for values, rate in zip(cumulative, rates)]
+
+        totals = self._totals
+        hours = np.flatnonzero(closes & CLOSE_HOUR)
+        rows = self._hour_rows(hour_starts[hours], [values[hours] for values in at_bounds], totals)
+        settled = rows['balance_neto']
+
+        def since(quantity, flag, carried):
+            """Return the energy of a period closed at flag, carried over when it was not closed."""
+            resets = np.flatnonzero(closes & flag)
+            if len(resets):
+                return int(ends[quantity] - at_bounds[quantity][resets[-1]])
+            return carried + int(ends[quantity])
+
+        def settled_since(flag, carried):
+            """Return the balance neto settled since the period closed at flag, the hour closing with it excluded."""
+            resets = np.flatnonzero(closes & flag)
+            if len(resets):
+                return int(settled[hours > resets[-1]].sum())
+            return carried + int(settled.sum())
+
+        for name, quantity in (('pv_energy', _PV), ('grid_energy', _IMPORT), ('house_energy', _HOUSE),
+                               ('grid_returned_energy', _EXPORT)):
+            totals[name + '_hour'] = since(quantity, CLOSE_HOUR, totals[name + '_hour'])
+            totals[name + '_month'] = since(quantity, CLOSE_MONTH, totals[name + '_month'])
+            totals[name + '_billing'] = since(quantity, CLOSE_BILLING, totals[name + '_billing'])
+            if name != 'pv_energy':
+                totals[name + '_today'] = since(quantity, CLOSE_DAY, totals[name + '_today'])
+                totals[name + '_total'] += int(ends[quantity])
+        if len(hours):
+            totals['balance_neto_hour'] = totals['grid_returned_energy_hour'] - totals['grid_energy_hour']
+        else:
+            totals['balance_neto_hour'] += int(ends[_EXPORT] - ends[_IMPORT])
+        totals['balance_neto_today'] = settled_since(CLOSE_DAY, totals['balance_neto_today'])
+        totals['balance_neto_month'] = settled_since(CLOSE_MONTH, totals['balance_neto_month'])
+        totals['balance_neto_billing'] = settled_since(CLOSE_BILLING, totals['balance_neto_billing'])
+        totals['balance_neto_total'] += int(settled.sum())
+
+        if self._tariff_energy:
+            self._add_tariffs(at_bounds, ends, closes, tariffs)
+
+        self._latest_call = float(timestamps[-1])
+        self._latest_powers = tuple(float(values[-1]) for values in powers)
+        return rows
+
+    def _add_tariffs(self, at_bounds, ends, closes, tariffs):
+        """Add the grid energy between the boundaries to the tariff in force, since the last billing close."""
+        segments = [np.diff(np.concatenate(([0], at_bounds[quantity], [ends[quantity]])))
+                    for quantity in (_IMPORT, _EXPORT)]
+        tariffs = np.array(tariffs, dtype=object)
+        resets = np.flatnonzero(closes & CLOSE_BILLING)
+        # Segment k follows boundary k - 1
+        first = resets[-1] + 1 if len(resets) else 0
+        for tariff, energy in self._tariff_energy.items():
+            if len(resets):
+                energy[0] = energy[1] = 0
+            inside = np.flatnonzero(tariffs[first:] == tariff) + first
+            energy[0] += int(segments[0][inside].sum())
+            energy[1] += int(segments[1][inside].sum())
+
+    def _hour_rows(self, starts, at_hours, totals):
+        """Return one row per hour closed, given the energy up to every hour close."""
+        carried = (totals['pv_energy_hour'], totals['grid_energy_hour'], totals['grid_returned_energy_hour'],
+                   totals['house_energy_hour'])
+        hour_energy = [np.diff(np.concatenate(([-carried_energy], values)))
+                       for values, carried_energy in zip(at_hours, carried)]
+        grid_hour, returned_hour = hour_energy[_IMPORT], hour_energy[_EXPORT]
+        settled = np.minimum(grid_hour, returned_hour)
+        columns = {
+            'pv_energy_hour': hour_energy[_PV],
+            'grid_energy_hour': grid_hour,
+            'house_energy_hour': hour_energy[_HOUSE],
+            'grid_returned_energy_hour': returned_hour,
+            'balance_neto': settled,
+            'grid_energy_total': totals['grid_energy_total'] + at_hours[_IMPORT],
+            'house_energy_total': totals['house_energy_total'] + at_hours[_HOUSE],
+            'grid_returned_energy_total': totals['grid_returned_energy_total'] + at_hours[_EXPORT],
+            'balance_neto_total': totals['balance_neto_total'] + np.cumsum(settled),
+        }
+        rows = {column: values.astype(np.int64) for column, values in columns.items()}
+        rows[HOUR_START] = starts
+        return rows
+
+#   BatchAccumulator
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
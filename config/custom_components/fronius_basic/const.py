@@ -0,0 +1,131 @@
+"""Constants for the Fronius Basic component."""
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+DOMAIN = 'fronius_basic'
+
+# Period energies integrated from power samples, or taken from energy counter deltas where a counter exists
+ACCUMULATION_INTEGRATION = 'integration'
+ACCUMULATION_COUNTERS = 'counters'
+
+COUNTER_PV = 'pv'
+COUNTER_GRID_IMPORT = 'grid_import'
+COUNTER_GRID_EXPORT = 'grid_export'
+
+# Solar API endpoints polled besides the power flow, at their own interval
+ENDPOINT_METER = 'meter'
+ENDPOINT_STORAGE = 'storage'
+ENDPOINT_INVERTER = 'inverter'
+
+# What to do with a poll that is due while the previous one of the same device is still running
+OVERLAP_SKIP = 'skip'
+OVERLAP_COALESCE = 'coalesce'
+
+# Running totals (Ws) kept by the fetcher, readable as properties of the same name
+ACCUMULATORS = (
+    'pv_energy_hour', 'pv_energy_month',
+    'grid_energy_hour', 'grid_energy_today', 'grid_energy_month', 'grid_energy_total',
+    'house_energy_hour', 'house_energy_today', 'house_energy_month', 'house_energy_total',
+    'grid_returned_energy_hour', 'grid_returned_energy_today', 'grid_returned_energy_month', 'grid_returned_energy_total',
+    'balance_neto_hour', 'balance_neto_today', 'balance_neto_month', 'balance_neto_total',
+    'pv_energy_billing', 'grid_energy_billing', 'grid_returned_energy_billing', 'house_energy_billing',
+    'balance_neto_billing',
+)
+
+# Sensors of the billing period, only created when a billing_day or tariffs are set
+BILLING_SENSORS = (
+    'pv_energy_billing', 'grid_energy_billing', 'grid_returned_energy_billing', 'house_energy_billing',
+    'balance_neto_billing',
+)
+
+# Columns of the hourly rows of closed hours, energies in Ws, as kept live and recomputed by the backfill
+HOUR_START = 'start'
+HOUR_COLUMNS = (
+    'pv_energy_hour', 'grid_energy_hour', 'house_energy_hour', 'grid_returned_energy_hour',
+    'balance_neto',
+    'grid_energy_total', 'house_energy_total', 'grid_returned_energy_total', 'balance_neto_total',
+)
+
+# Site fields added up over the devices of an aggregate
+SUMMED_SITE_KEYS = ('P_PV', 'P_Grid', 'P_Load', 'P_Akku', 'E_Day', 'E_Year', 'E_Total')
+
+# Key: ['json_key', 'name', 'unit', 'convert_units', 'icon']
+SENSOR_LIST = {
+    'pv_power': ['P_PV', 'PV power', 'W', 'Power', 'mdi:gauge'],
+    'grid_power': ['P_Grid', 'Grid Power', 'W', 'power', 'mdi:gauge'],
+    'house_power': ['P_Load', 'House Power', 'W', 'power_negative', 'mdi:gauge'],
+
+    'self_sufficiency': ['rel_Autonomy', 'Self Sufficiency', '%', False, 'mdi:brightness-percent'],
+    'self_consumption': ['rel_SelfConsumption', 'Self Consumption', '%', False, 'mdi:brightness-percent'],
+
+    'pv_energy_hour': ['pv_energy_hour', 'PV Energy Hour', 'kWh', 'energy_float', 'mdi:solar-panel'],
+    'pv_energy_today': ['E_Day', 'PV Energy Today', 'kWh', 'energy3', 'mdi:solar-panel'],
+    'pv_energy_month': ['pv_energy_month', 'PV Energy Month', 'kWh', 'energy_float', 'mdi:solar-panel'],
+    'pv_energy_year': ['E_Year', 'PV Energy Year', 'kWh', 'energy', 'mdi:solar-panel'],
+    'pv_energy_total': ['E_Total', 'PV Energy Total', 'kWh', 'energy', 'mdi:solar-panel'],
+
+    'grid_energy_hour': ['grid_energy_hour', 'Grid Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_energy_today': ['grid_energy_today', 'Grid Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_energy_month': ['grid_energy_month', 'Grid Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_energy_total': ['grid_energy_total', 'Grid Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+
+    'house_energy_hour': ['house_energy_hour', 'House Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'house_energy_today': ['house_energy_today', 'House Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'house_energy_month': ['house_energy_month', 'House Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'house_energy_total': ['house_energy_total', 'House Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+
+    'grid_returned_energy_hour': ['grid_returned_energy_hour', 'Grid Returned Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_returned_energy_today': ['grid_returned_energy_today', 'Grid Returned Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_returned_energy_month': ['grid_returned_energy_month', 'Grid Returned Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_returned_energy_total': ['grid_returned_energy_total', 'Grid Returned Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+
+    'balance_neto_hour': ['balance_neto_hour', 'Balance Neto Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'balance_neto_today': ['balance_neto_today', 'Balance Neto Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'balance_neto_month': ['balance_neto_month', 'Balance Neto Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'balance_neto_total': ['balance_neto_total', 'Balance Neto Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+
+    'pv_energy_billing': ['pv_energy_billing', 'PV Energy Billing Period', 'kWh', 'energy_float', 'mdi:solar-panel'],
+    'grid_energy_billing': ['grid_energy_billing', 'Grid Energy Billing Period', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'grid_returned_energy_billing': ['grid_returned_energy_billing', 'Grid Returned Energy Billing Period', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'house_energy_billing': ['house_energy_billing', 'House Energy Billing Period', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+    'balance_neto_billing': ['balance_neto_billing', 'Balance Neto Billing Period', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+}
+
+# Sensors of the optional endpoints, keyed by endpoint, rows as in SENSOR_LIST
+ENDPOINT_SENSOR_LIST = {
+    ENDPOINT_METER: {
+        'meter_voltage_phase_1': ['Voltage_AC_Phase_1', 'Meter Voltage Phase 1', 'V', 'decimal', 'mdi:flash'],
+        'meter_voltage_phase_2': ['Voltage_AC_Phase_2', 'Meter Voltage Phase 2', 'V', 'decimal', 'mdi:flash'],
+        'meter_voltage_phase_3': ['Voltage_AC_Phase_3', 'Meter Voltage Phase 3', 'V', 'decimal', 'mdi:flash'],
+        'meter_current_phase_1': ['Current_AC_Phase_1', 'Meter Current Phase 1', 'A', 'decimal', 'mdi:current-ac'],
+        'meter_current_phase_2': ['Current_AC_Phase_2', 'Meter Current Phase 2', 'A', 'decimal', 'mdi:current-ac'],
+        'meter_current_phase_3': ['Current_AC_Phase_3', 'Meter Current Phase 3', 'A', 'decimal', 'mdi:current-ac'],
+        'meter_power_phase_1': ['PowerReal_P_Phase_1', 'Meter Power Phase 1', 'W', 'power', 'mdi:gauge'],
+        'meter_power_phase_2': ['PowerReal_P_Phase_2', 'Meter Power Phase 2', 'W', 'power', 'mdi:gauge'],
+        'meter_power_phase_3': ['PowerReal_P_Phase_3', 'Meter Power Phase 3', 'W', 'power', 'mdi:gauge'],
+        'meter_frequency': ['Frequency_Phase_Average', 'Meter Frequency', 'Hz', 'decimal', 'mdi:sine-wave'],
+        'meter_energy_consumed': ['EnergyReal_WAC_Sum_Consumed', 'Meter Energy Consumed', 'kWh', 'energy3', 'mdi:transmission-tower'],
+        'meter_energy_produced': ['EnergyReal_WAC_Sum_Produced', 'Meter Energy Produced', 'kWh', 'energy3', 'mdi:transmission-tower'],
+    },
+    ENDPOINT_STORAGE: {
+        'storage_state_of_charge': ['StateOfCharge_Relative', 'Storage State Of Charge', '%', 'decimal', 'mdi:battery'],
+        'storage_voltage': ['Voltage_DC', 'Storage Voltage', 'V', 'decimal', 'mdi:flash'],
+        'storage_current': ['Current_DC', 'Storage Current', 'A', 'decimal', 'mdi:current-dc'],
+        'storage_temperature': ['Temperature_Cell', 'Storage Temperature', '°C', 'decimal', 'mdi:thermometer'],
+    },
+}
+
+# Row used for every inverter found in the 'Inverters' block, keyed by the inverter id
+INVERTER_SENSOR = ['P', 'Inverter{} Power', 'W', 'power', 'mdi:gauge']
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,451 @@
+"""Polling client and running totals of a Fronius device, without Home Assistant.
+
+Only the standard library and the other modules of this package are loaded
+on import; aiohttp is loaded by the first request, or by create_session.
+"""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import asyncio
+import logging
+import time
+from time import perf_counter
+
+from .const import (
+    ACCUMULATORS, ACCUMULATION_INTEGRATION, COUNTER_PV, COUNTER_GRID_IMPORT, COUNTER_GRID_EXPORT, OVERLAP_SKIP,
+    OVERLAP_COALESCE, ENDPOINT_METER, SUMMED_SITE_KEYS
+    )
+from .health import CircuitBreaker, STATE_HALF_OPEN, DEFAULT_MIN_RETRY_DELAY
+from .endpoints import EndpointSchedule, ENDPOINT_URLS, ENDPOINT_PARSERS
+from .rollover import system_offset, DEFAULT_BILLING_DAY
+from .totals import RunningTotals
+from .decode import decode_response, decode_powerflow, BACKEND as DECODE_BACKEND
+from .instrumentation import Tracer, STAGE_HTTP, STAGE_DECODE, STAGE_ACCUMULATE, STAGE_FANOUT, STAGE_CYCLE
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+_POWERFLOW_URL = 'http://{}/solar_api/v1/GetPowerFlowRealtimeData.fcgi'
+_PROBE_URL = 'http://{}/solar_api/GetAPIVersion.cgi'
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds
+DEFAULT_SCAN_SECONDS = 4
+DEFAULT_MAX_DATA_AGE_SECONDS = 300
+
+# Request timeout as a share of the scan interval, within bounds in seconds
+DEADLINE_FACTOR = 0.9
+MIN_DEADLINE = 1.5
+MAX_DEADLINE = 10
+
+# Timeout of the request probing an unreachable device
+PROBE_TIMEOUT = 2
+
+# Power is not integrated over a gap between samples longer than this many poll intervals
+MAX_GAP_FACTOR = 3
+
+# Keep the connection to each Datamanager open between polls
+KEEPALIVE_TIMEOUT = 60
+
+# Upper bound of max_concurrent_requests, and of the connections to one Datamanager
+MAX_CONCURRENT_REQUESTS = 4
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def create_session(limit_per_host=MAX_CONCURRENT_REQUESTS):
+    """Return an aiohttp session keeping the connections to the devices alive."""
+    import aiohttp
+
+    # Each fetcher further limits its own requests to max_concurrent_requests
+    connector = aiohttp.TCPConnector(limit_per_host=limit_per_host, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector)
+
+#   create_session
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class FroniusFetcher(RunningTotals):
+    """Handle Fronius API requests.
+
+    The sensors registered with ``register`` are refreshed after every poll:
+    ``refresh(now)`` tells whether the state of a sensor changed, and
+    ``publish()`` is then called to write it.
+    """
+
+    def __init__(self, session, ip_address, tracer=None, accumulation=ACCUMULATION_INTEGRATION,
+                 scan_interval=DEFAULT_SCAN_SECONDS, overlap=OVERLAP_SKIP, max_gap=None,
+                 max_data_age=DEFAULT_MAX_DATA_AGE_SECONDS, endpoints=None, max_concurrent=1,
+                 billing_day=DEFAULT_BILLING_DAY, tariffs=None, offset_at=system_offset):
+        """Initialize the data object."""
+        super().__init__(max_gap if max_gap is not None else MAX_GAP_FACTOR * scan_interval, accumulation,
+                         billing_day, tariffs, offset_at)
+        self._session = session
+        self._ip_address = ip_address
+        self._tracer = tracer if tracer is not None else Tracer()
+        self._scan_interval = scan_interval
+        self._overlap = overlap
+        # A request never outlives the cycle it belongs to
+        self._deadline = min(MAX_DEADLINE, max(MIN_DEADLINE, scan_interval * DEADLINE_FACTOR))
+        self._in_flight = False
+        self._follow_up = False
+        self._skipped_cycles = 0
+        self._coalesced_cycles = 0
+        self._late_cycles = 0
+        self._timeouts = 0
+        self._breaker = CircuitBreaker(min_delay=max(scan_interval, DEFAULT_MIN_RETRY_DELAY))
+        self._max_data_age = max_data_age
+        self._endpoints = EndpointSchedule(endpoints)
+        self._endpoint_data = {}
+        self._endpoint_failures = {name: 0 for name in self._endpoints.names}
+        # Requests of this device in flight at once, whatever endpoint they are for
+        self._requests = asyncio.Semaphore(max_concurrent)
+        self._last_success = None
+        self._published_available = None
+        self._data = None
+        self.recorder = None
+        self.exporter = None
+        self.snapshot_feed = None
+        self._sensors = set()
+        self._known_inverters = set()
+        self._present_inverters = set()
+        self._inverter_listeners = []
+        self._state_writes = 0
+        self._state_writes_suppressed = 0
+
+    async def async_update(self):
+        """Retrieve and update latest state, with at most one cycle in flight."""
+        if self._in_flight:
+            if self._overlap == OVERLAP_COALESCE:
+                self._follow_up = True
+                self._coalesced_cycles += 1
+            else:
+                self._skipped_cycles += 1
+            return
+
+        self._in_flight = True
+        try:
+            while True:
+                cycle_start = time.monotonic()
+                await self._async_cycle()
+                if time.monotonic() - cycle_start > self._scan_interval:
+                    self._late_cycles += 1
+                if not self._follow_up:
+                    break
+                self._follow_up = False
+        finally:
+            self._in_flight = False
+
+    async def _async_cycle(self):
+        """Fetch, accumulate and write the sensor states once."""
+        tracer = self._tracer
+        cycle_start = perf_counter() if tracer.enabled else 0.0
+        if self._breaker.allow(time.monotonic()):
+            await self._async_guarded_update()
+        inverters_changed = self._discover_inverters()
+
+        # Write the state of the sensors whose value changed, or all of them when the availability changed
+        fanout_start = perf_counter() if tracer.enabled else 0.0
+        now = time.monotonic()
+        available = self.available
+        force = available != self._published_available or inverters_changed
+        self._published_available = available
+        written = 0
+        for sensor in self._sensors:
+            if sensor.refresh(now) or force:
+                sensor.publish()
+                written += 1
+        self._state_writes += written
+        self._state_writes_suppressed += len(self._sensors) - written
+
+        if tracer.enabled:
+            cycle_end = perf_counter()
+            tracer.record(STAGE_FANOUT, cycle_end - fanout_start)
+            tracer.record(STAGE_CYCLE, cycle_end - cycle_start)
+            _LOGGER.debug("Cycle for %s took %.1f ms", self._ip_address, (cycle_end - cycle_start) * 1000)
+
+    async def _async_guarded_update(self):
+        """Update through the circuit breaker, probing first when half-open."""
+        import aiohttp
+
+        try:
+            if self._breaker.state == STATE_HALF_OPEN:
+                await self._async_probe()
+            await self._update()
+        except aiohttp.ClientConnectionError:
+            self._failed("connection error")
+        except aiohttp.ClientError as error:
+            self._failed("request failed: {!r}".format(error))
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._failed("request timeout")
+        except (ValueError, KeyError, TypeError) as error:
+            self._failed("invalid response received: {!r}".format(error))
+        else:
+            self._last_success = time.time()
+            if self._breaker.record_success():
+                _LOGGER.info("%s is reachable again", self._ip_address)
+            # Only queued here, the exporter writes from its own task
+            if self.exporter is not None and self._data:
+                self.exporter.append(self._last_success, self._data, self)
+            if self.snapshot_feed is not None and self._data:
+                self.snapshot_feed.append(self._last_success, self._data, self)
+
+    async def _async_probe(self):
+        """Make a cheap request with a short timeout."""
+        async with self._requests:
+            response = await self._session.get(_PROBE_URL.format(self._ip_address), timeout=PROBE_TIMEOUT)
+            response.release()
+        if response.status != 200:
+            raise ValueError
+
+    def _failed(self, reason):
+        """Count a failed update, log once per outage."""
+        breaker = self._breaker
+        if breaker.record_failure(time.monotonic()):
+            _LOGGER.warning("%s is unreachable (%s), next attempt in %d s", self._ip_address, reason, breaker.delay)
+        elif not breaker.closed:
+            _LOGGER.debug("%s is still unreachable (%s), next attempt in %d s", self._ip_address, reason, breaker.delay)
+        elif breaker.failures == 1:
+            _LOGGER.error("Failed to update %s: %s", self._ip_address, reason)
+        else:
+            _LOGGER.debug("Failed to update %s: %s", self._ip_address, reason)
+
+    @property
+    def available(self):
+        """Return True while the last good data is recent enough to be served."""
+        if self._last_success is None:
+            return False
+        return self._breaker.closed or time.time() - self._last_success <= self._max_data_age
+
+    @property
+    def last_success(self):
+        """Return the time of the last successful update, or None."""
+        return self._last_success
+
+    @property
+    def data_age(self):
+        """Return the seconds since the last successful update, or None."""
+        if self._last_success is None:
+            return None
+        return time.time() - self._last_success
+
+    async def fetch_data(self, url, decode=decode_response):
+        """Retrieve data from inverter in async manner, decoded from the body bytes by decode."""
+        import aiohttp
+
+        tracer = self._tracer
+        request_start = perf_counter() if tracer.enabled else 0.0
+        try:
+            async with self._requests:
+                response = await self._session.get(url, timeout=self._deadline)
+                if response.status != 200:
+                    response.release()
+                    raise ValueError
+                body = await response.read()
+        except aiohttp.ClientResponseError:
+            raise ValueError
+
+        if tracer.enabled:
+            decode_start = perf_counter()
+            tracer.record(STAGE_HTTP, decode_start - request_start)
+            json_response = decode(body)
+            tracer.record(STAGE_DECODE, perf_counter() - decode_start)
+            return json_response
+        return decode(body)
+
+    def diagnostics(self):
+        """Return the diagnostic data of this fetcher."""
+        return {
+            'ip_address': self._ip_address,
+            'tracing': self._tracer.enabled,
+            'decoder': DECODE_BACKEND,
+            'timings': self._tracer.snapshot(),
+            'state_writes': self._state_writes,
+            'state_writes_suppressed': self._state_writes_suppressed,
+            'deadline': self._deadline,
+            'skipped_cycles': self._skipped_cycles,
+            'coalesced_cycles': self._coalesced_cycles,
+            'late_cycles': self._late_cycles,
+            'timeouts': self._timeouts,
+            'breaker': self._breaker.diagnostics(time.monotonic()),
+            'endpoint_failures': dict(self._endpoint_failures),
+            'data_age': self.data_age,
+            'export': self.exporter.diagnostics() if self.exporter is not None else None,
+            'snapshot': self.snapshot_feed.diagnostics() if self.snapshot_feed is not None else None,
+        }
+
+    @property
+    def latest_inverters(self):
+        """Return the latest data object."""
+        if self._data:
+            return self._data['Inverters']
+        return None
+
+    @property
+    def latest_site(self):
+        """Return the latest data object."""
+        if self._data:
+            return self._data['Site']
+        return None
+
+    def latest_endpoint(self, endpoint):
+        """Return the latest data of an optional endpoint, or None."""
+        return self._endpoint_data.get(endpoint)
+
+    async def _async_fetch_endpoint(self, endpoint):
+        """Fetch one optional endpoint, keeping its previous data when it fails."""
+        import aiohttp
+
+        try:
+            response = await self.fetch_data(ENDPOINT_URLS[endpoint].format(self._ip_address))
+            self._endpoint_data[endpoint] = ENDPOINT_PARSERS[endpoint](response['Body']['Data'])
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as error:
+            self._endpoint_failures[endpoint] += 1
+            _LOGGER.debug("Failed to update the %s data of %s: %r", endpoint, self._ip_address, error)
+
+    def add_inverter_listener(self, listener):
+        """Call listener with the ids of the inverters seen for the first time."""
+        self._inverter_listeners.append(listener)
+
+    def has_inverter(self, inverter):
+        """Return True while inverter is part of the latest data."""
+        return inverter in self._present_inverters
+
+    def _discover_inverters(self):
+        """Notify the new inverters, return True when the set of reporting inverters changed."""
+        present = set(self.latest_inverters or ())
+        if present == self._present_inverters:
+            return False
+        new = present - self._known_inverters
+        gone = self._present_inverters - present
+        self._known_inverters |= new
+        self._present_inverters = present
+        if gone:
+            _LOGGER.warning("Inverter(s) %s of %s stopped reporting", ', '.join(sorted(gone, key=int)), self._ip_address)
+        if new:
+            for listener in self._inverter_listeners:
+                listener(sorted(new, key=int))
+        return True
+
+    async def register(self, sensor):
+        """Register child sensor for update subscriptions."""
+        self._sensors.add(sensor)
+
+#   FroniusFetcher
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class PowerflowData(FroniusFetcher):
+    """Handle Fronius API object and limit updates."""
+
+    def _build_url(self):
+        """Build the URL for the requests."""
+        url = _POWERFLOW_URL.format(self._ip_address)
+        return url
+
+    def _read_counters(self, data):
+        """Return the energy counters (Wh) of the response, and of the meter when it is polled."""
+        counters = {COUNTER_PV: data['Site'].get('E_Total')}
+        meter = self._endpoint_data.get(ENDPOINT_METER)
+        if meter:
+            counters[COUNTER_GRID_IMPORT] = meter.get('EnergyReal_WAC_Sum_Consumed')
+            counters[COUNTER_GRID_EXPORT] = meter.get('EnergyReal_WAC_Sum_Produced')
+        return counters
+
+    async def _update(self):
+        """Get the latest data from inverter, and from the other endpoints that are due."""
+        # The power flow is queued first; the others wait for a free request slot and never fail the update
+        due = self._endpoints.due(time.monotonic())
+        # Every request ends within the cycle, a failed power flow is raised once the endpoints are done
+        responses = await asyncio.gather(
+            self.fetch_data(self._build_url(), decode_powerflow),
+            *(self._async_fetch_endpoint(endpoint) for endpoint in due), return_exceptions=True)
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+        data = responses[0]
+        tracer = self._tracer
+        accumulate_start = perf_counter() if tracer.enabled else 0.0
+        if data:
+            current_time = time.time()
+            self.ingest(data, current_time)
+            if self.recorder is not None:
+                self.recorder.append(current_time, data)
+        # Served only once folded, a response ingest refused leaves the previous one
+        self._data = data
+
+        if tracer.enabled:
+            tracer.record(STAGE_ACCUMULATE, perf_counter() - accumulate_start)
+
+#   PowerflowData
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class AggregateData(FroniusFetcher):
+    """Combine the latest data and running totals of several devices."""
+
+    def __init__(self, fetchers, tracer=None):
+        """Initialize the aggregate of fetchers."""
+        super().__init__(None, None, tracer)
+        self._fetchers = fetchers
+
+    @property
+    def available(self):
+        """Return True while every device is available."""
+        return all(fetcher.available for fetcher in self._fetchers)
+
+    async def _update(self):
+        """Add up the devices, the rates are computed from the sums."""
+        sites = [fetcher.latest_site for fetcher in self._fetchers if fetcher.latest_site]
+        if not sites:
+            return
+
+        combined = {}
+        for key in SUMMED_SITE_KEYS:
+            values = [site[key] for site in sites if site.get(key) is not None]
+            combined[key] = sum(values) if values else None
+
+        pv = combined['P_PV'] or 0
+        grid = combined['P_Grid'] or 0
+        load = -(combined['P_Load'] or 0)
+        combined['rel_Autonomy'] = min(100, max(0, (load - max(grid, 0)) / load * 100)) if load > 0 else None
+        combined['rel_SelfConsumption'] = min(100, max(0, (pv - max(-grid, 0)) / pv * 100)) if pv > 0 else None
+
+        self._data = {'Site': combined, 'Inverters': {}}
+        self._ledger.load({key: sum(getattr(fetcher, key) for fetcher in self._fetchers) for key in ACCUMULATORS})
+        tariff_energy = {}
+        for fetcher in self._fetchers:
+            for tariff, energy in fetcher.tariff_energy.items():
+                combined_energy = tariff_energy.setdefault(tariff, [0, 0])
+                combined_energy[0] += energy[0]
+                combined_energy[1] += energy[1]
+        self._tariff_energy = tariff_energy
+
+#   AggregateData
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
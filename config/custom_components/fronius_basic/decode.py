@@ -0,0 +1,72 @@
+"""Decoding of the Solar API responses, straight from the body bytes."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .const import SENSOR_LIST, INVERTER_SENSOR, ACCUMULATORS, SUMMED_SITE_KEYS
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+# orjson decodes about 4 times faster than json when it is installed, both take the body bytes as they are
+BACKEND = 'orjson' if orjson is not None else 'json'
+loads = orjson.loads if orjson is not None else json.loads
+
+# 'Site' fields read by the sensors, the accumulators, the recorder and the aggregate
+SITE_KEYS = tuple(sorted(
+    {row[0] for row in SENSOR_LIST.values() if row[0] not in ACCUMULATORS} | set(SUMMED_SITE_KEYS)))
+
+# Field read of every inverter of the 'Inverters' block
+INVERTER_KEY = INVERTER_SENSOR[0]
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def check_status(response):
+    """Raise ValueError when Head.Status.Code reports an error."""
+    head = response.get('Head') if isinstance(response, dict) else None
+    status = head.get('Status') if isinstance(head, dict) else None
+    code = status.get('Code') if isinstance(status, dict) else None
+    if code:
+        raise ValueError('status code {}: {}'.format(code, status.get('Reason') or ''))
+
+
+def decode_response(body, loads=loads):
+    """Decode a response and check its status."""
+    response = loads(body)
+    check_status(response)
+    return response
+
+
+def decode_powerflow(body, loads=loads):
+    """Return the Body.Data block of a power flow response with only the fields that are read."""
+    data = decode_response(body, loads)['Body']['Data']
+    site = data['Site']
+    inverters = data.get('Inverters') or {}
+    return {
+        'Site': {key: site[key] for key in SITE_KEYS if key in site},
+        'Inverters': {inverter: {INVERTER_KEY: values.get(INVERTER_KEY)} for inverter, values in inverters.items()},
+    }
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,107 @@
+"""Solar API endpoints polled besides the power flow, each at its own interval."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+from .const import ENDPOINT_METER, ENDPOINT_STORAGE, ENDPOINT_INVERTER
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+ENDPOINT_URLS = {
+    ENDPOINT_METER: 'http://{}/solar_api/v1/GetMeterRealtimeData.cgi?Scope=System',
+    ENDPOINT_STORAGE: 'http://{}/solar_api/v1/GetStorageRealtimeData.cgi?Scope=System',
+    ENDPOINT_INVERTER: 'http://{}/solar_api/v1/GetInverterRealtimeData.cgi?Scope=System',
+}
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _first_device(data):
+    """Return the block of the device with the lowest id."""
+    if not data:
+        return None
+    return data[min(data, key=int)]
+
+
+def parse_meter(data):
+    """Return the fields of the first meter."""
+    return _first_device(data)
+
+
+def parse_storage(data):
+    """Return the controller fields of the first storage."""
+    storage = _first_device(data)
+    if storage is None:
+        return None
+    return storage.get('Controller', storage)
+
+
+def parse_inverters(data):
+    """Turn the per-field blocks of the System scope into the fields of every inverter."""
+    inverters = {}
+    for field, block in data.items():
+        if isinstance(block, dict) and 'Values' in block:
+            for inverter, value in block['Values'].items():
+                inverters.setdefault(inverter, {})[field] = value
+    return inverters
+
+
+ENDPOINT_PARSERS = {
+    ENDPOINT_METER: parse_meter,
+    ENDPOINT_STORAGE: parse_storage,
+    ENDPOINT_INVERTER: parse_inverters,
+}
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class EndpointSchedule:
+    """Due times of the endpoints of one device.
+
+    An endpoint is due on the first cycle and then once its interval elapsed
+    since it was last requested, whether that request succeeded or not, so a
+    failing endpoint is not retried on every cycle. Times are monotonic seconds.
+    """
+
+    def __init__(self, intervals=None):
+        """Initialize the schedule from a dict of endpoint: interval."""
+        self._intervals = dict(intervals or {})
+        self._next_due = {name: 0.0 for name in self._intervals}
+
+    @property
+    def names(self):
+        """Return the polled endpoints."""
+        return list(self._intervals)
+
+    def due(self, now):
+        """Return the endpoints due at now, and count them as requested."""
+        due = [name for name, next_due in self._next_due.items() if next_due <= now]
+        for name in due:
+            self._next_due[name] = now + self._intervals[name]
+        return due
+
+#   EndpointSchedule
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,277 @@
+"""Batched export of the samples to a time-series database, as InfluxDB line protocol or JSON lines."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from .const import ACCUMULATORS
+from .health import CircuitBreaker
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+_LOGGER = logging.getLogger(__name__)
+
+FORMAT_LINE = 'line'
+FORMAT_JSON = 'json'
+
+DEFAULT_MEASUREMENT = 'fronius'
+
+# Records per write, seconds between writes, and records kept while the sink is down (the oldest are dropped)
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_MAX_QUEUE = 10000
+
+# Bounds in seconds of the wait before writing again to a failing sink
+MIN_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 60
+
+# Timeout in seconds of one write
+WRITE_TIMEOUT = 10
+
+# Prefix of the field of the power of every inverter, e.g. P_inverter_1
+INVERTER_FIELD = 'P_inverter_'
+
+_KEY_ESCAPES = str.maketrans({',': '\\,', '=': '\\=', ' ': '\\ '})
+_MEASUREMENT_ESCAPES = str.maketrans({',': '\\,', ' ': '\\ '})
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def line_protocol(measurement, tags, fields, timestamp):
+    """Return one line of InfluxDB line protocol, timestamp in seconds written in nanoseconds.
+
+    Integers are written as integer fields and every other number as a float,
+    so a field keeps its type whatever value the device sends.
+    """
+    parts = [measurement.translate(_MEASUREMENT_ESCAPES)]
+    for key, value in tags.items():
+        parts.append('{}={}'.format(key.translate(_KEY_ESCAPES), str(value).translate(_KEY_ESCAPES)))
+    values = []
+    for key, value in fields.items():
+        if isinstance(value, int):
+            values.append('{}={}i'.format(key.translate(_KEY_ESCAPES), value))
+        else:
+            values.append('{}={!r}'.format(key.translate(_KEY_ESCAPES), float(value)))
+    return '{} {} {}'.format(','.join(parts), ','.join(values), int(round(timestamp * 1e6)) * 1000)
+
+
+def sample_fields(data, totals):
+    """Return the fields of one sample: the Site powers and counters, the inverter powers and the running totals."""
+    fields = {key: float(value) for key, value in data['Site'].items()
+              if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    for inverter, values in (data.get('Inverters') or {}).items():
+        if values.get('P') is not None:
+            fields[INVERTER_FIELD + inverter] = float(values['P'])
+    for key in ACCUMULATORS:
+        fields[key] = int(getattr(totals, key))
+    for tariff, (grid_import, grid_export) in totals.tariff_energy.items():
+        fields['tariff_{}_import'.format(tariff)] = int(grid_import)
+        fields['tariff_{}_export'.format(tariff)] = int(grid_export)
+    return fields
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class HttpSink:
+    """POST a batch to an HTTP endpoint, e.g. the /write or /api/v2/write of InfluxDB."""
+
+    def __init__(self, session, url, token=None, timeout=WRITE_TIMEOUT):
+        """Initialize the sink, token is sent as an InfluxDB 2 'Token' authorization."""
+        self._session = session
+        self._url = url
+        self._headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if token:
+            self._headers['Authorization'] = 'Token {}'.format(token)
+        self._timeout = timeout
+
+    async def __call__(self, payload):
+        """Write one batch, raise ValueError when it was not accepted."""
+        async with self._session.post(self._url, data=payload, headers=self._headers, timeout=self._timeout) as response:
+            if response.status >= 300:
+                raise ValueError('HTTP status {}'.format(response.status))
+
+#   HttpSink
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class DeviceFeed:
+    """Serialize the samples of one device into an exporter, set as FroniusFetcher.exporter."""
+
+    def __init__(self, exporter, device):
+        """Initialize the feed of the device called device."""
+        self._exporter = exporter
+        self._tags = {'device': device}
+
+    def append(self, timestamp, data, totals):
+        """Queue one sample and the running totals after it."""
+        exporter = self._exporter
+        fields = sample_fields(data, totals)
+        if exporter.format == FORMAT_JSON:
+            record = json.dumps(dict(self._tags, time=timestamp, **fields), separators=(',', ':'))
+        else:
+            record = line_protocol(exporter.measurement, self._tags, fields, timestamp)
+        exporter.append(record.encode())
+
+    def diagnostics(self):
+        """Return the diagnostics of the exporter."""
+        return self._exporter.diagnostics()
+
+#   DeviceFeed
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class BatchExporter:
+    """Bounded queue of records written to a sink in batches by a background task.
+
+    ``append`` never waits: it queues a record, wakes the task once a batch is
+    full and drops the oldest record when ``max_queue`` are waiting. The task
+    writes a batch when one is full or every ``flush_interval`` seconds. A
+    batch that fails stays at the head of the queue and the sink is retried
+    with exponential backoff, so a slow or unreachable sink never holds up
+    polling. ``sink`` is an async callable taking the newline separated batch.
+    """
+
+    def __init__(self, sink, record_format=FORMAT_LINE, measurement=DEFAULT_MEASUREMENT, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_queue=DEFAULT_MAX_QUEUE):
+        """Initialize an empty exporter."""
+        self._sink = sink
+        self.format = record_format
+        self.measurement = measurement
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = deque()
+        self._max_queue = max(max_queue, batch_size)
+        self._breaker = CircuitBreaker(failure_threshold=1, min_delay=MIN_RETRY_DELAY, max_delay=MAX_RETRY_DELAY)
+        self._wake = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self._written = 0
+        self._dropped = 0
+        self._failures = 0
+
+    def feed(self, device):
+        """Return the feed of one device."""
+        return DeviceFeed(self, device)
+
+    def append(self, record):
+        """Queue one serialized record."""
+        queue = self._queue
+        queue.append(record)
+        if len(queue) > self._max_queue:
+            queue.popleft()
+            self._dropped += 1
+        if len(queue) >= self._batch_size:
+            self._wake.set()
+
+    def _requeue(self, batch):
+        """Put a batch that was not written back at the head, as far as newer records left room."""
+        room = self._max_queue - len(self._queue)
+        if room < len(batch):
+            self._dropped += len(batch) - room
+            batch = batch[len(batch) - room:]
+        self._queue.extendleft(reversed(batch))
+
+    async def async_write_batch(self):
+        """Write the oldest batch, return True when it was written."""
+        queue = self._queue
+        batch = [queue.popleft() for _ in range(min(self._batch_size, len(queue)))]
+        if not batch:
+            return True
+        try:
+            await self._sink(b'\n'.join(batch))
+        except asyncio.CancelledError:
+            self._requeue(batch)
+            raise
+        except Exception as error:
+            # Whatever the sink raised, the batch is kept and retried
+            self._requeue(batch)
+            self._failures += 1
+            if self._breaker.record_failure(time.monotonic()):
+                _LOGGER.warning("Export failed (%r), %d record(s) queued, next attempt in %d s",
+                                error, len(queue), self._breaker.delay)
+            elif not self._breaker.closed:
+                _LOGGER.debug("Export still fails (%r), next attempt in %d s", error, self._breaker.delay)
+            return False
+        self._written += len(batch)
+        if self._breaker.record_success():
+            _LOGGER.info("Export works again")
+        return True
+
+    async def async_run(self):
+        """Write the batches until stopped."""
+        while not self._stopping:
+            if self._breaker.closed:
+                delay = self._flush_interval
+            else:
+                delay = max(0.0, self._breaker.retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            # Full batches go out right away, the rest on the interval
+            while self._queue and not self._stopping and self._breaker.allow(time.monotonic()):
+                if not await self.async_write_batch() or len(self._queue) < self._batch_size:
+                    break
+
+    def start(self):
+        """Run the background task."""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.ensure_future(self.async_run())
+
+    async def async_stop(self, *_):
+        """Stop the background task once its write is done and try once to write what is queued.
+
+        The task is not cancelled, as a cancelled write may have been accepted
+        and would then be written again.
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            self._stopping = True
+            self._wake.set()
+            await task
+        while self._queue:
+            if not await self.async_write_batch():
+                break
+
+    def diagnostics(self):
+        """Return the queue and write counters."""
+        return {
+            'queued': len(self._queue),
+            'written': self._written,
+            'dropped': self._dropped,
+            'failures': self._failures,
+            'breaker': self._breaker.diagnostics(time.monotonic()),
+        }
+
+#   BatchExporter
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
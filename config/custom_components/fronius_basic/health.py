@@ -0,0 +1,100 @@
+"""Connection health tracking for the Fronius devices."""
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Consecutive failed polls that open the breaker
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# Bounds in seconds of the wait before probing an unreachable device again
+DEFAULT_MIN_RETRY_DELAY = 10
+DEFAULT_MAX_RETRY_DELAY = 300
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class CircuitBreaker:
+    """Stop polling a device that keeps failing and probe it with exponential backoff.
+
+    The breaker opens after ``failure_threshold`` consecutive failures. While
+    open no request is made; once the retry delay elapsed a single probe is
+    allowed (half-open). A successful probe closes the breaker, a failed one
+    opens it again with twice the previous delay, up to ``max_delay``.
+    Times are monotonic seconds.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, min_delay=DEFAULT_MIN_RETRY_DELAY,
+                 max_delay=DEFAULT_MAX_RETRY_DELAY):
+        """Initialize a closed breaker."""
+        self._failure_threshold = failure_threshold
+        self._min_delay = min_delay
+        self._max_delay = max(min_delay, max_delay)
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.delay = min_delay
+        self.retry_at = None
+
+    @property
+    def closed(self):
+        """Return True while the device is considered reachable."""
+        return self.state == STATE_CLOSED
+
+    def allow(self, now):
+        """Tell whether a request may be made now."""
+        if self.state == STATE_OPEN and now >= self.retry_at:
+            self.state = STATE_HALF_OPEN
+            return True
+        return self.state == STATE_CLOSED
+
+    def record_success(self):
+        """Close the breaker, return True when it was not closed."""
+        recovered = self.state != STATE_CLOSED
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.delay = self._min_delay
+        self.retry_at = None
+        return recovered
+
+    def record_failure(self, now):
+        """Count a failure, return True only when it opened a closed breaker."""
+        self.failures += 1
+        opened = self.state == STATE_CLOSED
+        if self.state == STATE_HALF_OPEN:
+            self.delay = min(self._max_delay, self.delay * 2)
+        elif self.state == STATE_OPEN or self.failures < self._failure_threshold:
+            return False
+        self.state = STATE_OPEN
+        self.retry_at = now + self.delay
+        return opened
+
+    def diagnostics(self, now):
+        """Return the breaker state."""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'retry_in': round(max(0, self.retry_at - now), 1) if self.retry_at is not None else None,
+        }
+
+#   CircuitBreaker
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
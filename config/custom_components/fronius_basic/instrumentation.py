@@ -0,0 +1,124 @@
+"""Cycle timing instrumentation for the Fronius Basic component."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+from bisect import bisect_left
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+STAGE_HTTP = 'http_wait'
+STAGE_DECODE = 'json_decode'
+STAGE_ACCUMULATE = 'accumulator_update'
+STAGE_FANOUT = 'state_fanout'
+STAGE_CYCLE = 'cycle'
+
+# Bucket upper bounds in seconds: four buckets per decade from 1us to 100s
+_BUCKET_BOUNDS = tuple(10 ** (exponent / 4) for exponent in range(-24, 9))
+
+_PERCENTILES = (50, 90, 99)
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class Histogram:
+    """Fixed-size, log-bucketed histogram of durations in seconds."""
+
+    __slots__ = ('_counts', 'count', 'total', 'minimum', 'maximum')
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self._counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, seconds):
+        """Add one observation."""
+        self._counts[bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, percent):
+        """Return the bucket upper bound holding the given percentile."""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                if index < len(_BUCKET_BOUNDS):
+                    return min(_BUCKET_BOUNDS[index], self.maximum)
+                return self.maximum
+        return self.maximum
+
+    def as_dict(self):
+        """Return a summary in milliseconds."""
+        if not self.count:
+            return {'count': 0}
+        summary = {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3),
+            'min_ms': round(self.minimum * 1000, 3),
+            'max_ms': round(self.maximum * 1000, 3),
+        }
+        for percent in _PERCENTILES:
+            summary['p{}_ms'.format(percent)] = round(self.percentile(percent) * 1000, 3)
+        return summary
+
+#   Histogram
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class Tracer:
+    """Per-stage timing collector that costs one attribute check when disabled.
+
+    Callers guard every clock read with ``if tracer.enabled`` so that nothing is
+    measured, formatted or allocated while tracing is off.
+    """
+
+    def __init__(self, enabled=False):
+        """Initialize the tracer."""
+        self.enabled = enabled
+        self._histograms = {}
+
+    def record(self, stage, seconds):
+        """Add a duration for the given stage."""
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = Histogram()
+        histogram.record(seconds)
+
+    def snapshot(self):
+        """Return the summary of every stage seen so far."""
+        return {stage: histogram.as_dict() for stage, histogram in self._histograms.items()}
+
+    def reset(self):
+        """Drop all recorded timings."""
+        self._histograms = {}
+
+#   Tracer
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
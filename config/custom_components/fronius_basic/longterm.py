@@ -0,0 +1,194 @@
+"""Energies of the closed hours imported into the Home Assistant long-term statistics."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics, get_last_statistics, statistic_during_period, statistics_during_period
+    )
+from homeassistant.util import slugify
+
+from .const import DOMAIN, HOUR_START
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+_LOGGER = logging.getLogger(__name__)
+
+# Key: column of the hourly rows, value: statistic id suffix and name
+STATISTICS = {
+    'pv_energy_hour': ('pv_energy', 'PV Energy'),
+    'grid_energy_hour': ('grid_energy', 'Grid Energy'),
+    'house_energy_hour': ('house_energy', 'House Energy'),
+    'grid_returned_energy_hour': ('grid_returned_energy', 'Grid Returned Energy'),
+    'balance_neto': ('balance_neto', 'Balance Neto'),
+}
+
+STATISTICS_UNIT = 'kWh'
+WS_PER_KWH = 3600000
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def statistic_id(name, suffix):
+    """Return the external statistic id of one quantity of a device, e.g. fronius_basic:roof_pv_energy."""
+    return '{}:{}_{}'.format(DOMAIN, slugify(name), suffix)
+
+
+def _timestamp(start):
+    """Return the start of a statistics row as a timestamp, whatever the recorder version returns."""
+    return start.timestamp() if isinstance(start, datetime) else float(start)
+
+
+def _hour_start(start):
+    """Return the UTC hour a row is filed under, local hours of half-hour time zones straddle two."""
+    start = float(start)
+    return start - start % 3600
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class StatisticsImporter:
+    """Collect the closed hours of one device and add them to the statistics in batches.
+
+    ``append`` only queues a row. ``async_flush`` adds the queued hours with
+    one call per statistic, each sum continuing from the last one in the
+    database, so restarts and hours already imported are handled there.
+    ``async_import_backfill`` rewrites hours already imported.
+    """
+
+    def __init__(self, hass, name):
+        """Initialize the importer of the device called name."""
+        self._hass = hass
+        self._metadata = {
+            column: {
+                'has_mean': False,
+                'has_sum': True,
+                'name': '{} {}'.format(name, title),
+                'source': DOMAIN,
+                'statistic_id': statistic_id(name, suffix),
+                'unit_of_measurement': STATISTICS_UNIT,
+            }
+            for column, (suffix, title) in STATISTICS.items()
+        }
+        self._pending = []
+        # Key: column, value: start timestamp and sum (kWh) of the latest imported hour
+        self._latest = None
+        self._lock = asyncio.Lock()
+
+    def append(self, row):
+        """Queue one closed hour."""
+        self._pending.append(row)
+
+    async def _async_load_latest(self):
+        """Read the latest imported hour of every statistic."""
+        latest = {}
+        for column, metadata in self._metadata.items():
+            last = await get_instance(self._hass).async_add_executor_job(
+                get_last_statistics, self._hass, 1, metadata['statistic_id'], False, {'sum'})
+            rows = last.get(metadata['statistic_id'])
+            if rows:
+                latest[column] = (_timestamp(rows[0]['start']), rows[0].get('sum') or 0.0)
+            else:
+                latest[column] = (None, 0.0)
+        self._latest = latest
+
+    async def async_flush(self, *_):
+        """Add the queued hours to the statistics."""
+        if not self._pending:
+            return
+        async with self._lock:
+            await self._async_add_pending()
+
+    async def _async_add_pending(self):
+        """Add the queued hours after the latest imported one, with the lock held."""
+        if self._latest is None:
+            await self._async_load_latest()
+        rows, self._pending = sorted(self._pending, key=lambda row: row[HOUR_START]), []
+        if not rows:
+            return
+        for column, metadata in self._metadata.items():
+            last_start, total = self._latest[column]
+            statistics = []
+            for row in rows:
+                start = _hour_start(row[HOUR_START])
+                if last_start is not None and start <= last_start:
+                    continue
+                total += row[column] / WS_PER_KWH
+                statistics.append({'start': datetime.fromtimestamp(start, timezone.utc), 'sum': total})
+                last_start = start
+            self._latest[column] = (last_start, total)
+            if statistics:
+                async_add_external_statistics(self._hass, metadata, statistics)
+        _LOGGER.debug("Imported %d hour(s) into %d statistics", len(rows), len(self._metadata))
+
+    async def async_import_backfill(self, rows):
+        """Rewrite the hours of the hourly rows returned by recompute_archive.
+
+        The hours before the first row keep their sums. From there on every
+        hour in the database is written again, those of the rows with their
+        recomputed energy and the later ones with the energy they had, so the
+        sums continue from the corrected hours up to the latest one.
+        """
+        corrected = [_hour_start(start) for start in rows[HOUR_START]]
+        if not corrected:
+            return
+        first = datetime.fromtimestamp(min(corrected), timezone.utc)
+        recorder = get_instance(self._hass)
+        async with self._lock:
+            await self._async_add_pending()
+            for column, metadata in self._metadata.items():
+                statistic = metadata['statistic_id']
+                before = await recorder.async_add_executor_job(
+                    statistic_during_period, self._hass, None, first, statistic, {'change'}, None)
+                existing = await recorder.async_add_executor_job(
+                    statistics_during_period, self._hass, first, None, {statistic}, 'hour', None, {'sum'})
+
+                # Key: hour start, value: energy (kWh) of the hour, recomputed or as imported
+                energies = {}
+                base = previous = before.get('change') or 0.0
+                for row in existing.get(statistic, []):
+                    if row.get('sum') is not None:
+                        energies[_timestamp(row['start'])] = row['sum'] - previous
+                        previous = row['sum']
+                for start, energy in zip(corrected, rows[column]):
+                    energies[start] = float(energy) / WS_PER_KWH
+
+                total = base
+                statistics = []
+                for start in sorted(energies):
+                    total += energies[start]
+                    statistics.append({'start': datetime.fromtimestamp(start, timezone.utc), 'sum': total})
+                async_add_external_statistics(self._hass, metadata, statistics)
+                self._latest[column] = (max(energies), total)
+        _LOGGER.info("Rewrote %d hour(s) from %s in %d statistics", len(corrected), first, len(self._metadata))
+
+#   StatisticsImporter
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,358 @@
+"""Derived metrics of the samples: formulas over the Site fields and the energies integrated from them, per period."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+from operator import sub
+
+from .rollover import CLOSE_HOUR, CLOSE_DAY, CLOSE_MONTH, CLOSE_BILLING
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+PERIOD_HOUR = 'hour'
+PERIOD_TODAY = 'today'
+PERIOD_MONTH = 'month'
+PERIOD_TOTAL = 'total'
+PERIOD_BILLING = 'billing'
+
+ALL_PERIODS = (PERIOD_HOUR, PERIOD_TODAY, PERIOD_MONTH, PERIOD_TOTAL, PERIOD_BILLING)
+
+# Key: period, value: the RolloverClock flag closing it, 0 for never
+PERIOD_CLOSES = {
+    PERIOD_HOUR: CLOSE_HOUR,
+    PERIOD_TODAY: CLOSE_DAY,
+    PERIOD_MONTH: CLOSE_MONTH,
+    PERIOD_TOTAL: 0,
+    PERIOD_BILLING: CLOSE_BILLING,
+}
+
+# Index of the grid import and export in the energy buckets of a tariff
+TARIFF_IMPORT = 0
+TARIFF_EXPORT = 1
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _rounded(value):
+    """W to rounded W."""
+    return int(round(value))
+
+
+def _rounded_or_zero(value):
+    """W to rounded W, 'null' and 0 as 0."""
+    return int(round(value)) if value else 0
+
+
+def _positive_part(value):
+    """The value when it is positive, else 0."""
+    return value if value > 0 else 0
+
+
+def _negative_part(value):
+    """The negated value when it is negative, else 0."""
+    return -value if value < 0 else 0
+
+
+def total_key(metric, period):
+    """Return the running total of a metric over a period, e.g. grid_energy_today."""
+    return '{}_{}'.format(metric, period)
+
+
+def total_keys(energies, settled, derived):
+    """Return the running totals kept for the energy, settled and derived metrics."""
+    keys = [total_key(metric, period) for metric, row in energies.items() for period in row[1]]
+    keys.extend(total_key(metric, period) for metric, row in settled.items() for period in row[2])
+    keys.extend(derived)
+    return tuple(keys)
+
+
+# Key: rate metric (W), value: [inputs, formula]; inputs are Site fields or other rate metrics
+RATE_METRICS = {
+    # A device without a smart meter sends 'null' for P_Grid and P_Load
+    'pv_power': [('P_PV',), _rounded_or_zero],
+    'grid_power': [('P_Grid',), _rounded_or_zero],
+    'load_power': [('P_Load',), _rounded_or_zero],
+    'grid_import_power': [('grid_power',), _positive_part],
+    'grid_export_power': [('grid_power',), _negative_part],
+    # P_Load is negative while the house consumes
+    'house_power': [('load_power',), _negative_part],
+}
+
+# Key: energy metric (Ws), value: [rate metric integrated, periods kept, tariff bucket index or None]
+ENERGY_METRICS = {
+    'pv_energy': ['pv_power', (PERIOD_HOUR, PERIOD_MONTH, PERIOD_BILLING), None],
+    'grid_energy': ['grid_import_power', ALL_PERIODS, TARIFF_IMPORT],
+    'grid_returned_energy': ['grid_export_power', ALL_PERIODS, TARIFF_EXPORT],
+    'house_energy': ['house_power', ALL_PERIODS, None],
+}
+
+# Key: energy settled when an hour closes, value: [hour totals, formula, periods kept]
+SETTLED_METRICS = {
+    # Import and export of the same hour net off
+    'balance_neto': [('grid_energy_hour', 'grid_returned_energy_hour'), min,
+                     (PERIOD_TODAY, PERIOD_MONTH, PERIOD_TOTAL, PERIOD_BILLING)],
+}
+
+# Key: running total computed when read, value: [other running totals, formula]
+DERIVED_TOTALS = {
+    'balance_neto_hour': [('grid_returned_energy_hour', 'grid_energy_hour'), sub],
+}
+
+
+def _ordered(metrics):
+    """Return the metrics with every one after the metrics it reads, raise ValueError on a cycle."""
+    ordered = []
+    state = {}
+
+    def visit(metric):
+        if state.get(metric) == 'done':
+            return
+        if state.get(metric) == 'visiting':
+            raise ValueError('metric {} depends on itself'.format(metric))
+        state[metric] = 'visiting'
+        for name in metrics[metric][0]:
+            if name in metrics:
+                visit(name)
+        state[metric] = 'done'
+        ordered.append(metric)
+
+    for metric in metrics:
+        visit(metric)
+    return ordered
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class MetricGraph:
+    """Rate metrics of the samples, recomputed only where an input changed.
+
+    The formulas are ordered once so that every metric comes after its
+    inputs. ``update`` compares the fields read with those of the previous
+    sample and recomputes only the metrics downstream of the fields that
+    changed, walking a list cached for every set of fields seen changing
+    together, so a sample costs in proportion to what moved, not to the
+    number of metrics.
+    """
+
+    def __init__(self, metrics=RATE_METRICS):
+        """Build the dependency graph, every metric starts at 0."""
+        self._metrics = metrics
+        self._order = _ordered(metrics)
+        self.fields = tuple(dict.fromkeys(name for metric in self._order for name in metrics[metric][0]
+                                          if name not in metrics))
+        # Key: fields that changed together, value: the formulas downstream of them, in order
+        self._walks = {}
+        # Fields start unread, so the first sample computes everything
+        self.values = dict.fromkeys(self.fields, object())
+        self.values.update(dict.fromkeys(self._order, 0))
+
+    def _walk(self, fields):
+        """Return the formulas of the metrics downstream of fields, in order, single inputs unpacked."""
+        reached = set(fields)
+        walk = []
+        for metric in self._order:
+            inputs, formula = self._metrics[metric]
+            if not reached.isdisjoint(inputs):
+                reached.add(metric)
+                walk.append((metric, inputs[0] if len(inputs) == 1 else None, tuple(inputs), formula))
+        return walk
+
+    def update(self, site):
+        """Read the fields of one sample, return the metrics whose value changed.
+
+        When a formula raises, the graph is left as it was before the sample.
+        """
+        values = self.values
+        moved = tuple(field for field in self.fields if site[field] != values[field])
+        if not moved:
+            return ()
+        walk = self._walks.get(moved)
+        if walk is None:
+            walk = self._walks[moved] = self._walk(moved)
+        previous = [(field, values[field]) for field in moved]
+        for field in moved:
+            values[field] = site[field]
+
+        changed = []
+        try:
+            for metric, single, inputs, formula in walk:
+                if single is not None:
+                    value = formula(values[single])
+                else:
+                    value = formula(*[values[name] for name in inputs])
+                if value != values[metric]:
+                    previous.append((metric, values[metric]))
+                    values[metric] = value
+                    changed.append(metric)
+        except Exception:
+            # A sample a formula refused is forgotten, the next one is compared with the last good one
+            values.update(previous)
+            raise
+        return changed
+
+#   MetricGraph
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class EnergyLedger:
+    """Running totals (Ws) of the energy metrics over their periods, integrated lazily.
+
+    Every energy is kept as one cumulative integral: ``seconds`` counts the
+    rounded seconds of every interval so far, and an energy folds rate times
+    the seconds since it last folded whenever its rate changes. A period total
+    is that integral minus its value when the period started, so a change of
+    rate costs one addition whatever the number of periods, and a sample
+    leaves the energies whose rate did not change alone. With integer powers
+    and seconds the totals are exactly those of adding power times seconds to
+    every period on every sample.
+    """
+
+    def __init__(self, energies=ENERGY_METRICS, settled=SETTLED_METRICS, derived=DERIVED_TOTALS):
+        """Initialize every total at zero."""
+        self.seconds = 0
+        self._integrals = dict.fromkeys(energies, 0)
+        self._rates = dict.fromkeys(energies, 0)
+        self._since = dict.fromkeys(energies, 0)
+        # Key: rate metric, value: the energies integrating it
+        self._energies_of_rate = {}
+        for energy, (rate, _, _) in energies.items():
+            self._energies_of_rate.setdefault(rate, []).append(energy)
+        # Key: total of an energy, value: its energy; the integral at the start of the period is in _starts
+        self._energy_of_key = {total_key(energy, period): energy for energy, row in energies.items() for period in row[1]}
+        self._starts = dict.fromkeys(self._energy_of_key, 0)
+        self._settled = {metric: (tuple(row[0]), row[1], [total_key(metric, period) for period in row[2]])
+                         for metric, row in settled.items()}
+        self._totals = {key: 0 for _, _, keys in self._settled.values() for key in keys}
+        # Flag closing every total and the total
+        self._closes = [(PERIOD_CLOSES[period], total_key(energy, period))
+                        for energy, row in energies.items() for period in row[1]]
+        self._closes.extend((PERIOD_CLOSES[period], total_key(metric, period))
+                            for metric, row in settled.items() for period in row[2])
+        self._derived = derived
+        # Key: energy split by tariff, value: its bucket index; _synced is its integral when last added to the bucket
+        self._tariff_index = {energy: row[2] for energy, row in energies.items() if row[2] is not None}
+        self._synced = dict.fromkeys(self._tariff_index, 0)
+        self._bucket = None
+        self.keys = total_keys(energies, settled, derived)
+
+    def value(self, key):
+        """Return a running total."""
+        energy = self._energy_of_key.get(key)
+        if energy is not None:
+            return (self._integrals[energy] + self._rates[energy] * (self.seconds - self._since[energy])
+                    - self._starts[key])
+        if key in self._derived:
+            inputs, formula = self._derived[key]
+            return formula(*[self.value(name) for name in inputs])
+        return self._totals[key]
+
+    def rate(self, energy):
+        """Return the rate an energy is integrating."""
+        return self._rates[energy]
+
+    def fold(self):
+        """Fold the integral of every energy up to now."""
+        seconds = self.seconds
+        for energy, since in self._since.items():
+            if since != seconds:
+                self._integrals[energy] += self._rates[energy] * (seconds - since)
+                self._since[energy] = seconds
+
+    def set_rates(self, rates, values):
+        """Integrate the energies of the rate metrics listed in rates at their values from now on."""
+        seconds = self.seconds
+        integrals = self._integrals
+        since = self._since
+        for rate in rates:
+            for energy in self._energies_of_rate.get(rate, ()):
+                integrals[energy] += self._rates[energy] * (seconds - since[energy])
+                since[energy] = seconds
+                self._rates[energy] = values[rate]
+
+    def advance(self, elapsed, counted=None):
+        """Integrate elapsed seconds, except for the energies of counted, which add the energy given instead."""
+        if counted:
+            seconds = self.seconds
+            for energy, amount in counted.items():
+                self._integrals[energy] += self._rates[energy] * (seconds - self._since[energy]) + amount
+                self._since[energy] = seconds + elapsed
+        self.seconds += elapsed
+
+    def add(self, energies):
+        """Add energies of the interval being passed, by metric, before skip."""
+        for energy, amount in energies.items():
+            self._integrals[energy] += amount
+
+    def skip(self, elapsed):
+        """Pass an interval of elapsed seconds whose energies were added by add."""
+        self.seconds += elapsed
+        for energy in self._since:
+            self._since[energy] = self.seconds
+
+    def settle(self):
+        """Add the energies settled by the closing hour."""
+        for inputs, formula, keys in self._settled.values():
+            amount = formula(*[self.value(name) for name in inputs])
+            for key in keys:
+                self._totals[key] += amount
+
+    def reset(self, closes):
+        """Zero the totals of the periods that closed, as CLOSE_* flags."""
+        self.fold_bucket()
+        self.fold()
+        for flag, key in self._closes:
+            if closes & flag:
+                if key in self._starts:
+                    self._starts[key] = self._integrals[self._energy_of_key[key]]
+                else:
+                    self._totals[key] = 0
+
+    def fold_bucket(self):
+        """Add the tariff energies integrated since the last call to the tariff bucket."""
+        self.fold()
+        for energy, index in self._tariff_index.items():
+            integral = self._integrals[energy]
+            if self._bucket is not None:
+                self._bucket[index] += integral - self._synced[energy]
+            self._synced[energy] = integral
+
+    def set_bucket(self, bucket):
+        """Add the tariff energies to bucket from now on, None for none."""
+        self.fold_bucket()
+        self._bucket = bucket
+
+    def load(self, totals):
+        """Set the totals found in totals, the derived ones follow."""
+        self.fold()
+        for key, energy in self._energy_of_key.items():
+            if key in totals:
+                self._starts[key] = self._integrals[energy] - totals[key]
+        for key in self._totals:
+            if key in totals:
+                self._totals[key] = totals[key]
+
+#   EnergyLedger
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
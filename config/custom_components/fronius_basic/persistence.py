@@ -0,0 +1,120 @@
+"""Snapshot and journal storage of the Fronius accumulator state."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import json
+import logging
+import os
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+_LOGGER = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal'
+
+# Journal entries replayed at most before the journal is folded into the snapshot
+DEFAULT_COMPACT_AFTER = 240
+
+_SEPARATORS = (',', ':')
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class AccumulatorStore:
+    """Persist a flat state dict as a snapshot file plus an append-only journal.
+
+    Each write appends one compact JSON line holding only the keys that changed
+    since the previous write. After ``compact_after`` lines the journal is folded
+    into a new snapshot (written atomically) and truncated, so loading replays a
+    bounded number of lines whatever the uptime. All methods block and are meant
+    to run in an executor.
+    """
+
+    def __init__(self, path, compact_after=DEFAULT_COMPACT_AFTER):
+        """Initialize the store."""
+        self._snapshot_path = path
+        self._journal_path = path + JOURNAL_SUFFIX
+        self._compact_after = compact_after
+        self._state = {}
+        self._journal_entries = 0
+
+    def load(self):
+        """Return the persisted state, or None when nothing was stored."""
+        state = {}
+        try:
+            with open(self._snapshot_path, encoding='utf-8') as snapshot:
+                state = json.load(snapshot)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            _LOGGER.warning("Ignoring corrupt snapshot %s", self._snapshot_path)
+
+        entries = 0
+        truncated = False
+        try:
+            with open(self._journal_path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        state.update(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a power loss ends the journal
+                        truncated = True
+                        break
+                    entries += 1
+        except FileNotFoundError:
+            pass
+
+        self._state = state
+        self._journal_entries = entries
+        if truncated:
+            # Never append after a partial line
+            self._compact()
+        return dict(state) if state else None
+
+    def write(self, state):
+        """Append the keys of state that changed since the last write."""
+        delta = {key: value for key, value in state.items() if self._state.get(key) != value}
+        if not delta:
+            return
+
+        if self._journal_entries >= self._compact_after:
+            self._state.update(delta)
+            self._compact()
+            return
+
+        with open(self._journal_path, 'a', encoding='utf-8') as journal:
+            journal.write(json.dumps(delta, separators=_SEPARATORS) + '\n')
+        self._state.update(delta)
+        self._journal_entries += 1
+
+    def _compact(self):
+        """Replace the snapshot with the current state and empty the journal."""
+        temporary_path = self._snapshot_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(self._state, snapshot, separators=_SEPARATORS)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary_path, self._snapshot_path)
+        open(self._journal_path, 'w').close()
+        self._journal_entries = 0
+
+#   AccumulatorStore
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,162 @@
+"""Precompiled read/convert plans for the Fronius sensors."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+from operator import attrgetter
+
+from .const import SENSOR_LIST, ENDPOINT_SENSOR_LIST, INVERTER_SENSOR
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _convert_energy(value):
+    """Wh to rounded kWh."""
+    return int(round(value / 1000))
+
+
+def _convert_energy3(value):
+    """Wh to kWh with 3 decimals."""
+    return round(value / 1000, 3)
+
+
+def _convert_energy_float(value):
+    """Ws to kWh with 3 decimals."""
+    return round(value / 3600000, 3)
+
+
+def _convert_decimal(value):
+    """Round to 1 decimal."""
+    return round(value, 1)
+
+
+def _convert_power(value):
+    """W to rounded W."""
+    return int(round(value))
+
+
+def _convert_power_negative(value):
+    """Negated W to rounded W."""
+    return int(round(-value))
+
+
+# Key: convert_units column of SENSOR_LIST, anything else is rounded to an integer
+CONVERTERS = {
+    'energy': _convert_energy,
+    'energy3': _convert_energy3,
+    'energy_float': _convert_energy_float,
+    'decimal': _convert_decimal,
+    'power': _convert_power,
+    'power_negative': _convert_power_negative,
+}
+
+
+# Key: sensor key of ENDPOINT_SENSOR_LIST, value: its endpoint
+ENDPOINT_OF_SENSOR = {
+    sensor_key: endpoint for endpoint, sensors in ENDPOINT_SENSOR_LIST.items() for sensor_key in sensors
+}
+
+
+def _compile_inverter_value(device_data, inverter, json_key, convert):
+    """Read one field of one inverter, 'null' is read as 0, None while the inverter is missing."""
+    def value():
+        inverters = device_data.latest_inverters
+        values = inverters.get(inverter) if inverters else None
+        if values is None:
+            return None
+        raw = values.get(json_key)
+        return convert(0 if raw is None else raw)
+    return value
+
+
+def _compile_accumulator_value(device_data, json_key, convert):
+    """Read a running total kept by the fetcher."""
+    accumulator = attrgetter(json_key)
+
+    def value():
+        if not device_data.latest_site:
+            return None
+        return convert(accumulator(device_data))
+    return value
+
+
+def _compile_site_value(device_data, json_key, convert):
+    """Read one field of the 'Site' block, 'null' is read as 0."""
+    def value():
+        site = device_data.latest_site
+        if not site or json_key not in site:
+            return None
+        raw = site[json_key]
+        return convert(0 if raw is None else raw)
+    return value
+
+
+def _compile_endpoint_value(device_data, endpoint, json_key, convert):
+    """Read one field of an optional endpoint, 'null' is read as 0."""
+    def value():
+        data = device_data.latest_endpoint(endpoint)
+        if not data or json_key not in data:
+            return None
+        raw = data[json_key]
+        return convert(0 if raw is None else raw)
+    return value
+
+
+def compile_value(device_data, sensor_key, json_key, convert, endpoint=None):
+    """Bind a sensor to the one lookup and conversion that produce its state."""
+    if endpoint is not None:
+        return _compile_endpoint_value(device_data, endpoint, json_key, convert)
+    if sensor_key.isnumeric():
+        return _compile_inverter_value(device_data, sensor_key, json_key, convert)
+    if isinstance(getattr(type(device_data), json_key, None), property):
+        return _compile_accumulator_value(device_data, json_key, convert)
+    return _compile_site_value(device_data, json_key, convert)
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class SensorPlan:
+    """Description, reader and converter of one sensor, resolved once."""
+
+    __slots__ = ('sensor_key', 'json_key', 'name', 'unit', 'convert_units', 'icon', 'value')
+
+    def __init__(self, device_data, sensor_key):
+        """Resolve the table row of the sensor into callables."""
+        endpoint = None
+        if sensor_key.isnumeric():
+            json_key, name, unit, convert_units, icon = INVERTER_SENSOR
+            name = name.format(sensor_key)
+        elif sensor_key in SENSOR_LIST:
+            json_key, name, unit, convert_units, icon = SENSOR_LIST[sensor_key]
+        else:
+            endpoint = ENDPOINT_OF_SENSOR[sensor_key]
+            json_key, name, unit, convert_units, icon = ENDPOINT_SENSOR_LIST[endpoint][sensor_key]
+
+        self.sensor_key = sensor_key
+        self.json_key = json_key
+        self.name = name
+        self.unit = unit
+        self.convert_units = convert_units
+        self.icon = icon
+        # Returns the converted state, or None when there is no data yet
+        self.value = compile_value(device_data, sensor_key, json_key, CONVERTERS.get(convert_units, _convert_power),
+                                   endpoint)
+
+#   SensorPlan
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,203 @@
+"""Rolling statistics of the sensor states over fixed time windows, in bounded memory."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import math
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+DEFAULT_PERCENTILE = 95
+
+# Samples kept per window at most, a window needing more is refused rather than cut short
+MAX_WINDOW_SAMPLES = 3600
+
+STAT_MEAN = 'mean'
+STAT_MIN = 'min'
+STAT_MAX = 'max'
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def window_label(seconds):
+    """Return the attribute suffix of a window, e.g. 30s, 15min or 1h."""
+    seconds = int(seconds)
+    if seconds % 3600 == 0:
+        return '{}h'.format(seconds // 3600)
+    if seconds % 60 == 0:
+        return '{}min'.format(seconds // 60)
+    return '{}s'.format(seconds)
+
+
+def longest_window(min_interval):
+    """Return the longest window in seconds whose samples fit when sampled every min_interval seconds."""
+    return (MAX_WINDOW_SAMPLES - 1) * min_interval
+
+
+def window_capacity(window, min_interval):
+    """Return the samples a window holds when sampled every min_interval seconds, raise ValueError if too many."""
+    if window > longest_window(min_interval):
+        raise ValueError('a {} window needs more than {} samples at one every {:g} s'.format(
+            window_label(window), MAX_WINDOW_SAMPLES, min_interval))
+    return max(2, int(math.ceil(window / min_interval)) + 1)
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class RollingWindow:
+    """Mean, minimum, maximum and percentile of the integer samples of the last window seconds.
+
+    The samples live in two arrays of ``capacity`` items used as a ring, sample
+    ``n`` at ``n % capacity``; when the ring is full the oldest sample is
+    dropped early. The sum is kept exactly, the minimum and maximum in
+    monotonic queues of sample numbers and the percentile in a sorted copy of
+    the values, so adding or dropping a sample costs O(1) amortized besides a
+    bisect and a move of at most ``capacity`` items, and reading costs O(1).
+    Times are monotonic seconds.
+    """
+
+    def __init__(self, window, capacity):
+        """Initialize an empty window."""
+        self.window = window
+        self._capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._values = array('q', bytes(8 * capacity))
+        self._first = 0
+        self._next = 0
+        self._sum = 0
+        self._minima = deque()
+        self._maxima = deque()
+        self._sorted = []
+
+    def __len__(self):
+        """Return the number of samples in the window."""
+        return self._next - self._first
+
+    def add(self, now, value):
+        """Add one sample taken at now."""
+        self.expire(now)
+        if self._next - self._first == self._capacity:
+            self._drop()
+        values = self._values
+        capacity = self._capacity
+        number = self._next
+        self._times[number % capacity] = now
+        values[number % capacity] = value
+        self._next = number + 1
+        self._sum += value
+
+        minima = self._minima
+        while minima and values[minima[-1] % capacity] >= value:
+            minima.pop()
+        minima.append(number)
+        maxima = self._maxima
+        while maxima and values[maxima[-1] % capacity] <= value:
+            maxima.pop()
+        maxima.append(number)
+        insort(self._sorted, value)
+
+    def expire(self, now):
+        """Drop the samples older than window seconds."""
+        cutoff = now - self.window
+        times = self._times
+        while self._first < self._next and times[self._first % self._capacity] <= cutoff:
+            self._drop()
+
+    def _drop(self):
+        """Drop the oldest sample."""
+        number = self._first
+        value = self._values[number % self._capacity]
+        self._sum -= value
+        if self._minima[0] == number:
+            self._minima.popleft()
+        if self._maxima[0] == number:
+            self._maxima.popleft()
+        del self._sorted[bisect_left(self._sorted, value)]
+        self._first = number + 1
+
+    @property
+    def mean(self):
+        """Return the mean of the samples, or None."""
+        count = self._next - self._first
+        return self._sum / count if count else None
+
+    @property
+    def minimum(self):
+        """Return the smallest sample, or None."""
+        return self._values[self._minima[0] % self._capacity] if self._minima else None
+
+    @property
+    def maximum(self):
+        """Return the largest sample, or None."""
+        return self._values[self._maxima[0] % self._capacity] if self._maxima else None
+
+    def percentile(self, percent):
+        """Return the nearest-rank percentile of the samples, or None."""
+        ordered = self._sorted
+        if not ordered:
+            return None
+        return ordered[max(0, int(math.ceil(percent / 100 * len(ordered))) - 1)]
+
+#   RollingWindow
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class RollingStatistics:
+    """The rolling windows of one sensor, read as state attributes."""
+
+    def __init__(self, windows, min_interval, percentile=DEFAULT_PERCENTILE):
+        """Initialize one window per length in seconds, sized for a sample every min_interval seconds.
+
+        Raises ValueError when a window would not hold all of its samples.
+        """
+        self._windows = [RollingWindow(window, window_capacity(window, min_interval)) for window in windows]
+        self._percentile = percentile
+        self._percentile_name = 'p{:g}'.format(percentile)
+
+    def add(self, now, value):
+        """Add one sample to every window."""
+        for window in self._windows:
+            window.add(now, value)
+
+    def attributes(self, now):
+        """Return the mean, min, max and percentile of every window, e.g. mean_15min."""
+        attrs = {}
+        for window in self._windows:
+            window.expire(now)
+            if not len(window):
+                continue
+            label = window_label(window.window)
+            attrs['{}_{}'.format(STAT_MEAN, label)] = round(window.mean, 1)
+            attrs['{}_{}'.format(STAT_MIN, label)] = window.minimum
+            attrs['{}_{}'.format(STAT_MAX, label)] = window.maximum
+            attrs['{}_{}'.format(self._percentile_name, label)] = window.percentile(self._percentile)
+        return attrs
+
+#   RollingStatistics
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,211 @@
+"""Precomputed hour, day, month, billing period and tariff boundaries of the running totals."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import math
+import time
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+# What a boundary closes, as returned by RolloverClock.advance
+CLOSE_HOUR = 1
+CLOSE_DAY = 2
+CLOSE_MONTH = 4
+CLOSE_BILLING = 8
+TARIFF_CHANGE = 16
+
+DEFAULT_BILLING_DAY = 1
+MAX_BILLING_DAY = 28
+
+MINUTES_PER_DAY = 1440
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def parse_window(text):
+    """Parse a local time window 'HH:MM-HH:MM' into start and end minutes, the end wrapping past midnight."""
+    try:
+        start, end = (part.strip() for part in str(text).split('-'))
+        minutes = []
+        for part in (start, end):
+            hours, mins = (int(value) for value in part.split(':'))
+            if not (0 <= hours <= 24 and 0 <= mins < 60) or hours * 60 + mins > MINUTES_PER_DAY:
+                raise ValueError
+            minutes.append(hours * 60 + mins)
+    except ValueError:
+        raise ValueError('expected a time window as HH:MM-HH:MM, got {!r}'.format(text))
+    if minutes[0] % MINUTES_PER_DAY == minutes[1] % MINUTES_PER_DAY:
+        raise ValueError('empty time window {!r}'.format(text))
+    return minutes[0] % MINUTES_PER_DAY, minutes[1] % MINUTES_PER_DAY
+
+
+def _in_window(minute, window):
+    """Return True when a minute of the day lies in a window."""
+    start, end = window
+    if start < end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def system_offset(timestamp):
+    """Return the UTC offset (s) of the system time zone at a timestamp."""
+    return time.localtime(timestamp).tm_gmtoff
+
+
+def next_hour_start(timestamp, offset_at):
+    """Return the first whole second after timestamp where the local time is a whole hour.
+
+    offset_at(t) returns the UTC offset in seconds at t. Around an offset
+    change the change itself is found by bisection.
+    """
+    position = math.floor(timestamp)
+    offset = offset_at(position)
+    candidate = position - (position + offset) % 3600 + 3600
+    if offset_at(candidate) == offset:
+        return candidate
+    low, high = position, candidate
+    while high - low > 1:
+        middle = (low + high) // 2
+        if offset_at(middle) == offset:
+            low = middle
+        else:
+            high = middle
+    if (high + offset_at(high)) % 3600 == 0:
+        return high
+    return next_hour_start(high, offset_at)
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class RolloverClock:
+    """Time of the next boundary of the running totals, and what it closes.
+
+    Hour starts close the hour and, by the local date they fall on, the day,
+    the month and the billing period, which starts at 00:00 of billing_day.
+    Tariffs are named lists of local time windows, parsed by parse_window; the
+    first window containing a time gives its tariff, None when none does, and
+    every window edge is a boundary. The boundaries are computed once per
+    boundary, so between them the caller only compares next_boundary.
+    """
+
+    def __init__(self, offset_at, billing_day=DEFAULT_BILLING_DAY, tariffs=None):
+        """Initialize a clock that is not started yet, offset_at(t) returns the UTC offset in seconds at t."""
+        self._offset_at = offset_at
+        self._billing_day = billing_day
+        self._windows = [(name, window) for name, windows in (tariffs or {}).items() for window in windows]
+        self._edges = sorted({edge for _, window in self._windows for edge in window})
+        self.started = False
+        self.next_boundary = -math.inf
+        self.hour_start = None
+        self.tariff = None
+        self._next_hour = None
+        self._next_edge = math.inf
+        self._calendar = None
+
+    @property
+    def tariffs(self):
+        """Return the names of the tariffs."""
+        return list(dict.fromkeys(name for name, _ in self._windows))
+
+    def _local(self, timestamp):
+        """Return the local struct_time of a timestamp."""
+        return time.gmtime(timestamp + self._offset_at(timestamp))
+
+    def _period_keys(self, timestamp):
+        """Return the local date, month and billing period of a timestamp."""
+        local = self._local(timestamp)
+        month = (local.tm_year, local.tm_mon)
+        if local.tm_mday >= self._billing_day:
+            billing = month
+        elif local.tm_mon == 1:
+            billing = (local.tm_year - 1, 12)
+        else:
+            billing = (local.tm_year, local.tm_mon - 1)
+        return (local.tm_year, local.tm_mon, local.tm_mday), month, billing
+
+    def tariff_at(self, timestamp):
+        """Return the tariff at a timestamp, or None."""
+        if not self._windows:
+            return None
+        local = self._local(timestamp)
+        minute = local.tm_hour * 60 + local.tm_min
+        for name, window in self._windows:
+            if _in_window(minute, window):
+                return name
+        return None
+
+    def _edge_after(self, timestamp):
+        """Return the first window edge after timestamp."""
+        if not self._edges:
+            return math.inf
+        position = math.floor(timestamp)
+        offset = self._offset_at(position)
+        second = (position + offset) % 86400
+        later = [edge * 60 for edge in self._edges if edge * 60 > second]
+        candidate = position - second + (later[0] if later else self._edges[0] * 60 + 86400)
+        # The same wall time on the other side of an offset change
+        candidate -= self._offset_at(candidate) - offset
+        return candidate if candidate > timestamp else self._edge_after(timestamp + 60)
+
+    def start(self, timestamp):
+        """Place the clock at timestamp, without closing anything."""
+        self.started = True
+        position = math.floor(timestamp)
+        self.hour_start = position - (position + self._offset_at(position)) % 3600
+        self._next_hour = next_hour_start(timestamp, self._offset_at)
+        self._calendar = self._period_keys(timestamp)
+        self.tariff = self.tariff_at(timestamp)
+        self._next_edge = self._edge_after(timestamp)
+        self.next_boundary = min(self._next_hour, self._next_edge)
+
+    def advance(self):
+        """Pass next_boundary, return what it closes as CLOSE_* and TARIFF_CHANGE flags."""
+        boundary = self.next_boundary
+        closes = 0
+        if boundary == self._next_hour:
+            closes = CLOSE_HOUR
+            date, month, billing = calendar = self._period_keys(boundary)
+            if date != self._calendar[0]:
+                closes |= CLOSE_DAY
+            if month != self._calendar[1]:
+                closes |= CLOSE_MONTH
+            if billing != self._calendar[2]:
+                closes |= CLOSE_BILLING
+            self._calendar = calendar
+            self.hour_start = boundary
+            self._next_hour = next_hour_start(boundary, self._offset_at)
+        if boundary == self._next_edge:
+            tariff = self.tariff_at(boundary)
+            if tariff != self.tariff:
+                closes |= TARIFF_CHANGE
+                self.tariff = tariff
+            self._next_edge = self._edge_after(boundary)
+        self.next_boundary = min(self._next_hour, self._next_edge)
+        return closes
+
+#   RolloverClock
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,351 @@
+"""Fixed-width binary recording of the Fronius powerflow samples."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import math
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+MAGIC = b'FRSM'
+VERSION = 2
+
+# magic, version, header size, record size, inverter slots, followed by one inverter id per slot
+_HEADER = struct.Struct('<4sHHHH')
+
+# timestamp, P_PV, P_Grid, P_Load (centiwatts), E_Day, E_Year, E_Total (Wh), followed by the P (W) of every
+# inverter slot; key: version, value: type of the counters, doubles as sent by the device since version 2
+COUNTER_TYPES = {1: 'f', 2: 'd'}
+_RECORD_PREFIX = '<d3i3{}'
+
+# Stored in place of a 'null' power
+NULL_POWER = -2 ** 31
+
+FILE_NAME = 'fronius-{}.bin'
+FILE_DATE_FORMAT = '%Y%m%d'
+
+Sample = namedtuple('Sample', ['timestamp', 'P_PV', 'P_Grid', 'P_Load', 'E_Day', 'E_Year', 'E_Total', 'inverters'])
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _pack_power(value):
+    """W to centiwatts."""
+    return NULL_POWER if value is None else int(round(value * 100))
+
+
+def _unpack_power(value):
+    """Centiwatts to W."""
+    return None if value == NULL_POWER else value / 100
+
+
+def _pack_float(value):
+    """None to NaN."""
+    return math.nan if value is None else value
+
+
+def _unpack_float(value):
+    """NaN to None."""
+    return None if value != value else value
+
+
+def file_date(timestamp):
+    """Return the UTC date part of the file holding timestamp."""
+    return time.strftime(FILE_DATE_FORMAT, time.gmtime(timestamp))
+
+
+def _record_struct(version, slots):
+    """Return the record struct of a file of a format version with slots inverter slots."""
+    return struct.Struct(_RECORD_PREFIX.format(COUNTER_TYPES[version]) + 'f' * slots)
+
+
+def _build_header(inverter_ids, record_size, version=VERSION):
+    """Return the header bytes of a file."""
+    slots = len(inverter_ids)
+    header_size = _HEADER.size + 2 * slots
+    return _HEADER.pack(MAGIC, version, header_size, record_size, slots) + struct.pack('<' + 'H' * slots, *inverter_ids)
+
+
+def _read_header(header):
+    """Return the header size, inverter ids, record size and format version of a file."""
+    magic, version, header_size, record_size, slots = _HEADER.unpack_from(header)
+    if magic != MAGIC or version not in COUNTER_TYPES:
+        raise ValueError('not a Fronius sample file')
+    inverter_ids = list(struct.unpack_from('<' + 'H' * slots, header, _HEADER.size))
+    return header_size, inverter_ids, record_size, version
+
+
+def sample_to_data(sample):
+    """Rebuild the Body.Data block of a sample, as the accumulators read it."""
+    return {
+        'Site': {
+            'P_PV': sample.P_PV, 'P_Grid': sample.P_Grid, 'P_Load': sample.P_Load,
+            'E_Day': sample.E_Day, 'E_Year': sample.E_Year, 'E_Total': sample.E_Total,
+        },
+        'Inverters': {inverter: {'P': power} for inverter, power in sample.inverters.items()},
+    }
+
+
+def replay(samples, ingest):
+    """Feed recorded samples to an ingest(data, timestamp) callable, return their count."""
+    count = 0
+    for sample in samples:
+        ingest(sample_to_data(sample), sample.timestamp)
+        count += 1
+    return count
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class SampleWriter:
+    """Append samples to one binary file per UTC day.
+
+    ``append`` only packs the sample into an in-memory buffer. ``take`` hands
+    the buffers over and ``write`` writes them; it blocks, so it is meant to
+    run in an executor. The inverter slots are fixed for a file; they are
+    taken from the first sample of the file when not given.
+    """
+
+    def __init__(self, directory, slots=None, keep_days=None):
+        """Initialize the writer."""
+        self._directory = directory
+        self._slots = slots
+        self._keep_days = keep_days
+        self._buffers = {}
+        self._layouts = {}
+
+    def _layout(self, date, inverters):
+        """Return the inverter ids, record struct and format version of a file."""
+        layout = self._layouts.get(date)
+        if layout is None:
+            path = os.path.join(self._directory, FILE_NAME.format(date))
+            if os.path.exists(path):
+                # A file started by an older version is continued in its own format
+                with open(path, 'rb') as existing:
+                    _, inverter_ids, _, version = _read_header(existing.read(_HEADER.size + 2 * 0xffff))
+            else:
+                slots = self._slots if self._slots is not None else len(inverters)
+                inverter_ids = sorted(int(inverter) for inverter in inverters)[:slots]
+                inverter_ids += [0] * (slots - len(inverter_ids))
+                version = VERSION
+            layout = self._layouts[date] = (inverter_ids, _record_struct(version, len(inverter_ids)), version)
+        return layout
+
+    def append(self, timestamp, data):
+        """Buffer one Body.Data block."""
+        site = data['Site']
+        inverters = data.get('Inverters') or {}
+        date = file_date(timestamp)
+        inverter_ids, record, _ = self._layout(date, inverters)
+        powers = []
+        for inverter in inverter_ids:
+            values = inverters.get(str(inverter))
+            powers.append(_pack_float(values.get('P') if values else None))
+        buffer = self._buffers.get(date)
+        if buffer is None:
+            buffer = self._buffers[date] = bytearray()
+        buffer += record.pack(
+            timestamp, _pack_power(site.get('P_PV')), _pack_power(site.get('P_Grid')), _pack_power(site.get('P_Load')),
+            _pack_float(site.get('E_Day')), _pack_float(site.get('E_Year')), _pack_float(site.get('E_Total')), *powers)
+
+    def take(self):
+        """Return the buffered records and start new buffers.
+
+        Call it from the thread that appends, then pass the result to write.
+        """
+        buffers, self._buffers = self._buffers, {}
+        if buffers:
+            latest = max(buffers)
+            for date in list(self._layouts):
+                if date < latest and date not in buffers:
+                    del self._layouts[date]
+        return [(date, self._layouts[date], buffer) for date, buffer in sorted(buffers.items())]
+
+    def write(self, buffers):
+        """Write records returned by take and drop expired files."""
+        if not buffers:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        for date, (inverter_ids, record, version), buffer in buffers:
+            path = os.path.join(self._directory, FILE_NAME.format(date))
+            with open(path, 'ab') as output:
+                if output.tell() == 0:
+                    output.write(_build_header(inverter_ids, record.size, version))
+                output.write(buffer)
+        if self._keep_days:
+            self._expire()
+
+    def flush(self):
+        """Write the buffered records from the appending thread."""
+        self.write(self.take())
+
+    def _expire(self):
+        """Delete the oldest files beyond keep_days."""
+        names = sorted(name for name in os.listdir(self._directory)
+                       if name.startswith('fronius-') and name.endswith('.bin'))
+        for name in names[:-self._keep_days]:
+            os.remove(os.path.join(self._directory, name))
+
+#   SampleWriter
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class SampleFile:
+    """Memory-mapped, read-only view of one sample file.
+
+    Records are read on access only, so slicing a time range of a large file
+    touches just the pages it needs. Records are ordered by timestamp.
+    """
+
+    def __init__(self, path):
+        """Map the file."""
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self._map = b''
+        if len(self._map) < _HEADER.size:
+            self.version = VERSION
+            self._header_size, self.inverter_ids, record_size = _HEADER.size, [], _record_struct(VERSION, 0).size
+        else:
+            self._header_size, self.inverter_ids, record_size, self.version = _read_header(self._map)
+        self._record = _record_struct(self.version, len(self.inverter_ids))
+        if record_size != self._record.size:
+            raise ValueError('unexpected record size in {}'.format(path))
+        # A record cut short by a crash is ignored
+        self._count = max(0, (len(self._map) - self._header_size) // self._record.size)
+
+    def close(self):
+        """Unmap the file."""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        """Use as a context manager."""
+        return self
+
+    def __exit__(self, *_):
+        """Unmap on exit."""
+        self.close()
+
+    def __len__(self):
+        """Return the number of records."""
+        return self._count
+
+    @property
+    def buffer(self):
+        """Return the mapped records, without the header."""
+        return memoryview(self._map)[self._header_size:self._header_size + self._count * self._record.size]
+
+    def timestamp(self, index):
+        """Return the timestamp of one record."""
+        return struct.unpack_from('<d', self._map, self._header_size + index * self._record.size)[0]
+
+    def __getitem__(self, index):
+        """Return one record as a Sample."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        values = self._record.unpack_from(self._map, self._header_size + index * self._record.size)
+        return Sample(
+            values[0], _unpack_power(values[1]), _unpack_power(values[2]), _unpack_power(values[3]),
+            _unpack_float(values[4]), _unpack_float(values[5]), _unpack_float(values[6]),
+            {str(inverter): _unpack_float(power) for inverter, power in zip(self.inverter_ids, values[7:]) if inverter})
+
+    def bisect(self, timestamp):
+        """Return the index of the first record at or after timestamp."""
+        return bisect_left(_TimestampView(self), timestamp)
+
+    def iter_range(self, start=None, end=None):
+        """Yield the samples with start <= timestamp < end."""
+        first = 0 if start is None else self.bisect(start)
+        last = self._count if end is None else self.bisect(end)
+        for index in range(first, last):
+            yield self[index]
+
+#   SampleFile
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class _TimestampView:
+    """Sequence of the timestamps of a SampleFile, for bisect."""
+
+    def __init__(self, sample_file):
+        """Wrap the file."""
+        self._file = sample_file
+
+    def __len__(self):
+        """Return the number of records."""
+        return len(self._file)
+
+    def __getitem__(self, index):
+        """Return one timestamp."""
+        return self._file.timestamp(index)
+
+#   _TimestampView
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class SampleArchive:
+    """All the sample files of one recording directory."""
+
+    def __init__(self, directory):
+        """Initialize the archive."""
+        self._directory = directory
+
+    def paths(self, start=None, end=None):
+        """Return the files that may hold samples with start <= timestamp < end."""
+        if not os.path.isdir(self._directory):
+            return []
+        first = file_date(start) if start is not None else None
+        last = file_date(end) if end is not None else None
+        paths = []
+        for name in sorted(os.listdir(self._directory)):
+            if not (name.startswith('fronius-') and name.endswith('.bin')):
+                continue
+            date = name[len('fronius-'):-len('.bin')]
+            if (first is None or date >= first) and (last is None or date <= last):
+                paths.append(os.path.join(self._directory, name))
+        return paths
+
+    def iter_range(self, start=None, end=None):
+        """Yield the samples with start <= timestamp < end, in time order."""
+        for path in self.paths(start, end):
+            with SampleFile(path) as sample_file:
+                yield from sample_file.iter_range(start, end)
+
+#   SampleArchive
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
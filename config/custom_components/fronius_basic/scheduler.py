@@ -0,0 +1,195 @@
+"""Shared polling scheduler for several Fronius devices."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import asyncio
+import logging
+import time
+from functools import partial
+
+from .rollover import next_hour_start, system_offset
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+_LOGGER = logging.getLogger(__name__)
+
+# Delay between the start of two consecutive devices of one cycle
+DEFAULT_STAGGER = 0.25
+
+# The staggered starts of one cycle never spread over more than this share of the interval
+MAX_SPREAD = 0.25
+
+# Power change (W) between two samples that counts as a fast moving reading
+DEFAULT_CHANGE_THRESHOLD = 50
+
+# Growth of the interval for every stable sample
+DEFAULT_BACKOFF = 2
+
+# Poll this long after an hour boundary, so the sample is taken in the new hour
+BOUNDARY_MARGIN = 1
+
+_POWER_KEYS = ('P_PV', 'P_Grid', 'P_Load')
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class AdaptiveInterval:
+    """Poll delay of one device driven by the rate of change of its power values.
+
+    The delay drops to ``min_interval`` as soon as a power value moved by
+    ``threshold`` watts or more since the previous sample. It grows by
+    ``backoff`` for every stable sample, or while there is no PV production,
+    up to ``max_interval``. A poll never lands further than ``BOUNDARY_MARGIN``
+    seconds past an hour boundary, so hour and day rollovers stay accurate.
+    """
+
+    def __init__(self, min_interval, max_interval, threshold=DEFAULT_CHANGE_THRESHOLD, backoff=DEFAULT_BACKOFF,
+                 next_boundary=partial(next_hour_start, offset_at=system_offset)):
+        """Initialize the policy, intervals in seconds."""
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._threshold = threshold
+        self._backoff = backoff
+        self._next_boundary = next_boundary
+        self._latest_powers = None
+        self.interval = min_interval
+
+    def next_delay(self, site, now):
+        """Return the seconds to wait before the next poll."""
+        if site:
+            powers = tuple(site.get(key) or 0 for key in _POWER_KEYS)
+            latest = self._latest_powers
+            moving = latest is not None and max(
+                abs(power - previous) for power, previous in zip(powers, latest)) >= self._threshold
+            if moving and powers[0]:
+                self.interval = self._min_interval
+            else:
+                self.interval = min(self._max_interval, self.interval * self._backoff)
+            self._latest_powers = powers
+        else:
+            self.interval = self._min_interval
+
+        delay = self.interval
+        boundary = self._next_boundary(now) + BOUNDARY_MARGIN
+        if now + delay > boundary:
+            delay = max(self._min_interval, boundary - now)
+        return delay
+
+#   AdaptiveInterval
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+class SharedScheduler:
+    """Poll every registered fetcher from one timer task.
+
+    Every fetcher has its own due time: every ``interval`` seconds, or as
+    decided by its AdaptiveInterval. Fetchers due together start with a small
+    phase offset from each other so their requests do not burst, but run
+    concurrently, so a cycle takes about as long as the slowest device.
+    Followers (e.g. aggregates of the devices) are updated once the fetchers
+    of a cycle are done. Cycles are not awaited by the timer; a fetcher that is
+    still busy when it is due again applies its own overlap policy.
+    """
+
+    def __init__(self, interval, stagger=DEFAULT_STAGGER):
+        """Initialize the scheduler, interval in seconds."""
+        self._interval = interval
+        self._stagger = stagger
+        self._fetchers = []
+        self._policies = {}
+        self._next_due = {}
+        self._followers = []
+        self._task = None
+        self._cycles = set()
+
+    def add(self, fetcher, policy=None):
+        """Poll fetcher, at a fixed interval unless an AdaptiveInterval policy is given."""
+        self._fetchers.append(fetcher)
+        self._policies[fetcher] = policy
+        self._next_due[fetcher] = time.time() + self._interval
+
+    def add_follower(self, follower):
+        """Update follower after the fetchers of every cycle."""
+        self._followers.append(follower)
+
+    def _offsets(self, count):
+        """Return the start offset of each fetcher of a cycle."""
+        if count < 2:
+            return [0.0] * count
+        step = min(self._stagger, self._interval * MAX_SPREAD / (count - 1))
+        return [index * step for index in range(count)]
+
+    async def _async_run(self, fetcher, offset):
+        """Poll one fetcher after its phase offset."""
+        if offset:
+            await asyncio.sleep(offset)
+        await fetcher.async_update()
+
+    async def async_run_cycle(self, fetchers=None):
+        """Poll the given (by default all) fetchers, then update the followers."""
+        fetchers = self._fetchers if fetchers is None else fetchers
+        results = await asyncio.gather(
+            *(self._async_run(fetcher, offset) for fetcher, offset in zip(fetchers, self._offsets(len(fetchers)))),
+            return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.error("Unexpected error while polling: %r", result)
+
+        for follower in self._followers:
+            await follower.async_update()
+
+    def _schedule(self, fetcher, now):
+        """Set the next due time of a fetcher that is polled now."""
+        policy = self._policies[fetcher]
+        if policy is None:
+            # Keep the cadence, but never queue up missed cycles
+            next_due = self._next_due[fetcher] + self._interval
+            self._next_due[fetcher] = next_due if next_due > now else now + self._interval
+        else:
+            self._next_due[fetcher] = now + policy.next_delay(fetcher.latest_site, now)
+
+    async def async_run(self):
+        """Start the due cycles until cancelled."""
+        while True:
+            now = time.time()
+            due = [fetcher for fetcher in self._fetchers if self._next_due[fetcher] <= now]
+            if due:
+                for fetcher in due:
+                    self._schedule(fetcher, now)
+                cycle = asyncio.ensure_future(self.async_run_cycle(due))
+                self._cycles.add(cycle)
+                cycle.add_done_callback(self._cycles.discard)
+            next_due = min(self._next_due.values(), default=now + self._interval)
+            await asyncio.sleep(max(0.0, next_due - time.time()))
+
+    def start(self):
+        """Run the timer task."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.async_run())
+
+    def stop(self):
+        """Cancel the timer task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+#   SharedScheduler
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -5,23 +5,44 @@
 import logging
 import time
 from datetime import timedelta
-import inspect
-import os.path
+from functools import partial
 
-import requests
 import voluptuous as vol
 import json
-import aiohttp
 
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 import homeassistant.helpers.config_validation as cv
 from homeassistant.components.sensor import PLATFORM_SCHEMA
 from homeassistant.const import (
-    CONF_MONITORED_CONDITIONS, CONF_NAME, CONF_SCAN_INTERVAL, ATTR_ATTRIBUTION
+    CONF_MONITORED_CONDITIONS, CONF_NAME, CONF_SCAN_INTERVAL, ATTR_ATTRIBUTION, EVENT_HOMEASSISTANT_STOP,
+    EVENT_HOMEASSISTANT_CLOSE
     )
+from homeassistant.core import callback
 from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.entity import Entity
-from homeassistant.util.dt import now as dt_now
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import slugify
+from homeassistant.util.dt import as_local, as_utc, get_time_zone, utc_from_timestamp
+
+from .const import (
+    DOMAIN, HOUR_START, SENSOR_LIST, BILLING_SENSORS, ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS, OVERLAP_SKIP,
+    OVERLAP_COALESCE, ENDPOINT_METER, ENDPOINT_STORAGE, ENDPOINT_INVERTER, ENDPOINT_SENSOR_LIST
+    )
+from .core import (
+    PowerflowData, AggregateData, create_session, DEFAULT_SCAN_SECONDS, DEFAULT_MAX_DATA_AGE_SECONDS,
+    MAX_GAP_FACTOR, MAX_CONCURRENT_REQUESTS
+    )
+from .plan import SensorPlan
+from .persistence import AccumulatorStore
+from .scheduler import SharedScheduler, AdaptiveInterval, DEFAULT_CHANGE_THRESHOLD
+from .samples import SampleWriter
+from .rolling import RollingStatistics, window_capacity, DEFAULT_PERCENTILE
+from .rollover import next_hour_start, parse_window, DEFAULT_BILLING_DAY, MAX_BILLING_DAY
+from .export import (
+    BatchExporter, HttpSink, FORMAT_LINE, FORMAT_JSON, DEFAULT_MEASUREMENT, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_MAX_QUEUE
+    )
+from .snapshot import DeviceSnapshot
+from .instrumentation import Tracer
 
 
 
@@ -32,67 +53,161 @@ from homeassistant.util.dt import now as dt_now
 
 --------------------------------------------------------------------------------------------------------------------------------'''
 
-_POWERFLOW_URL = 'http://{}/solar_api/v1/GetPowerFlowRealtimeData.fcgi'
 _LOGGER = logging.getLogger(__name__)
 
 ATTRIBUTION = "Fronius Inverter Basic Data"
+ATTR_DATA_AGE = 'data_age'
+ATTR_ENERGY_TODAY = 'energy_today'
+ATTR_ENERGY_YEAR = 'energy_year'
+ATTR_ENERGY_TOTAL = 'energy_total'
+
+# Key: billing period sensor, value: index of its energy in the tariff buckets, shown as one attribute per tariff
+TARIFF_ATTRIBUTES = {'grid_energy_billing': 0, 'grid_returned_energy_billing': 1}
+
+SERVICE_DUMP_DIAGNOSTICS = 'dump_diagnostics'
+SERVICE_IMPORT_RECORDING = 'import_recording'
+EVENT_DIAGNOSTICS = 'fronius_basic_diagnostics'
+
+DATA_FETCHERS = 'fetchers'
+DATA_SCHEDULERS = 'schedulers'
+DATA_SESSION = 'session'
+DATA_SNAPSHOTS = 'snapshots'
+DATA_RECORDINGS = 'recordings'
+
+ATTR_START = 'start'
+ATTR_END = 'end'
 
 CONF_NAME = 'name'
 CONF_IP_ADDRESS = 'ip_address'
-
-DEFAULT_SCAN_INTERVAL = timedelta(seconds=4)
-
-# Key: ['device', 'system', 'json_key', 'name', 'unit', 'convert_units', 'icon']
-SENSOR_LIST = {
-    'pv_power': ['P_PV', 'PV power', 'W', 'Power', 'mdi:gauge'],
-    'grid_power': ['P_Grid', 'Grid Power', 'W', 'power', 'mdi:gauge'],
-    'house_power': ['P_Load', 'House Power', 'W', 'power_negative', 'mdi:gauge'],
-
-    'self_sufficiency': ['rel_Autonomy', 'Self Sufficiency', '%', False, 'mdi:brightness-percent'],
-    'self_consumption': ['rel_SelfConsumption', 'Self Consumption', '%', False, 'mdi:brightness-percent'],
-
-    'pv_energy_hour': ['pv_energy_hour', 'PV Energy Hour', 'kWh', 'energy_float', 'mdi:solar-panel'],
-    'pv_energy_today': ['E_Day', 'PV Energy Today', 'kWh', 'energy3', 'mdi:solar-panel'],
-    'pv_energy_month': ['pv_energy_month', 'PV Energy Month', 'kWh', 'energy_float', 'mdi:solar-panel'],
-    'pv_energy_year': ['E_Year', 'PV Energy Year', 'kWh', 'energy', 'mdi:solar-panel'],
-    'pv_energy_total': ['E_Total', 'PV Energy Total', 'kWh', 'energy', 'mdi:solar-panel'],
-
-    'grid_energy_hour': ['grid_energy_hour', 'Grid Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_energy_today': ['grid_energy_today', 'Grid Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_energy_month': ['grid_energy_month', 'Grid Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_energy_total': ['grid_energy_total', 'Grid Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-
-    'house_energy_hour': ['house_energy_hour', 'House Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'house_energy_today': ['house_energy_today', 'House Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'house_energy_month': ['house_energy_month', 'House Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'house_energy_total': ['house_energy_total', 'House Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-
-    'grid_returned_energy_hour': ['grid_returned_energy_hour', 'Grid Returned Energy Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_returned_energy_today': ['grid_returned_energy_today', 'Grid Returned Energy Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_returned_energy_month': ['grid_returned_energy_month', 'Grid Returned Energy Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'grid_returned_energy_total': ['grid_returned_energy_total', 'Grid Returned Energy Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-
-    'balance_neto_hour': ['balance_neto_hour', 'Balance Neto Hour', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'balance_neto_today': ['balance_neto_today', 'Balance Neto Today', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'balance_neto_month': ['balance_neto_month', 'Balance Neto Month', 'kWh', 'energy_float', 'mdi:transmission-tower'],
-    'balance_neto_total': ['balance_neto_total', 'Balance Neto Total', 'kWh', 'energy_float', 'mdi:transmission-tower'],
+CONF_DEVICES = 'devices'
+CONF_TRACE = 'trace'
+CONF_DEADBAND = 'deadband'
+CONF_MAX_SILENCE = 'max_silence'
+CONF_ACCUMULATION = 'accumulation'
+CONF_PERSIST_INTERVAL = 'persist_interval'
+CONF_OVERLAP = 'overlap'
+CONF_ADAPTIVE = 'adaptive'
+CONF_MAX_SCAN_INTERVAL = 'max_scan_interval'
+CONF_CHANGE_THRESHOLD = 'change_threshold'
+CONF_MAX_DATA_AGE = 'max_data_age'
+CONF_RECORD = 'record'
+CONF_METER_INTERVAL = 'meter_interval'
+CONF_STORAGE_INTERVAL = 'storage_interval'
+CONF_INVERTER_INTERVAL = 'inverter_interval'
+CONF_MAX_CONCURRENT_REQUESTS = 'max_concurrent_requests'
+CONF_RECORD_KEEP_DAYS = 'record_keep_days'
+CONF_STATISTICS_WINDOWS = 'statistics_windows'
+CONF_STATISTICS_PERCENTILE = 'statistics_percentile'
+CONF_LONG_TERM_STATISTICS = 'long_term_statistics'
+CONF_BILLING_DAY = 'billing_day'
+CONF_TARIFFS = 'tariffs'
+CONF_EXPORT = 'export'
+CONF_URL = 'url'
+CONF_TOPIC = 'topic'
+CONF_TOKEN = 'token'
+CONF_FORMAT = 'format'
+CONF_MEASUREMENT = 'measurement'
+CONF_BATCH_SIZE = 'batch_size'
+CONF_FLUSH_INTERVAL = 'flush_interval'
+CONF_MAX_QUEUE = 'max_queue'
+CONF_SNAPSHOT_API = 'snapshot_api'
+
+DEFAULT_SCAN_INTERVAL = timedelta(seconds=DEFAULT_SCAN_SECONDS)
+DEFAULT_PERSIST_INTERVAL = timedelta(seconds=60)
+DEFAULT_MAX_SCAN_INTERVAL = timedelta(seconds=60)
+DEFAULT_MAX_DATA_AGE = timedelta(seconds=DEFAULT_MAX_DATA_AGE_SECONDS)
+DEFAULT_RECORD_FLUSH_INTERVAL = timedelta(seconds=30)
+DEFAULT_STATISTICS_FLUSH_INTERVAL = timedelta(minutes=5)
+
+# Sensors in this unit keep rolling statistics when statistics_windows is set
+STATISTICS_UNIT = 'W'
+
+# Key: interval option, value: the endpoint it enables
+ENDPOINT_INTERVALS = {
+    CONF_METER_INTERVAL: ENDPOINT_METER,
+    CONF_STORAGE_INTERVAL: ENDPOINT_STORAGE,
+    CONF_INVERTER_INTERVAL: ENDPOINT_INVERTER,
 }
 
-PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
+DEVICE_SCHEMA = vol.Schema({
     vol.Required(CONF_IP_ADDRESS): cv.string,
-    vol.Optional(CONF_NAME, default='Fronius'): cv.string,
+    vol.Required(CONF_NAME): cv.string,
 })
 
+EXPORT_SCHEMA = vol.All(vol.Schema({
+    vol.Exclusive(CONF_URL, CONF_EXPORT): cv.url,
+    vol.Exclusive(CONF_TOPIC, CONF_EXPORT): cv.string,
+    vol.Optional(CONF_TOKEN): cv.string,
+    vol.Optional(CONF_FORMAT, default=FORMAT_LINE): vol.In([FORMAT_LINE, FORMAT_JSON]),
+    vol.Optional(CONF_MEASUREMENT, default=DEFAULT_MEASUREMENT): cv.string,
+    vol.Optional(CONF_BATCH_SIZE, default=DEFAULT_BATCH_SIZE): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_FLUSH_INTERVAL, default=timedelta(seconds=DEFAULT_FLUSH_INTERVAL)): cv.time_period,
+    vol.Optional(CONF_MAX_QUEUE, default=DEFAULT_MAX_QUEUE): vol.All(vol.Coerce(int), vol.Range(min=1)),
+}), cv.has_at_least_one_key(CONF_URL, CONF_TOPIC))
+
+
+def _fitting_statistics_windows(config):
+    """Refuse statistics windows holding more samples than a rolling window keeps at scan_interval."""
+    scan_interval = config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL).total_seconds()
+    for window in config.get(CONF_STATISTICS_WINDOWS, []):
+        try:
+            window_capacity(window.total_seconds(), scan_interval)
+        except ValueError as error:
+            raise vol.Invalid('{}, use a longer {} or a shorter window'.format(error, CONF_SCAN_INTERVAL),
+                              path=[CONF_STATISTICS_WINDOWS])
+    return config
+
+
+def _distinct_device_names(config):
+    """Refuse devices whose names give the same entity ids, or the ids of the combined sensors of the platform name."""
+    devices = config.get(CONF_DEVICES)
+    if not devices:
+        return config
+    # The combined sensors only exist with more than one device
+    taken = {slugify(config[CONF_NAME]): 'the platform name'} if len(devices) > 1 else {}
+    for index, device in enumerate(devices):
+        slug = slugify(device[CONF_NAME])
+        if slug in taken:
+            raise vol.Invalid('{} gives the same entity ids as {}, name every device differently'.format(
+                device[CONF_NAME], taken[slug]), path=[CONF_DEVICES, index, CONF_NAME])
+        taken[slug] = 'device {}'.format(device[CONF_NAME])
+    return config
+
+
+IMPORT_RECORDING_SCHEMA = vol.Schema({
+    vol.Optional(CONF_NAME): cv.string,
+    vol.Optional(ATTR_START): cv.datetime,
+    vol.Optional(ATTR_END): cv.datetime,
+})
 
-
-
-'''--------------------------------------------------------------------------------------------------------------------------------
-
-                                                         VARIABLE DEFINITIONS
-
---------------------------------------------------------------------------------------------------------------------------------'''
-
-start_time = time.time()
+PLATFORM_SCHEMA = vol.All(PLATFORM_SCHEMA.extend({
+    vol.Exclusive(CONF_IP_ADDRESS, CONF_DEVICES): cv.string,
+    vol.Exclusive(CONF_DEVICES, CONF_DEVICES): vol.All(cv.ensure_list, [DEVICE_SCHEMA]),
+    vol.Optional(CONF_NAME, default='Fronius'): cv.string,
+    vol.Optional(CONF_TRACE, default=False): cv.boolean,
+    vol.Optional(CONF_DEADBAND, default={}): {cv.string: vol.All(vol.Coerce(float), vol.Range(min=0))},
+    vol.Optional(CONF_MAX_SILENCE): cv.time_period,
+    vol.Optional(CONF_ACCUMULATION, default=ACCUMULATION_INTEGRATION): vol.In([ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS]),
+    vol.Optional(CONF_PERSIST_INTERVAL, default=DEFAULT_PERSIST_INTERVAL): cv.time_period,
+    vol.Optional(CONF_OVERLAP, default=OVERLAP_SKIP): vol.In([OVERLAP_SKIP, OVERLAP_COALESCE]),
+    vol.Optional(CONF_ADAPTIVE, default=False): cv.boolean,
+    vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL): cv.time_period,
+    vol.Optional(CONF_CHANGE_THRESHOLD, default=DEFAULT_CHANGE_THRESHOLD): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_MAX_DATA_AGE, default=DEFAULT_MAX_DATA_AGE): cv.time_period,
+    vol.Optional(CONF_RECORD, default=False): cv.boolean,
+    vol.Optional(CONF_METER_INTERVAL): cv.time_period,
+    vol.Optional(CONF_STORAGE_INTERVAL): cv.time_period,
+    vol.Optional(CONF_INVERTER_INTERVAL): cv.time_period,
+    vol.Optional(CONF_MAX_CONCURRENT_REQUESTS, default=1): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_CONCURRENT_REQUESTS)),
+    vol.Optional(CONF_RECORD_KEEP_DAYS): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_STATISTICS_WINDOWS, default=[]): vol.All(cv.ensure_list, [cv.time_period]),
+    vol.Optional(CONF_STATISTICS_PERCENTILE, default=DEFAULT_PERCENTILE): vol.All(vol.Coerce(float), vol.Range(min=1, max=100)),
+    vol.Optional(CONF_LONG_TERM_STATISTICS, default=False): cv.boolean,
+    vol.Optional(CONF_BILLING_DAY): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_BILLING_DAY)),
+    vol.Optional(CONF_TARIFFS, default={}): {cv.slug: vol.All(cv.ensure_list, [parse_window])},
+    vol.Optional(CONF_EXPORT): EXPORT_SCHEMA,
+    vol.Optional(CONF_SNAPSHOT_API, default=False): cv.boolean,
+}), cv.has_at_least_one_key(CONF_IP_ADDRESS, CONF_DEVICES), _fitting_statistics_windows, _distinct_device_names)
 
 
 
@@ -106,67 +221,356 @@ start_time = time.time()
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the Fronius inverter sensor."""
 
-    _LOGGER.debug("-->{}s {}() ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-    session = async_get_clientsession(hass)
-    ip_address = config[CONF_IP_ADDRESS]
+    session = _async_get_session(hass)
     name = config.get(CONF_NAME)
     scan_interval = config.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
-
+    trace = config.get(CONF_TRACE)
+    deadbands = config.get(CONF_DEADBAND)
+    max_silence = config.get(CONF_MAX_SILENCE)
+    max_silence = max_silence.total_seconds() if max_silence else None
+    devices = config.get(CONF_DEVICES) or [{CONF_IP_ADDRESS: config[CONF_IP_ADDRESS], CONF_NAME: name}]
+    longest_interval = config.get(CONF_MAX_SCAN_INTERVAL) if config.get(CONF_ADAPTIVE) else scan_interval
+    endpoints = {endpoint: config[option].total_seconds() for option, endpoint in ENDPOINT_INTERVALS.items()
+                 if option in config}
+    billing = CONF_BILLING_DAY in config or bool(config.get(CONF_TARIFFS))
+    statistics = None
+    if config.get(CONF_STATISTICS_WINDOWS):
+        # Sized for the fastest polling, so a window never runs out of slots
+        statistics = partial(RollingStatistics, [window.total_seconds() for window in config[CONF_STATISTICS_WINDOWS]],
+                             scan_interval.total_seconds(), config.get(CONF_STATISTICS_PERCENTILE))
+
+    exporter = None
+    if config.get(CONF_EXPORT):
+        exporter = _async_setup_exporter(hass, session, config[CONF_EXPORT])
+
+    scheduler = _async_get_scheduler(hass, scan_interval)
     fetchers = []
-    powerflow_data = PowerflowData(session, ip_address)
-    fetchers.append(powerflow_data)
-
-    def fetch_executor(fetcher):
-        async def fetch_data(*_):
-            await fetcher.async_update()
-        return fetch_data
-    
-    for fetcher in fetchers:
-        fetch = fetch_executor(fetcher)
-        await fetch()
-        async_track_time_interval(hass, fetch, scan_interval)
+    for device in devices:
+        powerflow_data = PowerflowData(session, device[CONF_IP_ADDRESS], Tracer(trace), config.get(CONF_ACCUMULATION),
+                                       scan_interval.total_seconds(), config.get(CONF_OVERLAP),
+                                       max_gap=MAX_GAP_FACTOR * longest_interval.total_seconds(),
+                                       max_data_age=config.get(CONF_MAX_DATA_AGE).total_seconds(),
+                                       endpoints=endpoints, max_concurrent=config.get(CONF_MAX_CONCURRENT_REQUESTS),
+                                       billing_day=config.get(CONF_BILLING_DAY, DEFAULT_BILLING_DAY),
+                                       tariffs=config.get(CONF_TARIFFS), offset_at=_local_offset)
+        if config.get(CONF_RECORD):
+            _async_setup_recorder(hass, device[CONF_NAME], powerflow_data, config.get(CONF_RECORD_KEEP_DAYS))
+        if config.get(CONF_LONG_TERM_STATISTICS):
+            importer = _async_setup_statistics(hass, device[CONF_NAME], powerflow_data)
+            if config.get(CONF_RECORD) and config.get(CONF_ACCUMULATION) == ACCUMULATION_COUNTERS:
+                # The backfill only integrates the powers, it would overwrite the counted hours with other energies
+                _LOGGER.warning("import_recording needs accumulation: integration, %s is not imported", device[CONF_NAME])
+            elif config.get(CONF_RECORD):
+                recompute = partial(_recompute_recording, _recording_directory(hass, device[CONF_NAME]),
+                                    MAX_GAP_FACTOR * longest_interval.total_seconds(),
+                                    get_time_zone(hass.config.time_zone),
+                                    config.get(CONF_BILLING_DAY, DEFAULT_BILLING_DAY), config.get(CONF_TARIFFS))
+                _async_register_recording_import(hass, device[CONF_NAME], importer, recompute)
+        if exporter is not None:
+            powerflow_data.exporter = exporter.feed(device[CONF_NAME])
+        if config.get(CONF_SNAPSHOT_API):
+            _async_setup_snapshot(hass, device[CONF_NAME], powerflow_data)
+        fetchers.append((device[CONF_NAME], powerflow_data))
+        _async_register_diagnostics(hass, device[CONF_NAME], powerflow_data)
+        await _async_setup_persistence(hass, device[CONF_NAME], powerflow_data, config.get(CONF_PERSIST_INTERVAL))
+
+    for _, powerflow_data in fetchers:
+        policy = None
+        if config.get(CONF_ADAPTIVE):
+            policy = AdaptiveInterval(scan_interval.total_seconds(), config.get(CONF_MAX_SCAN_INTERVAL).total_seconds(),
+                                      config.get(CONF_CHANGE_THRESHOLD), next_boundary=_next_local_hour)
+        scheduler.add(powerflow_data, policy)
+
+    polled = [powerflow_data for _, powerflow_data in fetchers]
+    aggregate_data = None
+    if len(fetchers) > 1:
+        aggregate_data = AggregateData(polled, Tracer(trace))
+        if exporter is not None:
+            aggregate_data.exporter = exporter.feed(name)
+        if config.get(CONF_SNAPSHOT_API):
+            _async_setup_snapshot(hass, name, aggregate_data)
+        scheduler.add_follower(aggregate_data)
+        _async_register_diagnostics(hass, name, aggregate_data)
+        fetchers.append((name, aggregate_data))
 
     dev = []
-    for sensor_key in SENSOR_LIST:
-        sensor = "sensor." + name + "_" + SENSOR_LIST[sensor_key][1]
-        state = hass.states.get(sensor)
-        dev.append(FroniusSensor(powerflow_data, name, sensor_key))
-
-    for inverter in powerflow_data.latest_inverters:
-        sensor = "sensor." + name + "_inverter" + inverter + '_power'
-        state = hass.states.get(sensor)
-        dev.append(FroniusSensor(powerflow_data, name, inverter))
+    for device_name, powerflow_data in fetchers:
+        sensor_keys = [sensor_key for sensor_key in SENSOR_LIST if sensor_key not in BILLING_SENSORS or billing]
+        if powerflow_data is not aggregate_data:
+            for endpoint in endpoints:
+                sensor_keys.extend(ENDPOINT_SENSOR_LIST.get(endpoint, ()))
+        for sensor_key in sensor_keys:
+            dev.append(FroniusSensor(powerflow_data, device_name, sensor_key, deadbands.get(sensor_key, 0), max_silence,
+                                     statistics))
+
+        # The inverter sensors are added as their inverters show up in the responses
+        powerflow_data.add_inverter_listener(
+            _inverter_listener(async_add_entities, powerflow_data, device_name, deadbands, max_silence, statistics))
 
     async_add_entities(dev, True)
-    _LOGGER.debug("<--{}s {}() ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
+
+    # First poll in the background, so a slow or sleeping device does not hold up the start
+    hass.async_create_task(scheduler.async_run_cycle(polled))
 
 #   async_setup_platform
 #----------------------------------------------------------------------------------------------------------------------------------
 
 
+def _inverter_listener(async_add_entities, fetcher, name, deadbands, max_silence, statistics=None):
+    """Return the callback adding the sensors of the inverters seen for the first time."""
+
+    @callback
+    def async_add_inverters(inverters):
+        """Add one power sensor per new inverter."""
+        _LOGGER.info("Found inverter(s) %s on %s", ', '.join(inverters), name)
+        async_add_entities([FroniusSensor(fetcher, name, inverter, deadbands.get(inverter, 0), max_silence, statistics)
+                            for inverter in inverters], True)
+
+    return async_add_inverters
+
+#   _inverter_listener
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_get_session(hass):
+    """Return the session shared by all devices, with kept-alive connections."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    session = domain_data.get(DATA_SESSION)
+    if session is None:
+        session = domain_data[DATA_SESSION] = create_session()
+
+        async def async_close_session(event):
+            """Close the pooled connections."""
+            await session.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close_session)
+    return session
+
+#   _async_get_session
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_get_scheduler(hass, scan_interval):
+    """Return the scheduler shared by all platforms polling at scan_interval."""
+    schedulers = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_SCHEDULERS, {})
+    scheduler = schedulers.get(scan_interval)
+    if scheduler is None:
+        scheduler = schedulers[scan_interval] = SharedScheduler(scan_interval.total_seconds())
+        scheduler.start()
+
+        @callback
+        def async_stop_scheduler(event):
+            """Stop polling."""
+            scheduler.stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_scheduler)
+    return scheduler
+
+#   _async_get_scheduler
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _next_local_hour(now):
+    """Return the timestamp of the next hour boundary in the Home Assistant time zone."""
+    return next_hour_start(now, _local_offset)
+
+#   _next_local_hour
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _local_offset(timestamp):
+    """Return the UTC offset (s) of the Home Assistant time zone at a timestamp."""
+    return int(as_local(utc_from_timestamp(timestamp)).utcoffset().total_seconds())
+
+#   _local_offset
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_register_diagnostics(hass, name, fetcher):
+    """Expose the fetcher diagnostics through the dump service."""
+    fetchers = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_FETCHERS, {})
+    fetchers[name] = fetcher
+
+    if hass.services.has_service(DOMAIN, SERVICE_DUMP_DIAGNOSTICS):
+        return
+
+    async def async_dump_diagnostics(call):
+        """Log the diagnostics of every fetcher and fire them as an event."""
+        for fetcher_name, registered in hass.data[DOMAIN][DATA_FETCHERS].items():
+            diagnostics = registered.diagnostics()
+            _LOGGER.info("Diagnostics for %s: %s", fetcher_name, json.dumps(diagnostics))
+            hass.bus.async_fire(EVENT_DIAGNOSTICS, {CONF_NAME: fetcher_name, 'diagnostics': diagnostics})
+
+    hass.services.async_register(DOMAIN, SERVICE_DUMP_DIAGNOSTICS, async_dump_diagnostics)
+
+#   _async_register_diagnostics
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+async def _async_setup_persistence(hass, name, fetcher, persist_interval):
+    """Restore the running totals and write them behind on an interval."""
+    store = AccumulatorStore(hass.config.path(STORAGE_DIR, '{}.{}'.format(DOMAIN, slugify(name))))
+    state = await hass.async_add_executor_job(store.load)
+    if state:
+        fetcher.restore(state)
+
+    async def async_persist(*_):
+        """Write the running totals in the executor."""
+        await hass.async_add_executor_job(store.write, fetcher.snapshot())
+
+    async_track_time_interval(hass, async_persist, persist_interval)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_persist)
+
+#   _async_setup_persistence
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _recording_directory(hass, name):
+    """Return the directory of the recorded samples of the device called name."""
+    return hass.config.path(DOMAIN, slugify(name))
+
+#   _recording_directory
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_setup_recorder(hass, name, fetcher, keep_days):
+    """Record the raw samples of the fetcher and write them behind on an interval."""
+    recorder = SampleWriter(_recording_directory(hass, name), keep_days=keep_days)
+    fetcher.recorder = recorder
+
+    async def async_flush(*_):
+        """Write the buffered samples in the executor."""
+        await hass.async_add_executor_job(recorder.write, recorder.take())
+
+    async_track_time_interval(hass, async_flush, DEFAULT_RECORD_FLUSH_INTERVAL)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_flush)
+
+#   _async_setup_recorder
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_setup_statistics(hass, name, fetcher):
+    """Import the closed hours of the fetcher into the long-term statistics on an interval."""
+    # The recorder is only loaded when the statistics are enabled
+    from .longterm import StatisticsImporter
+
+    importer = StatisticsImporter(hass, name)
+    fetcher.statistics_importer = importer
+    async_track_time_interval(hass, importer.async_flush, DEFAULT_STATISTICS_FLUSH_INTERVAL)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, importer.async_flush)
+    return importer
+
+#   _async_setup_statistics
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _recompute_recording(directory, max_gap, tz, billing_day, tariffs, start=None, end=None):
+    """Recompute the whole hours of a recording, blocking, raise ImportError without numpy."""
+    # numpy is only needed, and loaded, when a recording is recomputed
+    from .backfill import recompute_hours
+
+    return recompute_hours(directory, max_gap, tz, start=start, end=end, billing_day=billing_day, tariffs=tariffs)
+
+#   _recompute_recording
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_register_recording_import(hass, name, importer, recompute):
+    """Expose the rewrite of the statistics from the recomputed recording through the import service."""
+    recordings = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_RECORDINGS, {})
+    recordings[name] = (importer, recompute)
+
+    if hass.services.has_service(DOMAIN, SERVICE_IMPORT_RECORDING):
+        return
+
+    async def async_import_recording(call):
+        """Recompute the recordings in the executor and rewrite the statistics of their hours."""
+        start = call.data.get(ATTR_START)
+        end = call.data.get(ATTR_END)
+        start = as_utc(start).timestamp() if start else None
+        end = as_utc(end).timestamp() if end else None
+        for device_name, (device_importer, device_recompute) in hass.data[DOMAIN][DATA_RECORDINGS].items():
+            if call.data.get(CONF_NAME, device_name) != device_name:
+                continue
+            try:
+                rows = await hass.async_add_executor_job(partial(device_recompute, start=start, end=end))
+            except ImportError as error:
+                _LOGGER.error("Cannot recompute the recording of %s: %s", device_name, error)
+                return
+            await device_importer.async_import_backfill(rows)
+            _LOGGER.info("Imported %d recomputed hour(s) of %s", len(rows[HOUR_START]), device_name)
+
+    hass.services.async_register(DOMAIN, SERVICE_IMPORT_RECORDING, async_import_recording,
+                                 schema=IMPORT_RECORDING_SCHEMA)
+
+#   _async_register_recording_import
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_setup_exporter(hass, session, config):
+    """Return a started exporter writing to the HTTP endpoint or the MQTT topic of the export options."""
+    if CONF_URL in config:
+        sink = HttpSink(session, config[CONF_URL], config.get(CONF_TOKEN))
+    else:
+        # MQTT is only loaded when the export publishes to a topic
+        from homeassistant.components import mqtt
+
+        topic = config[CONF_TOPIC]
+
+        async def sink(payload):
+            """Publish one batch as one message."""
+            result = mqtt.async_publish(hass, topic, payload)
+            if result is not None:
+                await result
+
+    exporter = BatchExporter(sink, config[CONF_FORMAT], config[CONF_MEASUREMENT], config[CONF_BATCH_SIZE],
+                             config[CONF_FLUSH_INTERVAL].total_seconds(), config[CONF_MAX_QUEUE])
+    exporter.start()
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, exporter.async_stop)
+    return exporter
+
+#   _async_setup_exporter
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+def _async_setup_snapshot(hass, name, fetcher):
+    """Serve the latest sample of the fetcher at /api/fronius_basic/<slug of name>."""
+    if getattr(hass, 'http', None) is None:
+        _LOGGER.warning("snapshot_api needs the http integration, %s is not served", name)
+        return
+    # The view is only loaded when the snapshots are served
+    from .view import SnapshotView
+
+    snapshots = hass.data.setdefault(DOMAIN, {}).get(DATA_SNAPSHOTS)
+    if snapshots is None:
+        snapshots = hass.data[DOMAIN][DATA_SNAPSHOTS] = {}
+        hass.http.register_view(SnapshotView(snapshots))
+    fetcher.snapshot_feed = snapshots[slugify(name)] = DeviceSnapshot(name)
+
+#   _async_setup_snapshot
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
 class FroniusSensor(Entity):
     """Implementation of the Fronius inverter sensor."""
 
-    def __init__(self, device_data, name, sensor_key):
-        """Initialize the sensor."""
-        _LOGGER.debug("<->{}s {}({}) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, sensor_key, os.path.basename(__file__), inspect.currentframe().f_lineno))
+    def __init__(self, device_data, name, sensor_key, deadband=0, max_silence=None, statistics=None):
+        """Initialize the sensor, statistics builds the rolling statistics of a power sensor."""
         self._client = name
         self._sensor_key = sensor_key
         self._data = device_data
         self._state = None
-
-        if sensor_key.isnumeric():
-            self._json_key = 'P'
-            self._name = 'Inverter' + sensor_key + ' Power'
-            self._unit = 'W'
-            self._convert_units = 'power'
-            self._icon = 'mdi:gauge'
-        else:
-            self._json_key = SENSOR_LIST[sensor_key][0]
-            self._name = SENSOR_LIST[sensor_key][1]
-            self._unit = SENSOR_LIST[sensor_key][2]
-            self._convert_units = SENSOR_LIST[sensor_key][3]
-            self._icon = SENSOR_LIST[sensor_key][4]
+        self._deadband = deadband
+        self._max_silence = max_silence
+        self._published_at = None
+
+        self._plan = SensorPlan(device_data, sensor_key)
+        self._inverter = sensor_key if sensor_key.isnumeric() else None
+        self._name = self._plan.name
+        self._unit = self._plan.unit
+        self._icon = self._plan.icon
+        self._statistics = statistics() if statistics is not None and self._unit == STATISTICS_UNIT else None
+        self._sampled_at = None
 
     @property
     def name(self):
@@ -180,7 +584,10 @@ class FroniusSensor(Entity):
 
     @property
     def available(self, utcnow=None):
-        return True
+        """Return True while the data of the device is recent enough, and its inverter still reports."""
+        if self._inverter is not None and not self._data.has_inverter(self._inverter):
+            return False
+        return self._data.available
 
     @property
     def unique_id(self):
@@ -193,9 +600,25 @@ class FroniusSensor(Entity):
         return self._unit
 
     @property
-    def device_state_attributes(self):
+    def extra_state_attributes(self):
         """Return the state attributes."""
         attrs = {ATTR_ATTRIBUTION: ATTRIBUTION}
+        data_age = self._data.data_age
+        if data_age is not None:
+            attrs[ATTR_DATA_AGE] = int(round(data_age))
+        if self._inverter is not None:
+            details = (self._data.latest_endpoint(ENDPOINT_INVERTER) or {}).get(self._inverter)
+            if details:
+                for attr, field in ((ATTR_ENERGY_TODAY, 'DAY_ENERGY'), (ATTR_ENERGY_YEAR, 'YEAR_ENERGY'),
+                                    (ATTR_ENERGY_TOTAL, 'TOTAL_ENERGY')):
+                    if details.get(field) is not None:
+                        attrs[attr] = round(details[field] / 1000, 3)
+        if self._sensor_key in TARIFF_ATTRIBUTES:
+            index = TARIFF_ATTRIBUTES[self._sensor_key]
+            for tariff, energy in self._data.tariff_energy.items():
+                attrs[tariff] = round(energy[index] / 3600000, 3)
+        if self._statistics is not None:
+            attrs.update(self._statistics.attributes(time.monotonic()))
         return attrs
 
     @property
@@ -210,77 +633,44 @@ class FroniusSensor(Entity):
 
     async def async_update(self, utcnow=None):
         """Get the latest data from inverter and update the states."""
-        _LOGGER.debug("<->{}s {}({}) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, self._sensor_key, os.path.basename(__file__), inspect.currentframe().f_lineno))
-        state = None
-        if self._sensor_key.isnumeric():
-            if self._data.latest_inverters:
-                # Read data
-                state = self._data.latest_inverters[self._sensor_key][self._json_key]
-                if state is None:
-                    state = 0
-        else:
-            if self._data.latest_site:
-                if self._json_key in self._data.latest_site:
-                    # Read data directly, if it is 'null' convert it to 0
-                    state = self._data.latest_site[self._json_key]
-                    if state is None:
-                        state = 0
-                else:
-                    if self._json_key == "pv_energy_hour":
-                        state = self._data.pv_energy_hour
-                    elif self._json_key == "pv_energy_month":
-                        state = self._data.pv_energy_month
-
-                    elif self._json_key == "grid_energy_hour":
-                        state = self._data.grid_energy_hour
-                    elif self._json_key == "grid_energy_today":
-                        state = self._data.grid_energy_today
-                    elif self._json_key == "grid_energy_month":
-                        state = self._data.grid_energy_month
-                    elif self._json_key == "grid_energy_total":
-                        state = self._data.grid_energy_total
-
-                    elif self._json_key == "house_energy_hour":
-                        state = self._data.house_energy_hour
-                    elif self._json_key == "house_energy_today":
-                        state = self._data.house_energy_today
-                    elif self._json_key == "house_energy_month":
-                        state = self._data.house_energy_month
-                    elif self._json_key == "house_energy_total":
-                        state = self._data.house_energy_total
-
-                    elif self._json_key == "grid_returned_energy_hour":
-                        state = self._data.grid_returned_energy_hour
-                    elif self._json_key == "grid_returned_energy_today":
-                        state = self._data.grid_returned_energy_today
-                    elif self._json_key == "grid_returned_energy_month":
-                        state = self._data.grid_returned_energy_month
-                    elif self._json_key == "grid_returned_energy_total":
-                        state = self._data.grid_returned_energy_total
-
-                    elif self._json_key == "balance_neto_hour":
-                        state = self._data.balance_neto_hour
-                    elif self._json_key == "balance_neto_today":
-                        state = self._data.balance_neto_today
-                    elif self._json_key == "balance_neto_month":
-                        state = self._data.balance_neto_month
-                    elif self._json_key == "balance_neto_total":
-                        state = self._data.balance_neto_total
-
-        # convert and round the result
+        state = self._plan.value()
         if state is not None:
-            if self._convert_units == "energy":
-                self._state = int(round(state / 1000))
-            elif self._convert_units == "energy3":
-                self._state = round(state / 1000, 3)
-            elif self._convert_units == "energy_float":
-                self._state = round(state / 3600000, 3)
-            elif self._convert_units == "power":
-                self._state = int(round(state))
-            elif self._convert_units == "power_negative":
-                self._state = int(round(-state))
+            self._state = state
+            self._published_at = time.monotonic()
+
+    def refresh(self, now):
+        """Compute the new state and tell whether it has to be written.
+
+        The state is kept when the value did not move past the deadband, unless
+        it has not been written for longer than max_silence seconds.
+        """
+        state = self._plan.value()
+        if state is None:
+            return False
+
+        # Every sample counts in the statistics, also when the state is not written
+        statistics = self._statistics
+        if statistics is not None and self._data.last_success != self._sampled_at:
+            self._sampled_at = self._data.last_success
+            statistics.add(now, state)
+
+        last = self._state
+        if last is not None:
+            if self._deadband:
+                changed = abs(state - last) >= self._deadband
             else:
-                self._state = int(round(state))
+                changed = state != last
+            if not changed:
+                if self._max_silence is None or now - self._published_at < self._max_silence:
+                    return False
+
+        self._state = state
+        self._published_at = now
+        return True
+
+    def publish(self):
+        """Write the state, called by the fetcher when refresh asked for it."""
+        self.async_schedule_update_ha_state()
 
     async def async_added_to_hass(self):
         """Register at data provider for updates."""
@@ -294,279 +684,6 @@ class FroniusSensor(Entity):
 #----------------------------------------------------------------------------------------------------------------------------------
 
 
-class FroniusFetcher:
-    """Handle Fronius API requests."""
-
-    def __init__(self, session, ip_address):
-        """Initialize the data object."""
-        self._session = session
-        self._ip_address = ip_address
-        self._data = None
-        self._sensors = set()
-        self._day = dt_now().day
-        self._hour = dt_now().hour
-        self._month = dt_now().month
-        self._latest_call = time.time()
-
-        self._latest_pv_power = 0
-        self._latest_grid_power = 0
-        self._latest_house_power = 0
-
-        self._pv_energy_hour = 0
-        self._pv_energy_month = 0
-
-        self._grid_energy_hour = 0
-        self._grid_energy_today = 0
-        self._grid_energy_month = 0
-        self._grid_energy_total = 0
-
-        self._house_energy_hour = 0
-        self._house_energy_today = 0
-        self._house_energy_month = 0
-        self._house_energy_total = 0
-
-        self._grid_returned_energy_hour = 0
-        self._grid_returned_energy_today = 0
-        self._grid_returned_energy_month = 0
-        self._grid_returned_energy_total = 0
-
-        self._balance_neto_hour = 0
-        self._balance_neto_today = 0
-        self._balance_neto_month = 0
-        self._balance_neto_total = 0
-
-    async def async_update(self):
-        """Retrieve and update latest state."""
-        _LOGGER.debug("-->{}s {}(FroniusFetcher) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-        try:
-            await self._update()
-        except aiohttp.ClientConnectionError:
-            _LOGGER.error("    Failed to update: connection error ({}:{})".format(os.path.basename(__file__), inspect.currentframe().f_lineno))
-        except asyncio.TimeoutError:
-            _LOGGER.error("    Failed to update: request timeout ({}:{})".format(os.path.basename(__file__), inspect.currentframe().f_lineno))
-        except ValueError:
-            _LOGGER.error("    Failed to update: invalid response received ({}:{})".format(os.path.basename(__file__), inspect.currentframe().f_lineno))
-
-        # Schedule an update for all included sensors
-        for sensor in self._sensors:
-            sensor.async_schedule_update_ha_state(True)
-        _LOGGER.debug("<--{}s {}(FroniusFetcher) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-    
-    async def fetch_data(self, url):
-        """Retrieve data from inverter in async manner."""
-        _LOGGER.debug("-->{}s {}(FroniusFetcher) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-        try:
-            response = await self._session.get(url, timeout=10)
-            if response.status != 200:
-                raise ValueError
-            json_response = await response.json()
-            _LOGGER.debug("<--{}s {}(FroniusFetcher) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-            return json_response
-        except aiohttp.ClientResponseError:
-            raise ValueError
-        _LOGGER.debug("<--{}s {}(FroniusFetcher) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-
-    @property
-    def latest_inverters(self):
-        """Return the latest data object."""
-        if self._data:
-            return self._data['Inverters']
-        return None
-
-    @property
-    def latest_site(self):
-        """Return the latest data object."""
-        if self._data:
-            return self._data['Site']
-        return None
-
-
-    @property
-    def pv_energy_hour(self):
-        """Return the PV energy."""
-        return self._pv_energy_hour
-
-    @property
-    def pv_energy_month(self):
-        """Return the PV energy."""
-        return self._pv_energy_month
-
-
-    @property
-    def grid_energy_hour(self):
-        """Return the grid energy."""
-        return self._grid_energy_hour
-
-    @property
-    def grid_energy_today(self):
-        """Return the grid energy."""
-        return self._grid_energy_today
-
-    @property
-    def grid_energy_month(self):
-        """Return the grid energy."""
-        return self._grid_energy_month
-
-    @property
-    def grid_energy_total(self):
-        """Return the grid energy."""
-        return self._grid_energy_total
-
-
-    @property
-    def house_energy_hour(self):
-        """Return the house energy."""
-        return self._house_energy_hour
-
-    @property
-    def house_energy_today(self):
-        """Return the house energy."""
-        return self._house_energy_today
-
-    @property
-    def house_energy_month(self):
-        """Return the house energy."""
-        return self._house_energy_month
-
-    @property
-    def house_energy_total(self):
-        """Return the house energy."""
-        return self._house_energy_total
-
-
-    @property
-    def grid_returned_energy_hour(self):
-        """Return the grid returned energy."""
-        return self._grid_returned_energy_hour
-
-    @property
-    def grid_returned_energy_today(self):
-        """Return the grid returned energy."""
-        return self._grid_returned_energy_today
-
-    @property
-    def grid_returned_energy_month(self):
-        """Return the grid returned energy."""
-        return self._grid_returned_energy_month
-
-    @property
-    def grid_returned_energy_total(self):
-        """Return the grid returned energy."""
-        return self._grid_returned_energy_total
-
-
-    @property
-    def balance_neto_hour(self):
-        """Return the balance neto horario."""
-        return self._balance_neto_hour
-
-    @property
-    def balance_neto_today(self):
-        """Return the balance neto today."""
-        return self._balance_neto_today
-
-    @property
-    def balance_neto_month(self):
-        """Return the balance neto month."""
-        return self._balance_neto_month
-
-    @property
-    def balance_neto_total(self):
-        """Return the balance neto total."""
-        return self._balance_neto_total
-
-    async def register(self, sensor):
-        """Register child sensor for update subscriptions."""
-        self._sensors.add(sensor)
-
-#   FroniusFetcher
-#----------------------------------------------------------------------------------------------------------------------------------
-
-
-class PowerflowData(FroniusFetcher):
-    """Handle Fronius API object and limit updates."""
-
-    def _build_url(self):
-        """Build the URL for the requests."""
-        url = _POWERFLOW_URL.format(self._ip_address)
-        return url
-
-    async def _update(self):
-        """Get the latest data from inverter."""
-        _LOGGER.debug("-->{}s {}(PowerflowData) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-        self._data = (await self.fetch_data(self._build_url()))['Body']['Data']
-        current_time = time.time()
-        elapsed = int(round(current_time - self._latest_call))
-        pv_energy_elapsed = self._latest_pv_power * elapsed
-        grid_energy_elapsed = self._latest_grid_power * elapsed
-        house_energy_elapsed = self._latest_house_power * elapsed
-        self._balance_neto_hour -= grid_energy_elapsed
-
-        self._pv_energy_hour += pv_energy_elapsed
-        self._pv_energy_month += pv_energy_elapsed
-
-        if self._latest_grid_power > 0:
-            self._grid_energy_hour += grid_energy_elapsed
-            self._grid_energy_today += grid_energy_elapsed
-            self._grid_energy_month += grid_energy_elapsed
-            self._grid_energy_total += grid_energy_elapsed
-        else:
-            self._grid_returned_energy_hour -= grid_energy_elapsed
-            self._grid_returned_energy_today -= grid_energy_elapsed
-            self._grid_returned_energy_month -= grid_energy_elapsed
-            self._grid_returned_energy_total -= grid_energy_elapsed
-
-        # house_power is a negative number
-        if self._latest_house_power < 0:
-            self._house_energy_hour -= house_energy_elapsed
-            self._house_energy_today -= house_energy_elapsed
-            self._house_energy_month -= house_energy_elapsed
-            self._house_energy_total -= house_energy_elapsed
-
-        if self._data:
-            self._latest_pv_power = int(round(self._data['Site']['P_PV'])) if self._data['Site']['P_PV'] else 0
-            self._latest_grid_power = int(round(self._data['Site']['P_Grid']))
-            self._latest_house_power = int(round(self._data['Site']['P_Load']))
-            self._latest_call = current_time
-
-        if dt_now().hour != self._hour:
-            self._hour = dt_now().hour
-
-            if self._grid_energy_hour > self._grid_returned_energy_hour:
-                self._balance_neto_today += self._grid_returned_energy_hour
-                self._balance_neto_month += self._grid_returned_energy_hour
-                self._balance_neto_total += self._grid_returned_energy_hour
-            else:
-                self._balance_neto_today += self._grid_energy_hour
-                self._balance_neto_month += self._grid_energy_hour
-                self._balance_neto_total += self._grid_energy_hour
-
-            self._balance_neto_hour = 0
-            self._pv_energy_hour = 0
-            self._grid_energy_hour = 0
-            self._house_energy_hour = 0
-            self._grid_returned_energy_hour = 0
-            if dt_now().day != self._day:
-                self._day = dt_now().day
-                self._balance_neto_today = 0
-                self._grid_energy_today = 0
-                self._house_energy_today = 0
-                self._grid_returned_energy_today = 0
-
-                if dt_now().month != self._month:
-                    self._month = dt_now().month
-                    self._balance_neto_month = 0
-                    self._pv_energy_month = 0
-                    self._grid_energy_month = 0
-                    self._house_energy_month = 0
-                    self._grid_returned_energy_month = 0
-
-        _LOGGER.debug("<--{}s {}(PowerflowData) ({}:{})".format(round(time.time() - start_time, 3), inspect.currentframe().f_code.co_name, os.path.basename(__file__), inspect.currentframe().f_lineno))
-
-#   PowerflowData
-#----------------------------------------------------------------------------------------------------------------------------------
-
-
 
 
 #------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,128 @@
+"""Latest sample of every device, serialized once and shared by any number of readers."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import asyncio
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .const import ACCUMULATORS
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+# Longest wait in seconds of a reader for the next sample
+MAX_WAIT = 60
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _dumps(value):
+    """Serialize to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def etag_matches(if_none_match, etag):
+    """Return True when an If-None-Match header lists etag, weak or not, or is '*'."""
+    if not if_none_match or etag is None:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class DeviceSnapshot:
+    """Latest sample of one device, set as FroniusFetcher.snapshot_feed.
+
+    ``append`` only keeps references to the sample and a copy of the running
+    totals; the body is serialized by the first reader of that sample and the
+    same bytes are served to the next ones. The ETag is the sample time in
+    milliseconds, so it stays valid across restarts. Readers waiting for the
+    next sample all wake on the same event, replaced on every sample.
+    """
+
+    def __init__(self, name):
+        """Initialize the snapshot of the device called name, without a sample."""
+        self.name = name
+        self.etag = None
+        self._sample = None
+        self._body = None
+        self._next_sample = asyncio.Event()
+        self.samples = 0
+        self.reads = 0
+        self.serializations = 0
+
+    def append(self, timestamp, data, totals):
+        """Replace the sample and wake the waiting readers."""
+        self._sample = (timestamp, data, {key: getattr(totals, key) for key in ACCUMULATORS},
+                        {tariff: list(energy) for tariff, energy in totals.tariff_energy.items()})
+        self._body = None
+        self.etag = '"{:x}"'.format(int(round(timestamp * 1000)))
+        self.samples += 1
+        next_sample, self._next_sample = self._next_sample, asyncio.Event()
+        next_sample.set()
+
+    @property
+    def body(self):
+        """Return the JSON bytes of the latest sample, or None."""
+        self.reads += 1
+        if self._body is None and self._sample is not None:
+            timestamp, data, totals, tariffs = self._sample
+            self._body = _dumps({
+                'name': self.name,
+                'time': timestamp,
+                'site': data['Site'],
+                'inverters': data['Inverters'],
+                'totals': totals,
+                'tariffs': tariffs,
+            })
+            self.serializations += 1
+        return self._body
+
+    async def async_wait(self, timeout):
+        """Wait up to timeout seconds for the next sample, return True when it came."""
+        try:
+            await asyncio.wait_for(self._next_sample.wait(), min(timeout, MAX_WAIT))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def diagnostics(self):
+        """Return the sample, read and serialization counters."""
+        return {'samples': self.samples, 'reads': self.reads, 'serializations': self.serializations}
+
+#   DeviceSnapshot
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
@@ -0,0 +1,242 @@
+"""Running energy totals of a Fronius device, folded from its samples."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+import time
+
+from .const import (
+    ACCUMULATION_INTEGRATION, ACCUMULATION_COUNTERS, COUNTER_PV, COUNTER_GRID_IMPORT, COUNTER_GRID_EXPORT, HOUR_START
+    )
+from .metrics import (
+    MetricGraph, EnergyLedger, total_keys, RATE_METRICS, ENERGY_METRICS, SETTLED_METRICS, DERIVED_TOTALS
+    )
+from .rollover import RolloverClock, system_offset, CLOSE_HOUR, CLOSE_BILLING, TARIFF_CHANGE, DEFAULT_BILLING_DAY
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       FUNCTION DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+def _share(energy, cut, elapsed):
+    """Return the part of the energy of elapsed seconds that falls in the first cut seconds."""
+    if not elapsed:
+        return 0
+    if cut >= elapsed:
+        return energy
+    if isinstance(energy, int):
+        return energy * cut // elapsed
+    return energy * cut / elapsed
+
+
+def _total_property(key):
+    """Return the read-only property of one running total."""
+    return property(lambda self: self._ledger.value(key), doc='Return the running total {} (Ws).'.format(key))
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class RunningTotals:
+    """Hour, day, month, billing period, tariff and total energies (Ws) of one device.
+
+    ``ingest`` folds one Body.Data block taken at a time. The rate metrics,
+    energies and periods are declared in metrics.py: a MetricGraph derives
+    the rates from the Site fields and an EnergyLedger integrates them, and
+    every running total is a property of the same name. Every closed hour is
+    appended as a row to ``statistics_importer`` when one is set. Local
+    hours, days and months follow offset_at(t), the UTC offset in seconds at t.
+    """
+
+    def __init__(self, max_gap, accumulation=ACCUMULATION_INTEGRATION, billing_day=DEFAULT_BILLING_DAY, tariffs=None,
+                 offset_at=system_offset):
+        """Initialize the totals at zero, power is not integrated over gaps longer than max_gap seconds."""
+        self._max_gap = max_gap
+        self._accumulation = accumulation
+        self.statistics_importer = None
+        # Started by the first sample, or by restore
+        self._clock = RolloverClock(offset_at, billing_day, tariffs)
+        self._next_boundary = self._clock.next_boundary
+        self._latest_call = time.time()
+        self._latest_counters = {}
+
+        self._metrics = MetricGraph(RATE_METRICS)
+        self._ledger = EnergyLedger(ENERGY_METRICS, SETTLED_METRICS, DERIVED_TOTALS)
+
+        # Key: tariff, value: grid import and export (Ws) in the billing period
+        self._tariff_energy = {tariff: [0, 0] for tariff in self._clock.tariffs}
+
+    @property
+    def tariff_energy(self):
+        """Return the grid import and export (Ws) of every tariff in the billing period."""
+        self._ledger.fold_bucket()
+        return self._tariff_energy
+
+    def snapshot(self):
+        """Return the running totals as a flat dict to persist."""
+        state = {key: self._ledger.value(key) for key in self._ledger.keys}
+        state['tariffs'] = {tariff: list(energy) for tariff, energy in self.tariff_energy.items()}
+        # Time of the latest sample, the clock is started there again on restore
+        state['clock'] = self._latest_call if self._clock.started else None
+        state['counters'] = dict(self._latest_counters)
+        state['saved_at'] = time.time()
+        return state
+
+    def restore(self, state):
+        """Continue from persisted running totals.
+
+        Periods that ended while Home Assistant was down are closed right away, so
+        the energy of the downtime (known from counter deltas, never from stale
+        power) lands in the period where polling resumes.
+        """
+        self._ledger.load(state)
+        for tariff, energy in (state.get('tariffs') or {}).items():
+            if tariff in self._tariff_energy:
+                self._tariff_energy[tariff] = list(energy)
+        self._latest_counters = dict(state.get('counters') or {})
+
+        position = state.get('clock', state.get('saved_at'))
+        if position is None:
+            return
+        self._start_clock(position)
+        now = time.time()
+        while now >= self._clock.next_boundary:
+            self._close(self._clock.hour_start, self._clock.advance())
+        self._next_boundary = self._clock.next_boundary
+
+    def _read_counters(self, data):
+        """Return the energy counters (Wh) of the response, None when missing."""
+        return {}
+
+    def _counter_delta(self, key, counters):
+        """Return the energy (Ws) since the previous reading of a counter, or None."""
+        value = counters.get(key)
+        previous = self._latest_counters.get(key)
+        if value is None or previous is None or value < previous:
+            return None
+        return (value - previous) * 3600
+
+    def _counted_energies(self, data):
+        """Return the energies (Ws) of the interval known from counter deltas, by energy metric."""
+        counters = self._read_counters(data)
+        pv_delta = self._counter_delta(COUNTER_PV, counters)
+        import_delta = self._counter_delta(COUNTER_GRID_IMPORT, counters)
+        export_delta = self._counter_delta(COUNTER_GRID_EXPORT, counters)
+        self._latest_counters = counters
+
+        counted = {}
+        if pv_delta is not None:
+            counted['pv_energy'] = pv_delta
+        if import_delta is not None and export_delta is not None:
+            counted['grid_energy'] = import_delta
+            counted['grid_returned_energy'] = export_delta
+            if pv_delta is not None:
+                counted['house_energy'] = pv_delta + import_delta - export_delta
+        return counted
+
+    def ingest(self, data, current_time):
+        """Fold one response into the running totals."""
+        elapsed = int(round(current_time - self._latest_call))
+        if elapsed > self._max_gap:
+            # The power of the sample before an outage says nothing about the outage
+            elapsed = 0
+        # Read first, a sample the formulas refuse changes nothing
+        changed = self._metrics.update(data['Site'])
+        counted = self._counted_energies(data) if self._accumulation == ACCUMULATION_COUNTERS else None
+
+        # One comparison per sample, the boundaries are only worked out when one is passed
+        if current_time < self._next_boundary:
+            self._ledger.advance(elapsed, counted)
+        else:
+            self._cross_boundaries(current_time, elapsed, counted)
+
+        # The powers of this sample are integrated from here to the next one
+        if changed:
+            self._ledger.set_rates(changed, self._metrics.values)
+        self._latest_call = current_time
+
+    def _start_clock(self, timestamp):
+        """Start the rollover clock at timestamp."""
+        self._clock.start(timestamp)
+        self._ledger.set_bucket(self._tariff_energy.get(self._clock.tariff))
+        self._next_boundary = self._clock.next_boundary
+
+    def _cross_boundaries(self, current_time, elapsed, counted):
+        """Split the energies of an interval at the boundaries it passes, closing the periods that ended.
+
+        The part before a boundary is the share of the whole seconds up to it, so
+        integrated energy splits exactly. Without elapsed seconds (an outage) all
+        of it goes to the periods where polling resumes.
+        """
+        clock = self._clock
+        ledger = self._ledger
+        if not clock.started:
+            self._start_clock(current_time)
+            ledger.advance(elapsed, counted)
+            return
+
+        ledger.fold()
+        counted = counted or {}
+        energies = {energy: counted.get(energy, ledger.rate(energy) * elapsed) for energy in ENERGY_METRICS}
+        done = dict.fromkeys(energies, 0)
+        while current_time >= clock.next_boundary:
+            cut = min(elapsed, max(0, int(round(clock.next_boundary - self._latest_call))))
+            parts = {energy: _share(amount, cut, elapsed) for energy, amount in energies.items()}
+            ledger.add({energy: part - done[energy] for energy, part in parts.items()})
+            done = parts
+            self._close(clock.hour_start, clock.advance())
+        ledger.add({energy: amount - done[energy] for energy, amount in energies.items()})
+        ledger.skip(elapsed)
+        self._next_boundary = clock.next_boundary
+
+    def _close(self, hour_start, closes):
+        """Close the periods that ended at a boundary, as flagged by RolloverClock.advance."""
+        ledger = self._ledger
+        if closes & CLOSE_HOUR:
+            ledger.settle()
+            if self.statistics_importer is not None:
+                self.statistics_importer.append(self._closed_hour(hour_start))
+
+        ledger.reset(closes)
+        if closes & CLOSE_BILLING:
+            for energy in self._tariff_energy.values():
+                energy[0] = energy[1] = 0
+
+        if closes & TARIFF_CHANGE:
+            ledger.set_bucket(self._tariff_energy.get(self._clock.tariff))
+
+    def _closed_hour(self, hour_start):
+        """Return the row of the hour being closed, with the columns of the backfill rows."""
+        value = self._ledger.value
+        return {
+            HOUR_START: hour_start,
+            'pv_energy_hour': value('pv_energy_hour'),
+            'grid_energy_hour': value('grid_energy_hour'),
+            'house_energy_hour': value('house_energy_hour'),
+            'grid_returned_energy_hour': value('grid_returned_energy_hour'),
+            'balance_neto': min(value('grid_energy_hour'), value('grid_returned_energy_hour')),
+            'grid_energy_total': value('grid_energy_total'),
+            'house_energy_total': value('house_energy_total'),
+            'grid_returned_energy_total': value('grid_returned_energy_total'),
+            'balance_neto_total': value('balance_neto_total'),
+        }
+
+#   RunningTotals
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+for _key in total_keys(ENERGY_METRICS, SETTLED_METRICS, DERIVED_TOTALS):
+    setattr(RunningTotals, _key, _total_property(_key))
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------
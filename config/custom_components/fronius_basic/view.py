@@ -0,0 +1,77 @@
+"""Read-only HTTP view of the latest sample of every device."""
+
+
+#-----------------------------------------------------  python libraries  ---------------------------------------------------------
+from http import HTTPStatus
+
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+
+from .snapshot import etag_matches
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                       CONSTANTS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+SNAPSHOT_URL = '/api/fronius_basic/{name}'
+
+CONTENT_TYPE_JSON = 'application/json'
+
+
+
+
+'''--------------------------------------------------------------------------------------------------------------------------------
+
+                                                         CLASS DEFINITIONS
+
+--------------------------------------------------------------------------------------------------------------------------------'''
+
+class SnapshotView(HomeAssistantView):
+    """Serve the latest sample and running totals of a device, by the slug of its name.
+
+    A request whose If-None-Match lists the current ETag gets 304 Not
+    Modified, or with ``?wait=<seconds>`` is held until the next sample comes
+    and then gets it, which lets any number of readers follow the device
+    without a request of their own to the inverter.
+    """
+
+    url = SNAPSHOT_URL
+    name = 'api:fronius_basic:snapshot'
+
+    def __init__(self, snapshots):
+        """Initialize the view, snapshots maps the slug of every device name to its DeviceSnapshot."""
+        self._snapshots = snapshots
+
+    async def get(self, request, name):
+        """Return the latest sample, once it is newer than the reader's."""
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return self.json_message('Unknown device {}'.format(name), HTTPStatus.NOT_FOUND)
+        try:
+            wait = max(0.0, float(request.query.get('wait', 0)))
+        except ValueError:
+            return self.json_message('wait must be a number of seconds', HTTPStatus.BAD_REQUEST)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if (snapshot.etag is None or etag_matches(if_none_match, snapshot.etag)) and wait:
+            await snapshot.async_wait(wait)
+        if snapshot.etag is None:
+            return self.json_message('No sample yet', HTTPStatus.SERVICE_UNAVAILABLE)
+        headers = {'ETag': snapshot.etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(if_none_match, snapshot.etag):
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+        return web.Response(body=snapshot.body, content_type=CONTENT_TYPE_JSON, headers=headers)
+
+#   SnapshotView
+#----------------------------------------------------------------------------------------------------------------------------------
+
+
+
+
+#------------------------------------------------------  END OF DOCUMENT  ---------------------------------------------------------